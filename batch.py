@@ -0,0 +1,127 @@
+# Batch compilation of many .yp files across a process pool
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import colorama as colora
+import errors as xsErrors
+from errors import crit_err as error
+
+
+def expand(targets):
+    """
+    Resolve files, directories (recursive) and globs to a list of .yp files
+    """
+    files = []
+    for target in targets:
+        if os.path.isdir(target):
+            files.extend(sorted(glob.glob(os.path.join(target, '**', '*.yp'), recursive=True)))
+        elif '*' in target or '?' in target or '[' in target:
+            files.extend(sorted(file for file in glob.glob(target, recursive=True) if file.endswith('.yp')))
+        elif not target.endswith('.yp'):
+            error(4, 'FileType', 'Invalid FileType (must be .yp)', cause=[f"You passed in : ", target])
+        elif not os.path.exists(target):
+            error(2, 'FileNotFound', f'The input file could not be found', cause=[f"File not found '{target}'"], fix=["Input an existing file"])
+        else:
+            files.append(target)
+    return list(dict.fromkeys(files))
+
+
+def init_worker():
+    # Grammar and codegen setup is paid once per worker, not once per file
+    import lp
+    import compiler
+
+
+def captured(func, *args):
+    """
+    Call <func> with everything it prints (including errors) captured
+    :return:
+    (success, result, diagnostics)
+    """
+    out = io.StringIO()
+    result = None
+    success = True
+    with contextlib.redirect_stdout(out):
+        try:
+            result = func(*args)
+        except SystemExit:  # Critical error, already reported
+            success = False
+        except Exception as ex:
+            success = False
+            if not ex.__class__ == Exception:  # Not reported yet
+                print(f'Internal error : {ex.__class__.__name__}: {ex}')
+    return success, result, out.getvalue()
+
+
+def compile_file(target, opts):
+    """
+    Compile a single file inside a worker
+    :return:
+    (target, success, lines, seconds, diagnostics)
+    """
+    import main as cli
+
+    def build():
+        content = cli.read(target)
+        cli.build(opts, content)
+        return len(content.splitlines())
+
+    xsErrors.alerts = "alert" in opts
+    start = time.perf_counter()
+    success, lines, diagnostics = captured(build)
+    return target, success, lines or 0, time.perf_counter() - start, diagnostics
+
+
+def batch(args):
+    import main as cli
+    jobs = None
+    targets = []
+    options = []
+    while args:
+        arg = args.pop(0)
+        if arg in ('-j', '--jobs'):
+            if not args or not args[0].isnumeric() or int(args[0]) < 1:
+                error(8, 'OptionError', f'Invalid option', cause=[f"{arg} expects a positive number of jobs"], fix=["Pass e.g. -j 4"])
+            jobs = int(args.pop(0))
+        elif arg.startswith('-'):
+            options.append(arg)
+        else:
+            targets.append(arg)
+    opts = cli.prepare_options(options)
+    files = expand(targets)
+    if not files:
+        error(2, 'FileNotFound', f'No input files found', cause=[f"Targets : ", *targets] if targets else None, fix=["Input existing files, directories or globs"])
+
+    print(f'{colora.Fore.LIGHTYELLOW_EX}Compiling {colora.Fore.BLUE}{colora.Style.BRIGHT}{len(files)}{colora.Style.RESET_ALL}'
+          f'{colora.Fore.LIGHTYELLOW_EX} files with options{colora.Fore.RESET}: '
+          f'{colora.Fore.MAGENTA}{f"{colora.Fore.RESET}, {colora.Fore.MAGENTA}".join(opts)}')
+    print()
+    sys.stdout.write(colora.Style.RESET_ALL)
+
+    failed = 0
+    total_lines = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as pool:
+        chunksize = max(1, len(files) // ((jobs or os.cpu_count() or 1) * 4))
+        for target, success, lines, seconds, diagnostics in pool.map(compile_file, files, [opts] * len(files), chunksize=chunksize):
+            total_lines += lines
+            if success:
+                print(f'  {colora.Fore.GREEN}ok{colora.Fore.RESET}   {target} ({lines} lines, {seconds * 1000:.1f}ms)')
+            else:
+                failed += 1
+                print(f'  {colora.Fore.RED}FAIL{colora.Fore.RESET} {target}')
+            if diagnostics:
+                print('       ' + diagnostics.rstrip().replace('\n', '\n       '))
+    elapsed = time.perf_counter() - start
+
+    print()
+    print(f'{len(files) - failed}/{len(files)} files compiled in {elapsed:.2f}s : '
+          f'{colora.Fore.CYAN}{len(files) / elapsed:.1f}{colora.Fore.RESET} files/s, '
+          f'{colora.Fore.CYAN}{total_lines / elapsed:.0f}{colora.Fore.RESET} lines/s')
+    if failed:
+        raise Exception()
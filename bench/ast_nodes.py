@@ -0,0 +1,113 @@
+# Memory and traversal speed of the __slots__ AST nodes against the former (Type, {fields}, pos) tuples
+# Usage : python bench/ast_nodes.py [statements]
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nodes  # noqa: E402
+from lp import PLexer, PParser  # noqa: E402
+
+
+def source(statements):
+    lines = ['v0 = 1']
+    for i in range(1, statements):
+        lines.append(f'v{i} = v{i - 1} + {i} * 2 - (v{i - 1} / 3)')
+    return '\n'.join(lines)
+
+
+def to_tuple(node):
+    # Former representation, as built by lp.utils before the node classes
+    if isinstance(node, list):
+        return [to_tuple(item) for item in node]
+    if not isinstance(node, nodes.Node):
+        return node
+    fields = {field: to_tuple(getattr(node, field)) for field in node.fields}
+    return node.kind, fields, node.pos
+
+
+def clone(node):
+    if isinstance(node, list):
+        return [clone(item) for item in node]
+    if not isinstance(node, nodes.Node):
+        return node
+    new = object.__new__(type(node))
+    for field in node.fields:
+        setattr(new, field, clone(getattr(node, field)))
+    new.pos = node.pos
+    return new
+
+
+def walk_tuples(body):
+    count = 0
+    for branch in body:
+        if branch[0] == 'VarAssign':
+            count += 1 + walk_tuple_value(branch[1]['value'])
+    return count
+
+
+def walk_tuple_value(branch):
+    if branch[0] == 'Expression':
+        return 1 + walk_tuple_value(branch[1]['lhs']) + walk_tuple_value(branch[1]['rhs'])
+    elif branch[0] == 'Number' or branch[0] == 'Name':
+        return 1 if branch[1]['value'] is not None else 0
+    return 0
+
+
+def walk_nodes(body):
+    count = 0
+    for branch in body:
+        if branch.kind == 'VarAssign':
+            count += 1 + walk_node_value(branch.value)
+    return count
+
+
+def walk_node_value(branch):
+    if branch.kind == 'Expression':
+        return 1 + walk_node_value(branch.lhs) + walk_node_value(branch.rhs)
+    elif branch.kind == 'Number' or branch.kind == 'Name':
+        return 1 if branch.value is not None else 0
+    return 0
+
+
+def allocated(build, tree):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(tree)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(walk, body, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = walk(body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count, best
+
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    parser = PParser()
+    parser.parse(PLexer().tokenize(source(statements)))
+    tree = parser.ast
+
+    tuples, tuple_size = allocated(lambda t: to_tuple(t.body), tree)
+    slotted, node_size = allocated(lambda t: clone(t.body), tree)
+    tuple_count, tuple_time = timed(walk_tuples, tuples)
+    node_count, node_time = timed(walk_nodes, slotted)
+    assert tuple_count == node_count
+
+    print(f'{statements} statements, {node_count} nodes')
+    print(f'{"":<8}{"memory":>12}{"bytes/node":>12}{"traversal":>12}')
+    print(f'{"tuples":<8}{tuple_size / 2 ** 20:>10.1f}MB{tuple_size / node_count:>12.1f}{tuple_time * 1000:>10.1f}ms')
+    print(f'{"nodes":<8}{node_size / 2 ** 20:>10.1f}MB{node_size / node_count:>12.1f}{node_time * 1000:>10.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# Scaling of Codegen.emit in the number of segments
+# Usage : python bench/emit.py [max_segments] [instructions_per_segment]
+# The time per segment of emit should stay flat, the old list-concatenating dump grows linearly.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codegen import Codegen, START_FUNC  # noqa: E402
+from ir import Reg, Imm  # noqa: E402
+from utils import RegOps  # noqa: E402
+
+
+def program(segments, instructions):
+    # -O0: emit runs no register allocation or peephole pass the legacy dump would lack
+    cg = Codegen(['64bit', 'O0'])
+    for _ in range(segments):
+        cg.auto_segment()
+        for i in range(instructions):
+            cg.cur.append(RegOps.mov(Reg('rax'), Imm(i)))
+    cg.set_cur(START_FUNC)
+    cg.cur.append(RegOps.mov(Reg('rax'), Imm(0)))
+    return cg
+
+
+def legacy_dump(self):
+    # Codegen.dump before streaming emission, with the frames emit now sets up
+    self.variables_dump()
+    self.make_end()
+    self.make_frames()
+    code = self.code + [""]
+    start = self.segments.pop(f'{START_FUNC}').render()
+    start[0] = "   " + start[0]
+    start = [f'{START_FUNC}:'] + ["\n   ".join(start)]
+    for segment in self.segments.keys():
+        value = self.segments[segment].render()
+        value[0] = "   " + value[0]
+        value = "\n   ".join(value)
+        value = [f'{segment}:'] + [value]
+        value.append('')
+        code = code + value
+    full = self.head + self.data + self.bss + code + start
+    return "\n".join(full)
+
+
+def measure(func, segments, instructions):
+    cg = program(segments, instructions)
+    start = time.perf_counter()
+    func(cg)
+    return time.perf_counter() - start
+
+
+def main():
+    max_segments = int(sys.argv[1]) if len(sys.argv) > 1 else 16000
+    instructions = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    assert program(50, instructions).dump() == legacy_dump(program(50, instructions))
+    with open(os.devnull, 'w') as devnull:
+        print(f'{"segments":>10}{"emit":>12}{"us/seg":>8}{"legacy":>12}{"us/seg":>8}')
+        segments = 1000
+        while segments <= max_segments:
+            emit = measure(lambda cg: cg.emit(devnull), segments, instructions)
+            legacy = measure(legacy_dump, segments, instructions)
+            print(f'{segments:>10}{emit * 1000:>10.1f}ms{emit / segments * 1e6:>8.2f}'
+                  f'{legacy * 1000:>10.1f}ms{legacy / segments * 1e6:>8.2f}')
+            segments *= 2
+
+
+if __name__ == '__main__':
+    main()
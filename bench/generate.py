@@ -0,0 +1,39 @@
+# Synthetic .yp programs for the benchmarks
+# Usage : python bench/generate.py [assignments] [depth] [functions] [comments] [strings] [width] > program.yp
+#   assignments : Chained assignments (v1 = v0 + 1 ...), default 1000
+#   depth       : Nesting depth of a parenthesized expression, default 50
+#   functions   : Functions defined and called once each, default 50
+#   comments    : Comment lines of <width> characters, default 100
+#   strings     : String assignments of <width> characters, default 100
+#   width       : Length of the comment and string runs, default 200
+# Every program compiles and runs (the expressions only add, subtract and multiply).
+import sys
+
+
+def program(assignments=1000, depth=50, functions=50, comments=100, strings=100, width=200):
+    lines = ['base = 3']
+    if assignments:
+        lines.append('v0 = base')
+        lines.extend(f'v{i} = v{i - 1} + {i}' for i in range(1, assignments))
+    if depth:
+        # base + (1 * (base - (2 + (base * ...))))
+        ops = ('+', '*', '-')
+        expr = 'base'
+        for i in range(depth):
+            expr = f'({i % 7 + 1} {ops[i % 3]} {expr})' if i % 2 else f'(base {ops[i % 3]} {expr})'
+        lines.append(f'nested = {expr}')
+    for i in range(functions):
+        lines.extend((f'def f{i}(a: int, b: int)', f'   c = a * b + {i}', '   if c > 10', '      c = c - a', '   ;',
+                      '   return c', ';', f'r{i} = f{i}(base, {i})'))
+    lines.extend('# ' + 'x' * width for _ in range(comments))
+    lines.extend(f's{i} = "' + 'y' * width + '"' for i in range(strings))
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    names = ('assignments', 'depth', 'functions', 'comments', 'strings', 'width')
+    sys.stdout.write(program(**{name: int(value) for name, value in zip(names, sys.argv[1:])}))
+
+
+if __name__ == '__main__':
+    main()
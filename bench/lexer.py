@@ -0,0 +1,69 @@
+# Tokenizing time of the hand-written Scanner against sly's PLexer, on generated programs (see generate)
+# Usage : python bench/lexer.py [scale] [runs]
+#   scale : Multiplies the size of every program, default 1
+#   runs  : Runs per lexer (best is used), default 5. The lexers take turns, so a slow spell of the machine hits them all
+# The tokens of both lexers (and of the TokenBuffer) are compared (type, value, lineno, index, end) before timing.
+# buffer is Scanner.buffer (what the compiler runs, the speedup is against it), tokenize makes sly Tokens
+# out of it for the interface of PLexer. The memory columns hold the list of the Tokens and the TokenBuffer.
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate import program  # noqa: E402
+from lp import PLexer  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+PROGRAMS = {
+    'assignments': dict(assignments=20000, depth=0, functions=0, comments=0, strings=0),
+    'functions': dict(assignments=0, depth=0, functions=2000, comments=0, strings=0),
+    'text': dict(assignments=0, depth=0, functions=0, comments=5000, strings=5000),
+    'mixed': dict(assignments=10000, depth=50, functions=1000, comments=1000, strings=1000),
+}
+
+
+def best(funcs, runs):
+    # Best time of each of <funcs>, run in turns
+    times = [[] for _ in funcs]
+    for _ in range(runs):
+        for func, spent in zip(funcs, times):
+            start = time.perf_counter()
+            for _ in func():
+                pass
+            spent.append(time.perf_counter() - start)
+    return [min(spent) for spent in times]
+
+
+def size(func):
+    tracemalloc.start()
+    tokens = func()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tokens
+    return used
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f'{"program":>12}{"size":>10}{"tokens":>10}{"PLexer":>12}{"tokenize":>12}{"buffer":>12}{"speedup":>9}'
+          f'{"Tokens":>10}{"buffer":>10}')
+    for name, config in PROGRAMS.items():
+        source = program(**{key: value * scale if key != 'depth' else value for key, value in config.items()})
+        expected = [(t.type, t.value, t.lineno, t.index, t.end) for t in PLexer().tokenize(source)]
+        tokens = [(t.type, t.value, t.lineno, t.index, t.end) for t in Scanner().tokenize(source)]
+        assert tokens == expected, name
+        assert [(t.type, t.value, t.lineno, t.index, t.end) for t in Scanner().buffer(source)] == expected, name
+        sly, scanner, buffer = best((lambda: PLexer().tokenize(source), lambda: Scanner().tokenize(source),
+                                     lambda: (Scanner().buffer(source),)), runs)
+        listed = size(lambda: list(Scanner().tokenize(source)))
+        columns = size(lambda: Scanner().buffer(source))
+        print(f'{name:>12}{len(source) // 1024:>8}KB{len(tokens):>10}{sly * 1000:>10.1f}ms{scanner * 1000:>10.1f}ms'
+              f'{buffer * 1000:>10.1f}ms{sly / buffer:>8.1f}x{listed // 1024:>8}KB{columns // 1024:>8}KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# Run mode engines: the closure compiler (Interpreter.make) and the bytecode VM (--vm) against the AST walker
+# Usage : python bench/run.py [scale] [runs]
+#   scale : Multiplies the size of every workload, default 1
+#   runs  : Number of runs per engine (best is used), default 3
+# Compile is the one time cost of building the closures / bytecode, run the time of executing them.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bytecode  # noqa: E402
+import main as cli  # noqa: E402
+from closures import Closures  # noqa: E402
+from interpreter import Interpreter  # noqa: E402
+
+WORKLOADS = {
+    # Counting loop with a branch and arithmetic on globals
+    'loop': lambda n: (f'total = 0\ni = 0\nwhile i < {20000 * n}\n'
+                       '   if (i % 3) == 0\n      total = total + i * 2\n   ;\n   else\n      total = total - 1\n   ;\n'
+                       '   i = i + 1\n;\nreturn total\n'),
+    # Recursive calls with parameters and locals
+    'calls': lambda n: ('def fib(k: int)\n   if k < 2\n      return k\n   ;\n'
+                        '   a = fib(k - 1)\n   b = fib(k - 2)\n   return a + b\n;\n'
+                        f'return fib({14 + n})\n'),
+    # Nested loops with break and continue
+    'nested': lambda n: (f'count = 0\nouter = 0\nuntil outer == {60 * n}\n   outer = outer + 1\n   inner = 0\n'
+                         '   while 1\n      inner = inner + 1\n      if inner > outer\n         break\n      ;\n'
+                         '      if (inner % 2) == 1\n         continue\n      ;\n      count = count + inner\n   ;\n;\n'
+                         'return count\n'),
+}
+
+
+def best(func, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f'{"workload":>10}{"walk":>12}{"closures":>12}{"run":>12}{"speedup":>9}{"bytecode":>12}{"run":>12}{"speedup":>9}')
+    for name, make in WORKLOADS.items():
+        tree = cli.lp(make(scale))
+        walk, expected = best(lambda: Interpreter([]).walk(tree), runs)
+        compile_, program = best(lambda: Closures().build(tree), runs)
+        run, result = best(program, runs)
+        assert result == expected, (name, result, expected)
+        # Loaded back from its serialized form, as a .ypc file is
+        assemble, code = best(lambda: bytecode.loads(bytecode.dumps(bytecode.Compiler().build(tree))), runs)
+        execute, result = best(lambda: bytecode.execute(code), runs)
+        assert result == expected, (name, result, expected)
+        print(f'{name:>10}{walk * 1000:>10.1f}ms{compile_ * 1000:>10.2f}ms{run * 1000:>10.1f}ms{walk / run:>8.1f}x'
+              f'{assemble * 1000:>10.2f}ms{execute * 1000:>10.1f}ms{walk / execute:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
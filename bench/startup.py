@@ -0,0 +1,55 @@
+# Startup time of every CLI mode against its target
+# Usage : python bench/startup.py [runs] [factor]
+#   runs   : Number of runs per mode (median is used), default 15
+#   factor : Scale all targets (for slower machines), default 1
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+SOURCE = 'age = 11\nname = "Jack"\nage = age + 3  # Increase the age\n'
+
+# Targets in milliseconds (median wall time of a whole process, warm table cache)
+TARGETS = {
+    'info': (['--version'], 45),
+    'check': (['{file}'], 75),
+    'view': (['{file}', '--view'], 85),
+    'run': (['{file}', '--run'], 85),
+    'compile': (['{file}', '--compile'], 90),
+}
+
+
+def measure(args, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, MAIN, *args], cwd=ROOT, stdout=subprocess.DEVNULL, check=False)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    factor = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, 'startup.yp')
+        with open(file, 'w') as f:
+            f.write(SOURCE)
+        # Warm up (builds the table cache if necessary)
+        measure([file], 1)
+        failed = False
+        print(f'{"mode":<10}{"median":>10}{"target":>10}')
+        for mode, (args, target) in TARGETS.items():
+            target *= factor
+            median = measure([arg.format(file=file) for arg in args], runs)
+            failed |= median > target
+            print(f'{mode:<10}{median:>8.1f}ms{target:>8.1f}ms{"  FAIL" if median > target else ""}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
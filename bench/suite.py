@@ -0,0 +1,134 @@
+# Per-phase benchmark of the whole toolchain on generated programs (see generate)
+# Usage : python bench/suite.py [scale] [runs] [--out FILE] [--baseline FILE] [--threshold PCT]
+#   scale     : Multiplies the size of every workload, default 1
+#   runs      : Runs per workload, the median of every phase is kept, default 5
+#   --out       Write the results as JSON to FILE
+#   --baseline  Compare against the results saved by an earlier --out, the phases slower
+#               than the baseline by more than --threshold percent (default 10) are flagged
+#               (and by more than a millisecond), the exit status is then 1
+# The phases are timed one by one on every run: lex (Scanner.buffer), parse (PParser.parse of the buffer),
+# compile (fold, propagate, lower and generate at -O2), emit (Codegen.dump), highlight
+# (the view mode) and run (Interpreter.make, closures included).
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import errors as xsErrors  # noqa: E402
+import main as cli  # noqa: E402
+from generate import program  # noqa: E402
+from interpreter import Interpreter  # noqa: E402
+from lp import PParser  # noqa: E402
+from scanner import Scanner  # noqa: E402
+from syntax_higlighting import light  # noqa: E402
+
+PHASES = ('lex', 'parse', 'compile', 'emit', 'highlight', 'run')
+# Name -> arguments of generate.program, the counts are multiplied by the scale
+WORKLOADS = {
+    # Long straight-line code
+    'assignments': dict(assignments=3000, depth=0, functions=0, comments=0, strings=0),
+    # Deep parenthesized expressions
+    'nesting': dict(assignments=0, depth=120, functions=0, comments=0, strings=0),
+    # Many small functions with branches
+    'functions': dict(assignments=0, depth=0, functions=300, comments=0, strings=0),
+    # Long comments and string literals
+    'text': dict(assignments=0, depth=0, functions=0, comments=1000, strings=1000, width=300),
+    # A bit of everything
+    'mixed': dict(assignments=1000, depth=50, functions=50, comments=100, strings=100),
+}
+COUNTS = ('assignments', 'functions', 'comments', 'strings')
+OPTS = ['64bit', 'O2']
+# Slowdowns under this many seconds are noise, never flagged
+NOISE = 0.001
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def measure(source, runs):
+    """
+    Median seconds of every phase over <runs> runs of the pipeline on <source>
+    """
+    syntax = os.path.join(ROOT, 'syntax.json')
+    times = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        elapsed, tokens = timed(Scanner().buffer, source)
+        times['lex'].append(elapsed)
+        parser = PParser()
+        elapsed, _ = timed(parser.parse, tokens)
+        times['parse'].append(elapsed)
+        elapsed, cg = timed(cli.translate, OPTS, parser.ast)
+        times['compile'].append(elapsed)
+        elapsed, _ = timed(cg.dump)
+        times['emit'].append(elapsed)
+        elapsed, _ = timed(light, source, syntax)
+        times['highlight'].append(elapsed)
+        # The compile phase folded the tree in place, the run gets a new one
+        parser = PParser()
+        parser.parse(tokens)
+        elapsed, _ = timed(Interpreter([]).make, parser.ast)
+        times['run'].append(elapsed)
+    return {phase: statistics.median(values) for phase, values in times.items()}
+
+
+def compare(results, baseline, threshold):
+    """
+    Phases slower than in <baseline> by more than <threshold> (a ratio), as (workload, phase, old, new)
+    """
+    slower = []
+    for name, phases in results.items():
+        for phase, new in phases.items():
+            old = baseline.get(name, {}).get(phase)
+            if old and new > old * (1 + threshold) and new - old > NOISE:
+                slower.append((name, phase, old, new))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-phase benchmark of the toolchain')
+    parser.add_argument('scale', nargs='?', type=int, default=1)
+    parser.add_argument('runs', nargs='?', type=int, default=5)
+    parser.add_argument('--out')
+    parser.add_argument('--baseline')
+    parser.add_argument('--threshold', type=float, default=10.0)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+    results = {}
+    print(f'{"workload":<12}' + ''.join(f'{phase:>12}' for phase in PHASES))
+    for name, config in WORKLOADS.items():
+        config = {key: value * args.scale if key in COUNTS else value for key, value in config.items()}
+        source = program(**config)
+        xsErrors.contentLoader = source
+        results[name] = measure(source, args.runs)
+        print(f'{name:<12}' + ''.join(f'{results[name][phase] * 1000:>10.2f}ms' for phase in PHASES))
+
+    slower = compare(results, baseline, args.threshold / 100)
+    if baseline:
+        print()
+        for name, phase, old, new in slower:
+            print(f'REGRESSION {name}/{phase}: {old * 1000:.2f}ms -> {new * 1000:.2f}ms (+{(new / old - 1) * 100:.0f}%)')
+        if not slower:
+            print(f'No phase slower than the baseline by more than {args.threshold:g}%')
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump({'python': platform.python_version(), 'scale': args.scale, 'runs': args.runs,
+                       'results': results}, file, indent=2)
+    return 1 if slower else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# Content-addressed .yp -> .asm cache
+#
+# Entries are stored as '<key>.asm' in the cache directory, the key is a hash of
+# the source, the target width, the optimization level, the include directory and the compiler version.
+# The warnings and the peephole report of the compile go next to it in '<key>.json', a cached
+# build replays them.
+# The access time of an entry is tracked by its mtime, the least recently used
+# entries are evicted once the directory grows over the size limit.
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+CACHE_DIR = os.environ.get('YUPITER_CACHE_DIR') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'yupiter')
+CACHE_SIZE = int(os.environ.get('YUPITER_CACHE_SIZE', 64 * 1024 * 1024))
+# Options which change the output
+OUTPUT_OPTS = ('32bit', '64bit', 'O0', 'O1', 'O2')
+
+_fingerprint = None
+
+
+def fingerprint(version):
+    """
+    Compiler version, including the sources of the compiler itself so edits invalidate old entries
+    """
+    global _fingerprint
+    if _fingerprint is None:
+        h = hashlib.sha256(version.encode())
+        for file in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+            with open(file, 'rb') as f:
+                h.update(f.read())
+        _fingerprint = h.hexdigest()
+    return _fingerprint
+
+
+def key(content, opts, version):
+    h = hashlib.sha256(fingerprint(version).encode())
+    h.update(','.join(opt for opt in opts if opt in OUTPUT_OPTS).encode())
+    # Imports are resolved against ./include and end up as absolute paths in the output
+    h.update(os.path.abspath(os.path.join(os.curdir, 'include')).encode())
+    h.update(content.encode())
+    return h.hexdigest()
+
+
+def _path(k, extension='.asm'):
+    return os.path.join(CACHE_DIR, f'{k}{extension}')
+
+
+def load(k):
+    try:
+        with open(_path(k), 'r') as file:
+            content = file.read()
+        os.utime(_path(k))
+    except OSError:
+        return None
+    return content
+
+
+def load_diagnostics(k):
+    """
+    Diagnostics stored with the entry, None if there are none (the entry came from generate)
+    """
+    try:
+        with open(_path(k, '.json'), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def store(k, content):
+    _store(k, lambda tmp: _write(tmp, content))
+
+
+def store_file(k, path):
+    _store(k, lambda tmp: shutil.copyfile(path, tmp))
+
+
+def store_diagnostics(k, diagnostics):
+    _store(k, lambda tmp: _write(tmp, json.dumps(diagnostics)), '.json')
+
+
+def _write(path, content):
+    with open(path, 'w') as file:
+        file.write(content)
+
+
+def _store(k, create, extension='.asm'):
+    tmp = f'{_path(k, extension)}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        create(tmp)
+        os.replace(tmp, _path(k, extension))
+        evict(CACHE_SIZE)
+    except OSError:  # The cache is best effort only
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def evict(limit):
+    entries = []
+    total = 0
+    for entry in os.scandir(CACHE_DIR):
+        if not entry.name.endswith('.asm'):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        try:
+            os.remove(f'{path[:-len(".asm")]}.json')
+        except OSError:
+            pass
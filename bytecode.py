@@ -0,0 +1,446 @@
+# Register based bytecode, the second engine of the run mode
+#
+# Every function (the top level code is function 0) is compiled into a Code:
+# a flat array of instruction words (opcode, a, b, c) over numbered registers.
+# Registers 0.. are the params, then the variables (their slots from the
+# interpreter's Resolver) and above them the temporaries of the current
+# statement, so a temporary never lands in a variable. The constant pool sits at the end of every frame and is
+# addressed by negative register numbers (constant k is register -k - 1), so
+# operands never need a separate constant load. The frame of the top level code
+# holds the globals, functions reach it by GETG / SETG.
+#
+#   MOVE a b       R[a] = R[b]               JUMP a          pc = a
+#   GETG a b       R[a] = globals[b]         JUMPF a b       pc = b if not R[a]
+#   SETG a b       globals[a] = R[b]         JUMPT a b       pc = b if R[a]
+#   ADD a b c      R[a] = R[b] + R[c]        JNLT a b c      pc = a if not R[b] < R[c]
+#   (and the other binary operators)         (and the other comparisons)
+#   CALL a b c     R[a] = function b (args in R[c]..)
+#   RETURN a / LEAVE
+#
+# A Program can be serialized with dumps() and loaded again with loads(), the
+# source is kept for the error messages.
+import enum
+import marshal
+import sys
+from array import array
+
+from interpreter import ZEROS, Resolver, divide, fail, modulo, string
+from visitor import Visitor
+
+MAGIC = b'YPC'
+FORMAT = 1
+
+
+class Op(enum.IntEnum):
+    MOVE = enum.auto()
+    GETG = enum.auto()
+    SETG = enum.auto()
+    ADD = enum.auto()
+    SUB = enum.auto()
+    MUL = enum.auto()
+    DIV = enum.auto()
+    MOD = enum.auto()
+    LT = enum.auto()
+    LE = enum.auto()
+    GT = enum.auto()
+    GE = enum.auto()
+    EQ = enum.auto()
+    NE = enum.auto()
+    AND = enum.auto()
+    OR = enum.auto()
+    JUMP = enum.auto()
+    JUMPF = enum.auto()
+    JUMPT = enum.auto()
+    JNLT = enum.auto()
+    JNLE = enum.auto()
+    JNGT = enum.auto()
+    JNGE = enum.auto()
+    JNEQ = enum.auto()
+    JNNE = enum.auto()
+    CALL = enum.auto()
+    RETURN = enum.auto()
+    LEAVE = enum.auto()
+
+
+BINOPS = {
+    '+': Op.ADD, '-': Op.SUB, '*': Op.MUL, '/': Op.DIV, '%': Op.MOD,
+    '<': Op.LT, '<=': Op.LE, '>': Op.GT, '>=': Op.GE, '==': Op.EQ, '!=': Op.NE,
+    'and': Op.AND, 'or': Op.OR,
+}
+# Comparison -> the jump taken when it is false, an if or while test is fused with its jump
+UNLESS = {'<': Op.JNLT, '<=': Op.JNLE, '>': Op.JNGT, '>=': Op.JNGE, '==': Op.JNEQ, '!=': Op.JNNE}
+SYMBOLS = {op: symbol for symbol, op in BINOPS.items()}
+SYMBOLS.update({op: symbol for symbol, op in UNLESS.items()})
+# Opcodes writing register a, their destination can be retargeted
+RESULTS = {Op.MOVE, Op.GETG, Op.CALL} | set(BINOPS.values())
+
+
+class Code:
+    __slots__ = ('name', 'params', 'size', 'consts', 'code', 'positions', 'words', 'tail')
+
+    def __init__(self, name, params=0, size=0, consts=(), code=None, positions=None):
+        self.name = name
+        self.params = params
+        self.size = size
+        self.consts = list(consts)
+        # 4 words per instruction, and the (index, line) of its node or -1
+        self.code = array('i') if code is None else code
+        self.positions = array('i') if positions is None else positions
+        # What execute runs: the words as a list, and a new frame without its params
+        self.words = None
+        self.tail = None
+
+    def prepare(self):
+        self.words = self.code.tolist()
+        self.tail = [0] * (self.size - self.params) + self.consts[::-1]
+
+    def emit(self, op, a=0, b=0, c=0, pos=None):
+        self.code.extend((op, a, b, c))
+        self.positions.extend(pos or (-1, -1))
+        return len(self.code) - 4
+
+    def position(self, pc):
+        index = pc // 2
+        if self.positions[index] < 0:
+            return None
+        return self.positions[index], self.positions[index + 1]
+
+
+class Program:
+    __slots__ = ('functions', 'source')
+
+    def __init__(self, functions, source=None):
+        # Function 0 is the top level code
+        self.functions = functions
+        self.source = source
+
+
+def dumps(program):
+    functions = [(code.name, code.params, code.size, tuple(code.consts), code.code.tobytes(), code.positions.tobytes())
+                 for code in program.functions]
+    return MAGIC + marshal.dumps((FORMAT, sys.byteorder, program.source, functions))
+
+
+def loads(data):
+    """
+    Program serialized by dumps, None if <data> is not one
+    """
+    if not data.startswith(MAGIC):
+        return None
+    try:
+        version, byteorder, source, functions = marshal.loads(data[len(MAGIC):])
+    except (EOFError, ValueError, TypeError):
+        return None
+    if version != FORMAT:
+        return None
+    codes = []
+    for name, params, size, consts, code, positions in functions:
+        words, places = array('i', code), array('i', positions)
+        if byteorder != sys.byteorder:
+            words.byteswap()
+            places.byteswap()
+        codes.append(Code(name, params, size, consts, words, places))
+    return Program(codes, source)
+
+
+class Compiler(Visitor):
+    # Compiles a tree into a Program
+    statements = {
+        'VarAssign': 'visit_assign',
+        'VarSet': 'visit_set',
+        'Def': 'visit_def',
+        'Return': 'visit_return',
+        'Import': 'visit_import',
+        'FuncCall': 'visit_func_call',
+        'If': 'visit_if',
+        'While': 'visit_while',
+        'Until': 'visit_while',
+        'BREAK': 'visit_break',
+        'CONTINUE': 'visit_continue',
+    }
+    values = {
+        'FuncCall': 'visit_call',
+        'Number': 'visit_number',
+        'Float': 'visit_float',
+        'Name': 'visit_name',
+        'Expression': 'visit_expr',
+        'String': 'visit_string',
+    }
+    name = 'interpreter'
+
+    def __init__(self, count=None):
+        super().__init__(count)
+        self.main = Code(None)
+        self.functions = [self.main]
+        # Name -> (index, Code) of the functions defined so far
+        self.defined = {}
+        # (depth, slot) of the variable accesses and frame sizes from the Resolver
+        self.slots = {}
+        self.sizes = {}
+        # Constants of the code being compiled, and its number of variables (the first temporary)
+        self.consts = {}
+        self.code = self.main
+        self.base = 0
+        # First free register, temporaries live above the variables until the end of the statement
+        self.free = 0
+        # (start, jumps to the end) of the enclosing loops
+        self.loops = []
+
+    def build(self, tree, source=None):
+        resolver = Resolver().resolve(tree)
+        self.slots, self.sizes = resolver.slots, resolver.sizes
+        self.base = self.main.size = self.sizes[None]
+        self.compile(tree.body)
+        self.code.emit(Op.LEAVE)
+        return Program(self.functions, source)
+
+    def compile(self, ast):
+        for branch in ast:
+            self.free = self.base
+            self.visit(branch)
+
+    def register(self, register):
+        self.code.size = max(self.code.size, register + 1)
+        return register
+
+    def temp(self, count=1):
+        first = self.free
+        self.free += count
+        self.register(self.free - 1)
+        return first
+
+    def constant(self, value):
+        key = type(value), value
+        if key not in self.consts:
+            self.consts[key] = len(self.consts)
+            self.code.consts.append(value)
+        return -self.consts[key] - 1
+
+    def into(self, target, register):
+        # Leave the value of <register> in <target>, rewriting the instruction which just computed it
+        if register == target:
+            return
+        code = self.code.code
+        if register >= self.base and code and code[-4] in RESULTS and code[-3] == register:
+            code[-3] = target
+        else:
+            self.code.emit(Op.MOVE, target, register)
+
+    def store(self, branch, register):
+        depth, slot = self.slots[branch]
+        if depth:
+            self.code.emit(Op.SETG, slot, register, pos=branch.pos)
+        else:
+            self.into(slot, register)
+
+    def visit_number(self, branch):
+        return self.constant(int(branch.value))
+
+    def visit_float(self, branch):
+        return self.constant(float(branch.value))
+
+    def visit_string(self, branch):
+        return self.constant(string(str(branch.value)))
+
+    def visit_name(self, branch):
+        depth, slot = self.slots[branch]
+        if not depth:
+            return slot
+        register = self.temp()
+        self.code.emit(Op.GETG, register, slot)
+        return register
+
+    def visit_expr(self, branch):
+        lhs = self.visit_value(branch.lhs)
+        rhs = self.visit_value(branch.rhs)
+        register = self.temp()
+        self.code.emit(BINOPS[branch.op], register, lhs, rhs, branch.pos)
+        return register
+
+    def visit_assign(self, branch):
+        self.store(branch, self.visit_value(branch.value))
+
+    def visit_set(self, branch):
+        self.store(branch, self.constant(ZEROS.get(branch.type, 0)))
+
+    def visit_import(self, branch):
+        # Includes are assembly libraries
+        pass
+
+    def visit_def(self, branch):
+        params = [param.name for param in branch.def_params if param is not None]
+        code = Code(branch.name, len(params), self.sizes[branch])
+        # Defined before its body, for recursive calls
+        self.defined[branch.name] = len(self.functions), code
+        self.functions.append(code)
+        outer = self.code, self.base, self.consts, self.loops
+        self.code, self.base, self.consts, self.loops = code, code.size, {}, []
+        self.compile(branch.body)
+        code.emit(Op.LEAVE)
+        self.code, self.base, self.consts, self.loops = outer
+
+    def visit_return(self, branch):
+        self.code.emit(Op.RETURN, self.visit_value(branch.value))
+
+    def visit_call(self, branch):
+        # The Resolver checked the function exists and the number of arguments
+        index, function = self.defined[branch.name]
+        params = [param for param in branch.params if param is not None]
+        # The arguments are passed in consecutive registers
+        first = self.temp(len(params))
+        for register, param in enumerate(params, first):
+            self.into(register, self.visit_value(param))
+        register = self.temp()
+        self.code.emit(Op.CALL, register, index, first, branch.pos)
+        return register
+
+    def visit_func_call(self, branch):
+        self.visit_call(branch)
+
+    def patch(self, jump, target=None):
+        # Point the jump at <jump> to <target>, the next instruction by default
+        code = self.code.code
+        target = len(code) if target is None else target
+        code[jump + (2 if code[jump] in (Op.JUMPF, Op.JUMPT) else 1)] = target
+
+    def unless(self, test):
+        # Jump taken when <test> is false
+        if test.kind == 'Expression' and test.op in UNLESS:
+            lhs = self.visit_value(test.lhs)
+            return self.code.emit(UNLESS[test.op], 0, lhs, self.visit_value(test.rhs), test.pos)
+        return self.code.emit(Op.JUMPF, self.visit_value(test))
+
+    def visit_if(self, branch):
+        skip = self.unless(branch.test)
+        self.compile(branch.body)
+        if branch.orelse:
+            end = self.code.emit(Op.JUMP)
+            self.patch(skip)
+            self.compile(branch.orelse)
+            self.patch(end)
+        else:
+            self.patch(skip)
+
+    def visit_while(self, branch):
+        # Until loops as long as its test is false
+        start = len(self.code.code)
+        if branch.kind == 'Until':
+            exit_ = self.code.emit(Op.JUMPT, self.visit_value(branch.test))
+        else:
+            exit_ = self.unless(branch.test)
+        self.loops.append((start, [exit_]))
+        self.compile(branch.body)
+        self.code.emit(Op.JUMP, start)
+        for jump in self.loops.pop()[1]:
+            self.patch(jump)
+
+    # The Resolver reported break and continue outside of a loop
+    def visit_break(self, branch):
+        self.loops[-1][1].append(self.code.emit(Op.JUMP))
+
+    def visit_continue(self, branch):
+        self.code.emit(Op.JUMP, self.loops[-1][0])
+
+
+def execute(program):
+    """
+    Run <program>, returns the value of the top level return (None without one)
+    """
+    MOVE, GETG, SETG, JUMP, JUMPF, JUMPT, CALL, RETURN, LEAVE = (
+        Op.MOVE.value, Op.GETG.value, Op.SETG.value, Op.JUMP.value, Op.JUMPF.value, Op.JUMPT.value,
+        Op.CALL.value, Op.RETURN.value, Op.LEAVE.value)
+    ADD, SUB, MUL, DIV, MOD, LT, LE, GT, GE, EQ, NE, AND, OR = (
+        Op.ADD.value, Op.SUB.value, Op.MUL.value, Op.DIV.value, Op.MOD.value, Op.LT.value, Op.LE.value,
+        Op.GT.value, Op.GE.value, Op.EQ.value, Op.NE.value, Op.AND.value, Op.OR.value)
+    JNLT, JNLE, JNGT, JNGE, JNEQ, JNNE = (
+        Op.JNLT.value, Op.JNLE.value, Op.JNGT.value, Op.JNGE.value, Op.JNEQ.value, Op.JNNE.value)
+    functions = program.functions
+    for function in functions:
+        function.prepare()
+    function = functions[0]
+    memory = frame = list(function.tail)
+    code = function.words
+    pc = 0
+    # (function, code, pc, frame, result register) of the callers
+    calls = []
+    op = b = c = 0
+    try:
+        while True:
+            op = code[pc]
+            a = code[pc + 1]
+            b = code[pc + 2]
+            c = code[pc + 3]
+            pc += 4
+            # Most frequent first
+            if op == ADD:
+                frame[a] = frame[b] + frame[c]
+            elif op == JUMP:
+                pc = a
+            elif op == JNLT:
+                if not frame[b] < frame[c]:
+                    pc = a
+            elif op == MOVE:
+                frame[a] = frame[b]
+            elif op == SUB:
+                frame[a] = frame[b] - frame[c]
+            elif op == GETG:
+                frame[a] = memory[b]
+            elif op == SETG:
+                memory[a] = frame[b]
+            elif op == JNEQ:
+                if not frame[b] == frame[c]:
+                    pc = a
+            elif op == JNGT:
+                if not frame[b] > frame[c]:
+                    pc = a
+            elif op == MUL:
+                frame[a] = frame[b] * frame[c]
+            elif op == CALL:
+                calls.append((function, code, pc, frame, a))
+                function = functions[b]
+                frame = frame[c:c + function.params] + function.tail
+                code = function.words
+                pc = 0
+            elif op == RETURN or op == LEAVE:
+                value = frame[a] if op == RETURN else None
+                if not calls:
+                    return value
+                function, code, pc, frame, a = calls.pop()
+                frame[a] = 0 if value is None else value
+            elif op == JUMPF:
+                if not frame[a]:
+                    pc = b
+            elif op == MOD:
+                frame[a] = modulo(frame[b], frame[c])
+            elif op == DIV:
+                frame[a] = divide(frame[b], frame[c])
+            elif op == JNLE:
+                if not frame[b] <= frame[c]:
+                    pc = a
+            elif op == JNGE:
+                if not frame[b] >= frame[c]:
+                    pc = a
+            elif op == JNNE:
+                if not frame[b] != frame[c]:
+                    pc = a
+            elif op == JUMPT:
+                if frame[a]:
+                    pc = b
+            elif op == LT:
+                frame[a] = 1 if frame[b] < frame[c] else 0
+            elif op == GT:
+                frame[a] = 1 if frame[b] > frame[c] else 0
+            elif op == EQ:
+                frame[a] = 1 if frame[b] == frame[c] else 0
+            elif op == LE:
+                frame[a] = 1 if frame[b] <= frame[c] else 0
+            elif op == GE:
+                frame[a] = 1 if frame[b] >= frame[c] else 0
+            elif op == NE:
+                frame[a] = 1 if frame[b] != frame[c] else 0
+            elif op == AND:
+                frame[a] = 1 if frame[b] and frame[c] else 0
+            elif op == OR:
+                frame[a] = 1 if frame[b] or frame[c] else 0
+    except (TypeError, ZeroDivisionError) as ex:
+        fail(function.position(pc - 4), ex, SYMBOLS[Op(op)], frame[b], frame[c])
@@ -0,0 +1,42 @@
+# Thin client for the compile server (python main.py --serve --socket <path>)
+# Usage : python client.py <socket> <compile|run|highlight> <file.yp> <options>
+#   compile writes <file>.asm like the regular CLI, run and highlight print their output
+import json
+import socket
+import sys
+
+
+def request(path, payload):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(payload) + '\n').encode())
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('r') as response:
+            return json.loads(response.readline())
+
+
+def main(args):
+    if len(args) < 3:
+        print('Usage : python client.py <socket> <compile|run|highlight> <file.yp> <options>')
+        return 2
+    path, op, target, *options = args
+    with open(target, 'r') as file:
+        source = file.read()
+    response = request(path, {'id': 0, 'op': op, 'file': target, 'source': source, 'options': options})
+    if response.get('diagnostics'):
+        sys.stdout.write(response['diagnostics'])
+    if not response['ok']:
+        return 1
+    match op:
+        case "compile":
+            with open(target[:len(target) - 3] + '.asm', 'w') as file:
+                file.write(response['asm'])
+        case "run":
+            sys.stdout.write(response['output'])
+        case "highlight":
+            print(response['text'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,339 @@
+# Closure compilation of the AST, the engine of the run mode
+#
+# The AST is walked once: every node becomes a Python closure and running the
+# program only calls closures, no node is looked at again. Names get their slots
+# from the interpreter's Resolver, a frame is a list indexed by them. At the top
+# level the frame is the list of the globals, a function call gets a new frame
+# (params first) and reaches the globals through the list its closures hold.
+# Value closures return their value, statement closures return None or a
+# signal: BREAK, CONTINUE or a Return carrying the returned value.
+from interpreter import OPERATORS, ZEROS, Resolver, fail, string
+from visitor import Visitor
+
+BREAK = object()
+CONTINUE = object()
+
+
+class Return:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Function:
+    # <locals> is the tail of a new frame, the slots after the params
+    __slots__ = ('name', 'params', 'locals', 'body')
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+        self.locals = []
+        self.body = None
+
+
+def arithmetic(op):
+    # Closure of lhs <op> rhs for the operators Python has, named for tracebacks
+    def make(lhs, rhs, error):
+        match op:
+            case '+':
+                def add(frame):
+                    n1, n2 = lhs(frame), rhs(frame)
+                    try:
+                        return n1 + n2
+                    except TypeError as ex:
+                        error(ex, n1, n2)
+                return add
+            case '-':
+                def sub(frame):
+                    n1, n2 = lhs(frame), rhs(frame)
+                    try:
+                        return n1 - n2
+                    except TypeError as ex:
+                        error(ex, n1, n2)
+                return sub
+            case '*':
+                def mul(frame):
+                    n1, n2 = lhs(frame), rhs(frame)
+                    try:
+                        return n1 * n2
+                    except TypeError as ex:
+                        error(ex, n1, n2)
+                return mul
+    return make
+
+
+def comparison(op):
+    # Closure of lhs <op> rhs giving 1 or 0
+    def make(lhs, rhs, error):
+        match op:
+            case '<':
+                def lt(frame):
+                    n1, n2 = lhs(frame), rhs(frame)
+                    try:
+                        return 1 if n1 < n2 else 0
+                    except TypeError as ex:
+                        error(ex, n1, n2)
+                return lt
+            case '<=':
+                def le(frame):
+                    n1, n2 = lhs(frame), rhs(frame)
+                    try:
+                        return 1 if n1 <= n2 else 0
+                    except TypeError as ex:
+                        error(ex, n1, n2)
+                return le
+            case '>':
+                def gt(frame):
+                    n1, n2 = lhs(frame), rhs(frame)
+                    try:
+                        return 1 if n1 > n2 else 0
+                    except TypeError as ex:
+                        error(ex, n1, n2)
+                return gt
+            case '>=':
+                def ge(frame):
+                    n1, n2 = lhs(frame), rhs(frame)
+                    try:
+                        return 1 if n1 >= n2 else 0
+                    except TypeError as ex:
+                        error(ex, n1, n2)
+                return ge
+            case '==':
+                def eq(frame):
+                    return 1 if lhs(frame) == rhs(frame) else 0
+                return eq
+            case '!=':
+                def ne(frame):
+                    return 1 if lhs(frame) != rhs(frame) else 0
+                return ne
+    return make
+
+
+def generic(op):
+    # The other operators go through the shared table
+    function = OPERATORS[op]
+
+    def make(lhs, rhs, error):
+        def binop(frame):
+            n1, n2 = lhs(frame), rhs(frame)
+            try:
+                return function(n1, n2)
+            except (TypeError, ZeroDivisionError) as ex:
+                error(ex, n1, n2)
+        return binop
+    return make
+
+
+# Operator -> maker of its closure
+BINOPS = {op: generic(op) for op in OPERATORS}
+BINOPS.update({op: arithmetic(op) for op in ('+', '-', '*')})
+BINOPS.update({op: comparison(op) for op in ('<', '<=', '>', '>=', '==', '!=')})
+
+
+class Closures(Visitor):
+    # Compiles a tree into closures, build() returns the function running it
+    statements = {
+        'VarAssign': 'visit_assign',
+        'VarSet': 'visit_set',
+        'Def': 'visit_def',
+        'Return': 'visit_return',
+        'Import': 'visit_import',
+        'FuncCall': 'visit_func_call',
+        'If': 'visit_if',
+        'While': 'visit_while',
+        'Until': 'visit_while',
+        'BREAK': 'visit_break',
+        'CONTINUE': 'visit_continue',
+    }
+    values = {
+        'FuncCall': 'visit_call',
+        'Number': 'visit_number',
+        'Float': 'visit_float',
+        'Name': 'visit_name',
+        'Expression': 'visit_expr',
+        'String': 'visit_string',
+    }
+    name = 'interpreter'
+
+    def __init__(self, count=None, hotspots=None):
+        super().__init__(count)
+        # Times every line and function when set (see hotspots)
+        self.hotspots = hotspots
+        # (depth, slot) of the variable accesses and frame sizes from the Resolver
+        self.slots = {}
+        self.sizes = {}
+        # Values of the globals
+        self.memory = []
+        self.functions = {}
+
+    def build(self, tree):
+        """
+        Compile <tree>, returns a function running it which gives the value of the top level return
+        """
+        resolver = Resolver().resolve(tree)
+        self.slots, self.sizes = resolver.slots, resolver.sizes
+        memory = self.memory
+        memory.extend(0 for _ in range(self.sizes[None]))
+        body = self.block(tree.body)
+        if self.hotspots is not None:
+            from hotspots import MODULE
+            body = self.hotspots.function(body, MODULE)
+
+        def run():
+            signal = body(memory)
+            if signal is not None:
+                return signal.value
+        return run
+
+    def block(self, body):
+        steps = []
+        for statement in body:
+            step = self.visit(statement)
+            if step is None:
+                continue
+            if self.hotspots is not None:
+                step = self.hotspots.line(step, statement.pos[1])
+            steps.append(step)
+        if len(steps) == 1:
+            return steps[0]
+
+        def block(frame):
+            for step in steps:
+                signal = step(frame)
+                if signal is not None:
+                    return signal
+        return block
+
+    def visit_number(self, branch):
+        value = int(branch.value)
+        return lambda frame: value
+
+    def visit_float(self, branch):
+        value = float(branch.value)
+        return lambda frame: value
+
+    def visit_string(self, branch):
+        value = string(str(branch.value))
+        return lambda frame: value
+
+    def visit_name(self, branch):
+        depth, slot = self.slots[branch]
+        if not depth:
+            return lambda frame: frame[slot]
+        memory = self.memory
+        return lambda frame: memory[slot]
+
+    def visit_expr(self, branch):
+        op = branch.op
+        pos = branch.pos
+        return BINOPS[op](self.visit_value(branch.lhs), self.visit_value(branch.rhs),
+                          lambda ex, n1, n2: fail(pos, ex, op, n1, n2))
+
+    def visit_assign(self, branch):
+        value = self.visit_value(branch.value)
+        depth, slot = self.slots[branch]
+        if depth:
+            memory = self.memory
+
+            def assign(frame):
+                memory[slot] = value(frame)
+        else:
+            def assign(frame):
+                frame[slot] = value(frame)
+        return assign
+
+    def visit_set(self, branch):
+        zero = ZEROS.get(branch.type, 0)
+        depth, slot = self.slots[branch]
+        target = self.memory if depth else None
+
+        def reserve(frame):
+            (frame if target is None else target)[slot] = zero
+        return reserve
+
+    def visit_import(self, branch):
+        # Includes are assembly libraries
+        return None
+
+    def visit_def(self, branch):
+        params = [param.name for param in branch.def_params if param is not None]
+        function = Function(branch.name, params)
+        function.locals = [0] * (self.sizes[branch] - len(params))
+        # Defined before its body, for recursive calls
+        self.functions[branch.name] = function
+        function.body = self.block(branch.body)
+        if self.hotspots is not None:
+            function.body = self.hotspots.function(function.body, branch.name)
+        return None
+
+    def visit_return(self, branch):
+        value = self.visit_value(branch.value)
+        return lambda frame: Return(value(frame))
+
+    def visit_call(self, branch):
+        # The Resolver checked the function exists and the number of arguments
+        function = self.functions[branch.name]
+        args = [self.visit_value(param) for param in branch.params if param is not None]
+
+        def call(frame):
+            local = [arg(frame) for arg in args]
+            local += function.locals
+            signal = function.body(local)
+            return 0 if signal is None else signal.value
+        return call
+
+    def visit_func_call(self, branch):
+        call = self.visit_call(branch)
+
+        def statement(frame):
+            call(frame)
+        return statement
+
+    def visit_if(self, branch):
+        test = self.visit_value(branch.test)
+        body = self.block(branch.body)
+        if not branch.orelse:
+            def if_(frame):
+                if test(frame):
+                    return body(frame)
+            return if_
+        orelse = self.block(branch.orelse)
+
+        def if_else(frame):
+            if test(frame):
+                return body(frame)
+            return orelse(frame)
+        return if_else
+
+    def visit_while(self, branch):
+        test = self.visit_value(branch.test)
+        body = self.block(branch.body)
+
+        if branch.kind == 'Until':
+            def until(frame):
+                while not test(frame):
+                    signal = body(frame)
+                    if signal is not None:
+                        if signal is BREAK:
+                            break
+                        if signal is not CONTINUE:
+                            return signal
+            return until
+
+        def while_(frame):
+            while test(frame):
+                signal = body(frame)
+                if signal is not None:
+                    if signal is BREAK:
+                        break
+                    if signal is not CONTINUE:
+                        return signal
+        return while_
+
+    # The Resolver reported break and continue outside of a loop
+    def visit_break(self, branch):
+        return lambda frame: BREAK
+
+    def visit_continue(self, branch):
+        return lambda frame: CONTINUE
@@ -1,150 +1,374 @@
-from utils import RegOps, Null, Int, Value, Variable, Def_Types, Variables, Registers, Expression, Register
+import io
+import layout
+from ir import Op, Imm, Label, Mem, Reg, Segment, TERMINATORS
+import peephole
+import profiler
+import regalloc
+import ssa
+from utils import RegOps, Null, Int, Float, String, Variable, Variables, Registers, IV_Types, Frame
 import errors as xsErrors
 
 START_FUNC = 'CMAIN'
+# 0: none, 1: AST optimizations (see main.codegen), unused SSA values and register allocation, 2: 1 and peephole
+LEVELS = {'O0': 0, 'O1': 1, 'O2': 2}
 
 
 class X64Registers:
-    op1 = Register('rax')
-    op2 = Register('rbx')
+    op1 = Reg('rax')
+    op2 = Reg('rbx')
     all_ = [op1, op2]
+    bp = Reg('rbp')
+    sp = Reg('rsp')
+    low1 = Reg('al')
+    low2 = Reg('bl')
+    rem = Reg('rdx')
+    extend = Op.CQO
+    # System V integer argument registers
+    args = tuple(Reg(name) for name in ('rdi', 'rsi', 'rdx', 'rcx', 'r8', 'r9'))
+    # Callee-saved registers (rbp aside), kept by the prologue and epilogue of whoever uses them
+    saved = tuple(Reg(name) for name in ('rbx', 'r12', 'r13', 'r14', 'r15'))
 
 
 class Codegen:
-    bss  = ["section .bss"]
-    data = ["section .data"]
-    code = ["section .text", f"global {START_FUNC}"]
-    segments = {
-        f"{START_FUNC}": []
-    }
-    func_segments = {}
-    pkgs = []
-
+    # All state belongs to the instance, so every compilation gets its own Codegen
     def __init__(self, opts):
+        self.bss = ["section .bss"]
+        self.data = ["section .data"]
+        self.code = ["section .text", f"global {START_FUNC}"]
+        self.segments = {
+            f"{START_FUNC}": Segment()
+        }
+        # Function (ssa) -> its segment
+        self.func_segments = {}
+        # Lowering state: block -> segment, SSA value -> home, Slot -> memory, string -> data label
+        self.labels = {}
+        self.homes = {}
+        self.slots = {}
+        self.strings = {}
+        # (segment, enclosing frame) of the functions being compiled
+        self.frames = []
+        # Entry segment of a function -> all its segments, their frame is set up by emit
+        self.functions = {}
+        self.variables = Variables()
+        # Cover name -> (type, element count) of the set variables
+        self.reservations = {}
+        self.registers = Registers
+        self.bits = 32
+        self.pool = regalloc.POOLS['32bit']
+        # Optimization level (-O<level>) and the number of instructions removed by the peephole pass
+        self.level = 1
+        self.removed = 0
         self.head = []
         self.opts = opts
         self.configure()
-        self.sg_mem = []
         self.cur = None
-        self.prev = None
-        self.heap_name = None
         self.set_cur(f'{START_FUNC}')
 
     def configure(self):
         for option in self.opts:
             if option == '64bit':
                 self.include('io64.inc')
-                global Registers
-                Registers = X64Registers()
+                self.registers = X64Registers
+                self.bits = 64
+                self.pool = regalloc.POOLS['64bit']
             elif option == '32bit':
                 self.include('io.inc')
+            elif option in LEVELS:
+                self.level = LEVELS[option]
 
     def variables_dump(self):
-        for var in Variables.variables_name.items():
-            val = Variables.variables[var[1]]
-            typ = val.type
-            if var[1][0] == 'u':
-                self.bss.append(f'{var[1]} resb')
-            else:
-                self.data.append(f'{var[1]} {Def_Types.find[typ]} {val.representation()}')
+        data, bss = layout.plan(self.variables.variables, self.reservations, self.bits)
+        self.data.extend(data)
+        self.bss.extend(bss)
 
     def set_cur(self, name):
-        self.cur: list = self.segments[name]
-        self.heap_name = name
-
-    def __add__(self, other):
-        self.cur.append(other)
+        self.cur: Segment = self.segments[name]
 
     def auto_segment(self, cur=True):
         x = f'S{len(self.segments)}'
         self.new_segment(x, cur)
         return x
 
-    def function(self, name, params):
-        for param in params:
-            if param is None:
-                continue
-            self.cur.append(RegOps.push(param.representation()))
-        self.func_segments[name] = self.auto_segment()
+    # Compile into <segment> with its own stack frame, until end_function. Returns the homes of the <params>
+    def function(self, segment, params):
+        self.frames.append((segment, self.variables.frame))
+        self.variables.frame = Frame(self.registers, self.bits // 8)
+        return [self.variables.frame.param(name, index) for index, name in enumerate(params)]
 
-    def run_function(self, name):
-        if name not in self.func_segments:
-            return 10
+    def end_function(self, segments):
+        segment, enclosing = self.frames.pop()
+        frame = self.variables.frame
+        code = self.segments[segment]
+        code.insert(0, [RegOps.mov(cover, register) for cover, register in frame.saves])
+        if code.ops[-1] not in TERMINATORS:
+            code += [(Op.LEAVE, None, None), (Op.RET, None, None)]
+        self.functions[segment] = segments
+        self.variables.frame = enclosing
 
-        name = self.func_segments[name]
+    def make_frames(self):
+        # Prologues and epilogues, once the registers and slots still used are known (after regalloc and peephole).
+        # A function gets a frame as deep as the lowest slot it addresses, the functions and the top level code
+        # (called by the runtime) push the callee-saved registers they name and pop them before leaving.
+        word = self.bits // 8
+        bp, sp = self.registers.bp, self.registers.sp
+        owned = {name for segments in self.functions.values() for name in segments}
+        top = [name for name in self.segments if name not in owned]
+        for entry, names in [*self.functions.items(), (START_FUNC, top)]:
+            segments = [self.segments[name] for name in names]
+            named, depth = self.footprint(segments)
+            saved = [register for register in self.registers.saved if regalloc.FAMILIES[register.name] in named]
+            # rsp stays 16 byte aligned on 64 bit (the call pushed 8, a function pushes rbp)
+            pushed = len(saved) * word + (0 if entry in self.functions else word)
+            size = depth + (-(depth + pushed) % 16 if self.bits == 64 else 0)
+            grow = [(Op.SUB, sp, Imm(size))] if size else []
+            shrink = [(Op.ADD, sp, Imm(size))] if size else []
+            pushes = [RegOps.push(register) for register in saved]
+            pops = [RegOps.pop(register) for register in reversed(saved)]
+            if entry in self.functions:
+                prologue, epilogue, leave = [RegOps.push(bp), RegOps.mov(bp, sp)] + grow + pushes, pops, Op.LEAVE
+            else:
+                prologue, epilogue, leave = pushes + grow, shrink + pops, Op.RET
+            self.segments[entry].insert(0, prologue)
+            if epilogue:
+                for code in segments:
+                    for index in reversed([index for index, op in enumerate(code.ops) if op == leave]):
+                        code.insert(index, epilogue)
 
-        self.cur.append(RegOps.jump(name))
-        self.set_cur(name)
+    def footprint(self, segments):
+        # Full names of the registers <segments> name, and the bytes of stack frame below the base pointer they address
+        named = set()
+        depth = 0
+        bp = self.registers.bp.name
+        for code in segments:
+            for operand in (*code.dst, *code.src):
+                if type(operand) is Reg:
+                    named.add(regalloc.FAMILIES.get(operand.name, operand.name))
+                elif type(operand) is Mem and operand.reg == bp and operand.disp < 0:
+                    depth = max(depth, -operand.disp)
+        return named, depth
 
-    # Shift value of node1 into node2
-    def shift(self, node1, node2):
-        self.cur.append(RegOps.mov(Registers.op1, node1.representation()))
-        self.cur.append(RegOps.mov(node2.representation(True), Registers.op1))
+    # Call the function at <segment> with the operands <args>, its return value is left in op1
+    def run_function(self, segment, args=()):
+        sp = self.registers.sp
+        word = self.bits // 8
+        registers = self.registers.args
+        stack = args[len(registers):]
+        # Arguments beyond the registers are pushed right to left, padded to keep rsp 16 byte aligned
+        pad = word if self.bits == 64 and len(stack) % 2 else 0
+        if pad:
+            self.cur.append((Op.SUB, sp, Imm(pad)))
+        for arg in reversed(stack):
+            self.cur.append(RegOps.mov(self.registers.op1, arg))
+            self.cur.append(RegOps.push(self.registers.op1))
+        for register, arg in zip(registers, args):
+            self.cur.append(RegOps.mov(register, arg))
+        self.cur.append(RegOps.call(segment))
+        if stack:
+            self.cur.append((Op.ADD, sp, Imm(len(stack) * word + pad)))
 
+    # Reserve <node> (element count) elements of <type_>, returns the memory of the variable
     def set(self, name, node, type_):
-        Variable(name, None)
-        #self.bss.append(f'{name} resb {node if node else ""}')
-
-    def bin_op(self, op, node1: Value, node2: Value, single_op=False, disable_info=False):
-        # Move <node1> and <node2> to operation registers
-        if not single_op:
-            self.cur.append(RegOps.mov(Registers.op1, node1.representation()))
-            self.cur.append(RegOps.mov(Registers.op2, node2.representation()))
-        # Operation on <node1> and <node2>
-        self.cur.append(RegOps.binaryOp(op, Registers.op1, Registers.op2))
-        if node1.dst_ava:
-            self.cur.append(RegOps.mov(node1.representation(True), Registers.op1))
-        else:
-            if not disable_info:
-                xsErrors.stdwarning('Operation has no effect')
+        count = int(node) if node and node.isnumeric() else 1
+        var = Variable(name, None, self.variables, layout.size(IV_Types.find.get(type_), self.bits) * count)
+        if not self.variables.local(var.cover):
+            self.reservations[var.cover] = (type_, count)
+        return var.operand(True)
 
     def new_segment(self, name, cur=True):
-        self.segments[name] = []
+        self.segments[name] = Segment()
         if cur:
             self.set_cur(name)
 
-    def return_(self, value):
-        self.cur.append(f'mov eax, {value.representation()}')
-
-    def retrieve_return_value(self, value: Value):
-        self.cur.append(f'mov {value.representation(True)}, eax')
-
     def make_end(self):
-        self.cur.append(RegOps.jump('end'))
+        if not len(self.cur) or self.cur.ops[-1] not in TERMINATORS:
+            self.cur.append(RegOps.jump('end'))
         self.new_segment('end')
         self.cur.append(RegOps.popall())
-        self.bin_op('xor', Registers.op1, Registers.op1, True, True)
-        self.cur.append('ret')
+        self.cur.append((Op.XOR, self.registers.op1, self.registers.op1))
+        self.cur.append((Op.RET, None, None))
+
+    def generate(self, module):
+        """
+        Lower the SSA <module> into segments: every function and every block gets one, the entry
+        block of the top level code is START_FUNC. Returns the Codegen.
+        """
+        for store in self.initializers(module.main):
+            store.drop()
+            store.block.instrs.remove(store)
+        for slot in module.globals.values():
+            if slot.reserved:
+                self.slots[slot] = self.set(slot.name, slot.size, slot.type)
+            elif slot not in self.slots:
+                initial = Float(0.0) if slot.type == IV_Types.float_ else Int(0)
+                self.slots[slot] = Variable(slot.name, initial, self.variables).operand(True)
+        for function in module.functions:
+            self.func_segments[function] = self.auto_segment(False)
+        for function in module.functions:
+            self.lower(function, self.func_segments[function])
+        self.lower(module.main, START_FUNC)
+        return self
+
+    def initializers(self, main):
+        # Constant stores to globals before anything could read them become the initial values of their data entries
+        found = []
+        touched = set()
+        for instr in main.entry.instrs:
+            if instr.op == 'call':
+                break
+            slot = instr.attr
+            if instr.op == 'store' and slot not in touched and not slot.reserved:
+                value = instr.args[0]
+                if isinstance(value, ssa.Const) and value.type in (IV_Types.int_, IV_Types.float_):
+                    cls = Float if value.type == IV_Types.float_ else Int
+                    self.slots[slot] = Variable(slot.name, cls(value.value), self.variables).operand(True)
+                    found.append(instr)
+            if instr.op in ('load', 'store'):
+                touched.add(slot)
+        return found
+
+    def lower(self, function, segment):
+        function.number()
+        ssa.split_critical_edges(function)
+        self.homes = {}
+        if function.name is not None:
+            self.homes.update(zip(function.params, self.function(segment, [param.attr for param in function.params])))
+        self.labels = {function.entry: segment}
+        for block in function.blocks[1:]:
+            self.labels[block] = self.auto_segment(False)
+        for block in function.blocks:
+            self.set_cur(self.labels[block])
+            for instr in block.instrs:
+                self.lower_instr(instr, function)
+        if function.name is not None:
+            self.end_function(list(self.labels.values()))
 
-    def translate_expr_2_cmp(self, node1: Value, node2: Value):
-        self.cur.append(RegOps.mov(Registers.op1, node1.representation()))
-        self.cur.append(RegOps.mov(Registers.op2, node2.representation()))
-        self.cur.append(f'cmp {Registers.op1}, {Registers.op2}')
+    def lower_instr(self, instr, function):
+        op1, op2 = self.registers.op1, self.registers.op2
+        match instr.op:
+            case 'binop':
+                lhs, rhs = instr.args
+                self.cur += [RegOps.mov(op1, self.operand(lhs)), RegOps.mov(op2, self.operand(rhs))]
+                code = RegOps.binaryOp(instr.attr, self.registers)
+                if code is None:
+                    xsErrors.crit_err(9, 'OperatorError', f"The operator '{instr.attr}' is not supported by the compiler")
+                self.cur += code
+                self.result(instr)
+            case 'call':
+                self.run_function(self.func_segments[instr.attr], [self.operand(arg) for arg in instr.args])
+                self.result(instr)
+            case 'load':
+                self.cur.append(RegOps.mov(op1, self.memory(instr.attr)))
+                self.result(instr)
+            case 'store':
+                self.put(self.memory(instr.attr), self.operand(instr.args[0]))
+            case 'jump':
+                self.copies(instr.block, instr.attr)
+                self.cur.append(RegOps.jump(self.labels[instr.attr]))
+            case 'branch':
+                then, other = instr.attr
+                self.cur += [RegOps.mov(op1, self.operand(instr.args[0])), RegOps.compare(op1, Imm(0)),
+                             RegOps.jump(self.labels[other], '=='), RegOps.jump(self.labels[then])]
+            case 'ret':
+                if instr.args:
+                    self.cur.append(RegOps.mov(op1, self.operand(instr.args[0])))
+                if function.name is None:
+                    self.cur.append(RegOps.jump('end'))
+                else:
+                    self.cur += [(Op.LEAVE, None, None), (Op.RET, None, None)]
 
-    def if_start(self, op):
-        name = self.auto_segment(False)
-        self.cur.append(RegOps.jump(name, op))
+    def operand(self, value):
+        if isinstance(value, ssa.Const):
+            if value.type == IV_Types.string:
+                return Label(self.string(value.value))
+            return (Float if value.type == IV_Types.float_ else Int)(value.value).operand()
+        if isinstance(value, ssa.Undef):
+            return Imm(0)
+        return self.home(value)
 
-    def out_if(self):
-        self.set_cur(self.heap_name)
+    def home(self, value):
+        # Memory of an SSA value, a stack frame slot in functions, a bss entry at the top level
+        if value not in self.homes:
+            if self.variables.frame is not None:
+                self.homes[value] = self.variables.frame.slot(f'%{value.id}')
+            else:
+                cover = self.variables.assign(f'%{value.id}', True)
+                self.variables.define_var(cover, Null())
+                self.reservations[cover] = (IV_Types.int_, 1)
+                self.homes[value] = Mem(cover)
+        return self.homes[value]
+
+    def memory(self, slot):
+        # Reservations of functions are made once their frame exists
+        if slot not in self.slots:
+            self.slots[slot] = self.set(slot.name, slot.size, slot.type)
+        return self.slots[slot]
+
+    def string(self, text):
+        # Data label of the string constant <text>
+        if text not in self.strings:
+            self.strings[text] = Variable(f'%s{len(self.strings)}', String(text), self.variables).cover
+        return self.strings[text]
+
+    def result(self, instr):
+        # The value of <instr> is in op1
+        if instr.uses:
+            self.cur.append(RegOps.mov(self.home(instr), self.registers.op1))
+
+    def put(self, dst, src):
+        # No memory to memory mov, immediates go to memory directly if they fit in 32 bit
+        if type(src) is Imm and (self.bits == 32 or -2 ** 31 <= int(f'{src.value}', 0) < 2 ** 31):
+            self.cur.append(RegOps.mov(dst.sized(layout.NAMES[self.bits // 8]), src))
+        else:
+            self.cur += [RegOps.mov(self.registers.op1, src), RegOps.mov(dst, self.registers.op1)]
+
+    def copies(self, block, target):
+        # Parallel copy of the phi operands <target> gets from <block>
+        if not target.phis:
+            return
+        index = target.preds.index(block)
+        moves = [(self.home(phi), self.operand(phi.args[index])) for phi in target.phis if phi.uses]
+        moves = [(dst, src) for dst, src in moves if dst != src]
+        written = {dst for dst, _ in moves}
+        if any(src in written for _, src in moves):
+            # A phi reads another phi of <target>, every operand is read before any phi is written
+            op1 = self.registers.op1
+            for _, src in moves:
+                self.cur += [RegOps.mov(op1, src), RegOps.push(op1)]
+            for dst, _ in reversed(moves):
+                self.cur += [RegOps.pop(op1), RegOps.mov(dst, op1)]
+        else:
+            for dst, src in moves:
+                self.put(dst, src)
 
     def include(self, module):
         self.head.append(f"%include '{module}'")
 
     def dump(self):
+        sink = io.StringIO()
+        self.emit(sink)
+        return sink.getvalue()
+
+    def emit(self, sink):
+        # Write the program to the file-like <sink> one segment at a time (entry segment last)
         self.variables_dump()
         self.make_end()
-        code = self.code + [""]
-        start = self.segments.pop(f'{START_FUNC}')
-        start[0] = "   " + start[0]
-        start = [f'{START_FUNC}:'] + ["\n   ".join(start)]
-        for segment in self.segments.keys():
-            value = self.segments[segment]
-            value[0] = "   " + value[0]
-            value = "\n   ".join(value)
-            value = [f'{segment}:'] + [value]
-            value.append('')
-            code = code + value
-        full = self.head + self.data + self.bss + code + start
-        full = "\n".join(full)
-        return full
+        if self.level >= 1:
+            with profiler.phase('regalloc'):
+                regalloc.allocate(self.segments, self.pool)
+        if self.level >= 2:
+            with profiler.phase('peephole'):
+                order = [name for name in self.segments if name != START_FUNC] + [START_FUNC]
+                self.removed = peephole.optimize(self.segments, order, self.pool)
+        self.make_frames()
+        sink.write("\n".join(self.head + self.data + self.bss + self.code))
+        sink.write("\n")
+        for name, segment in self.segments.items():
+            if name != START_FUNC:
+                self.emit_segment(sink, name, segment)
+                sink.write("\n")
+        self.emit_segment(sink, START_FUNC, self.segments[START_FUNC])
+
+    @staticmethod
+    def emit_segment(sink, name, segment):
+        sink.write(f"\n{name}:\n   ")
+        sink.write("\n   ".join(segment.render()))
@@ -1,121 +1,270 @@
 import os.path
 from codegen import Codegen
-from utils import RegOps, Int, Value, Variable, Def_Types, Variables, Registers, Expression, Float, String
+from utils import IV_Types, RegOps
 import errors as xsErrors
+import nodes
+import ssa
+from visitor import Visitor
 
+# Fields holding statement lists
+BODIES = ('body', 'orelse')
 
-class Compiler:
-    def __init__(self, opts):
+
+def assigned(body):
+    # Names assigned by <body>, outside of the functions it defines
+    for statement in body:
+        if statement.kind in ('VarAssign', 'VarSet'):
+            yield statement.name
+        elif statement.kind != 'Def':
+            for field in BODIES:
+                yield from assigned(getattr(statement, field, None) or ())
+
+
+def definitions(body):
+    for statement in body:
+        if statement.kind == 'Def':
+            yield statement
+        for field in BODIES:
+            yield from definitions(getattr(statement, field, None) or ())
+
+
+def mentioned(node):
+    # Names read or assigned in <node> (or a list of nodes)
+    if isinstance(node, list):
+        for item in node:
+            yield from mentioned(item)
+    elif isinstance(node, nodes.Node):
+        if node.kind == 'Name':
+            yield node.value
+        elif node.kind in ('VarAssign', 'VarSet'):
+            yield node.name
+        for field in node.fields:
+            yield from mentioned(getattr(node, field))
+
+
+class Compiler(Visitor):
+    # Lowers the AST into its SSA form (see ssa), which the Codegen lowers into assembly
+    statements = {
+        'VarAssign': 'visit_assign',
+        'Def': 'visit_def',
+        'Return': 'visit_return',
+        'Import': 'visit_import',
+        'VarSet': 'visit_set',
+        'FuncCall': 'visit_func_call',
+        'If': 'visit_if',
+        'While': 'visit_while',
+        'Until': 'visit_while',
+        'BREAK': 'visit_break',
+        'CONTINUE': 'visit_continue',
+    }
+    values = {
+        'FuncCall': 'visit_call',
+        'Number': 'visit_number',
+        'Float': 'visit_float',
+        'Name': 'visit_name',
+        'Expression': 'visit_expr',
+        'String': 'visit_string',
+    }
+    name = 'compiler'
+
+    def __init__(self, opts, count=None):
+        super().__init__(count)
         self.cg = Codegen(opts)
+        self.module = ssa.Module()
+        self.builder = None
+        # Names of the SSA variables of the function being compiled (None at the top level)
+        # and name -> Slot of the memory variables of the current scope
+        self.locals = None
+        self.memory = self.module.globals
+        # Top level names assigned so far, and the ones a function uses (they live in memory)
+        self.declared = set()
+        self.shared = set()
+        # Name -> Function defined so far, (continue, break) blocks of the enclosing loops
+        self.functions = {}
+        self.loops = []
 
     def make(self, tree):
-        self.compile(tree[1]['body'])
-        return self.cg.dump()
-
-    def compile(self, ast):
-        for branch in ast:
-            if branch[0] == 'VarAssign':
-                self.visit_assign(branch)
-            elif branch[0] == 'Def':
-                self.visit_def(branch)
-            elif branch[0] == 'Return':
-                self.visit_return(branch)
-            elif branch[0] == 'Import':
-                self.visit_import(branch)
-            elif branch[0] == 'VarSet':
-                self.visit_set(branch)
-            elif branch[0] == 'FuncCall':
-                self.visit_func_call(branch)
+        return self.build(tree).dump()
+
+    def build(self, tree):
+        # Compile without rendering, the returned Codegen can emit() to a file
+        return self.cg.generate(self.lower(tree))
+
+    def lower(self, tree):
+        """
+        SSA form (ssa.Module) of <tree>
+        """
+        used = {name for definition in definitions(tree.body) for name in mentioned(definition.body)}
+        self.shared = used.intersection(assigned(tree.body))
+        self.builder = ssa.Builder(self.module.main)
+        self.compile(tree.body)
+        self.finish()
+        return self.module
+
+    def finish(self):
+        self.builder.finish()
+        if self.cg.level >= 1:
+            ssa.remove_dead(self.builder.function)
+
+    def defined(self, name):
+        return name in self.memory or name in self.declared or (self.locals is not None and name in self.locals)
+
+    def slot(self, name):
+        # Memory variable named <name>, None for an SSA variable
+        if name in self.memory:
+            return self.memory[name]
+        if self.locals is not None and name in self.locals:
+            return None
+        return self.module.globals.get(name)
 
     def visit_set(self, branch):
-        name = branch[1]['name']
-        type_ = branch[1]['type']
-        size = branch[1]['size']
-        pos = branch[2][0], branch[2][1]
+        name = branch.name
+        type_ = branch.type
+        size = branch.size
+        pos = branch.pos[0], branch.pos[1]
 
         if size and size.isnumeric() and int(size) > 10000:
             xsErrors.stderr(7, pos[0], pos[1], "Reservation size is > 10,000", True)
         elif size and not size.isnumeric():
             xsErrors.stdwarning("Reservation size is not numeric")
 
-        self.cg.set(name, size, type_)
+        self.memory[name] = ssa.Slot(name, type_, size, True)
+        if self.locals is None:
+            self.declared.add(name)
 
     def visit_import(self, branch):
-        name = branch[1]['module']
+        name = branch.module
         name = os.path.abspath(os.path.join(os.curdir, 'include', name + ".inc"))
-        pos = branch[2]
+        pos = branch.pos
         if not os.path.exists(name):
             xsErrors.stderr(6, (pos[0], pos[0]), pos[1], f"Module not found '{name}'", True)
             return
         self.cg.include(name)
 
     def visit_def(self, branch):
-        name = branch[1]['name']
-        body = branch[1]['body']
-        params = branch[1]['def_params']
+        function = ssa.Function(branch.name)
+        self.module.functions.append(function)
+        # Defined before its body, for recursive calls
+        self.functions[branch.name] = function
 
-        x = self.cg.heap_name
-        self.cg.function(name, params)
-        self.compile(body)
-        self.cg.set_cur(x)
+        outer = self.builder, self.locals, self.memory, self.loops
+        self.builder = ssa.Builder(function)
+        self.locals, self.memory, self.loops = set(), {}, []
+        for param in branch.def_params:
+            if param is not None:
+                self.builder.param(param.name, IV_Types.find.get(param.type, param.type))
+                self.locals.add(param.name)
+        self.compile(branch.body)
+        self.finish()
+        self.builder, self.locals, self.memory, self.loops = outer
 
     def visit_func_call(self, branch):
-        name = branch[1]["name"]
-        params = branch[1]["params"]
-        pos = branch[2]
+        name = branch.name
+        params = branch.params
+        pos = branch.pos
 
-        x = self.cg.run_function(name)
-        if x == 10:
+        args = [self.visit_value(param) for param in params if param is not None]
+        if name not in self.functions:
             xsErrors.stderr(1, (pos[0], pos[0]), pos[1], f"Function could not be found", True)
+        return self.builder.emit('call', args, IV_Types.int_, self.functions[name])
 
-    def visit_value(self, branch):
-        if branch[0] == 'Number':
-            value = Int(int(branch[1]['value']))
-            return value
+    def visit_call(self, branch):
+        # The value of a call is its return value
+        return self.visit_func_call(branch)
 
-        elif branch[0] == 'Float':
-            value = Float(float(branch[1]['value']))
-            return value
+    def visit_number(self, branch):
+        return ssa.Const(int(branch.value), IV_Types.int_)
 
-        elif branch[0] == 'Name':
-            name = Variables.variables_name[branch[1]['value']]
-            return Variable(name, Variables.variables[name], False)
+    def visit_float(self, branch):
+        return ssa.Const(float(branch.value), IV_Types.float_)
 
-        elif branch[0] == 'Expression':
-            op, n1, n2 = self.visit_expression(branch)
-            return Expression(op, n1, n2, self.cg)
+    def visit_name(self, branch):
+        name = branch.value
+        if not self.defined(name):
+            pos = branch.pos
+            xsErrors.stderr(1, (pos[0], pos[0]), pos[1], f"Variable '{name}' is not defined", True)
+        slot = self.slot(name)
+        if slot is not None:
+            return self.builder.emit('load', (), slot.type, slot)
+        return self.builder.read(name)
 
-        elif branch[0] == 'String':
-            value = String(str(branch[1]['value']))
-            return value
+    def visit_expr(self, branch):
+        lhs = self.visit_value(branch.lhs)
+        rhs = self.visit_value(branch.rhs)
+        # Comparisons and and/or give 1 or 0
+        logical = branch.op in RegOps.CONDITIONS or branch.op in RegOps.LOGICAL
+        return self.builder.emit('binop', (lhs, rhs), IV_Types.int_ if logical else lhs.type, branch.op)
+
+    def visit_string(self, branch):
+        return ssa.Const(str(branch.value), IV_Types.string)
 
     def visit_assign(self, branch):
-        name = branch[1]['name']
+        name = branch.name
         if name.startswith("__") and name.endswith('__'):
-            xsErrors.stderr(1, (branch[2][0], branch[2][0]), branch[2][1], "Names starting and ending with a DUNDER are reserved", 1)
-        value = branch[1]['value']
-        value: Value = self.visit_value(value)
-        if type(value) == Expression:
-            v = Variable(Variables.new(), Int(0)) if not name in Variables.variables_name else Variables.get_as_obj(Variables.variables_name[name])
-            # Optimization
-            if type(value.node1) == Variable and v.name != value.node1.name:
-                self.cg.shift(value.node1, v)
-            else:
-                if type(value.node1) != Variable:
-                    self.cg.shift(value.node1, v)
+            xsErrors.stderr(1, (branch.pos[0], branch.pos[0]), branch.pos[1], "Names starting and ending with a DUNDER are reserved", 1)
+        value = self.visit_value(branch.value)
+        slot = self.slot(name)
+        if slot is None and self.locals is None and name in self.shared:
+            slot = self.module.globals[name] = ssa.Slot(name)
+        if slot is not None:
+            if slot.type is None:
+                slot.type = value.type
+            self.builder.emit('store', (value,), attr=slot)
         else:
-            if not Variables.exists_reg(name):
-                Variable(name, value)
-            else:
-                self.cg.cur.append(RegOps.mov(Variables.get_as_obj(Variables.variables_name[name]).representation(True), value.representation()))
+            self.builder.write(name, value)
+            if self.locals is not None:
+                self.locals.add(name)
+        if self.locals is None:
+            self.declared.add(name)
 
     def visit_return(self, branch):
-        value = branch[1]['value']
-        value = self.visit_value(value)
-        self.cg.return_(value)
-
-    def visit_expression(self, branch):
-        op = branch[1]['op']
-        lhs: Value = self.visit_value(branch[1]['lhs'])
-        rhs: Value = self.visit_value(branch[1]['rhs'])
-        return op, lhs, rhs
+        self.builder.ret(self.visit_value(branch.value))
+
+    def visit_if(self, branch):
+        builder = self.builder
+        test = self.visit_value(branch.test)
+        then = builder.function.new_block()
+        other = builder.function.new_block() if branch.orelse else None
+        join = builder.function.new_block()
+        builder.branch(test, then, other or join)
+        for block, body in ((then, branch.body), (other, branch.orelse)):
+            if block is not None:
+                builder.seal(block)
+                builder.block = block
+                self.compile(body)
+                builder.jump(join)
+        builder.seal(join)
+        builder.block = join
+
+    def visit_while(self, branch):
+        # Until loops as long as its test is false
+        builder = self.builder
+        header, body, exit_ = (builder.function.new_block() for _ in range(3))
+        builder.jump(header)
+        builder.block = header
+        test = self.visit_value(branch.test)
+        if branch.kind == 'Until':
+            builder.branch(test, exit_, body)
+        else:
+            builder.branch(test, body, exit_)
+        builder.seal(body)
+        builder.block = body
+        self.loops.append((header, exit_))
+        self.compile(branch.body)
+        self.loops.pop()
+        builder.jump(header)
+        builder.seal(header)
+        builder.seal(exit_)
+        builder.block = exit_
+
+    def visit_break(self, branch):
+        self.leave(branch, 1)
+
+    def visit_continue(self, branch):
+        self.leave(branch, 0)
+
+    def leave(self, branch, index):
+        if not self.loops:
+            pos = branch.pos
+            xsErrors.stderr(4, (pos[0], pos[0]), pos[1], f"'{'continue' if index == 0 else 'break'}' outside of a loop", True)
+        self.builder.jump(self.loops[-1][index])
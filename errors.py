@@ -4,6 +4,8 @@ import sys
 colora.Style.UNDERLINE = "\033[4m"
 
 alerts = False
+# Warnings of the current build, recorded when a list (main.build stores them with the cached output)
+warnings = None
 contentLoader = None
 contentFile = None
 contentOut = None
@@ -112,5 +114,7 @@ def stderr(num, pos: tuple, line, msg, entire=False):
 
 
 def stdwarning(msg):
+    if warnings is not None:
+        warnings.append(msg)
     if alerts:
         print(f'{colora.Fore.LIGHTYELLOW_EX}WARNING{colora.Fore.RESET} : {colora.Fore.MAGENTA}{msg}{colora.Fore.RESET}')
@@ -0,0 +1,90 @@
+# Constant folding of the AST
+#
+# Expressions whose operands are both Number (or both Float) literals are
+# replaced by their value before code generation, so the compiler emits a
+# single immediate. Integers follow the target: they wrap around at the
+# register width, / and % truncate towards zero like idiv. Comparisons and
+# and/or give 1 or 0. Floats are rounded to single precision like their
+# data entries. Division by zero and mixed types are left to the compiler.
+import operator
+import struct
+
+import nodes
+
+
+def truncated_div(a, b):
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def truncated_mod(a, b):
+    return a - b * truncated_div(a, b)
+
+
+ARITHMETIC = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+}
+COMPARISONS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '!=': operator.ne,
+    '==': operator.eq,
+    'and': lambda a, b: bool(a) and bool(b),
+    'or': lambda a, b: bool(a) or bool(b),
+}
+
+
+def wrap(value, bits):
+    value &= (1 << bits) - 1
+    return value - (1 << bits) if value >> (bits - 1) else value
+
+
+def single(value):
+    return struct.unpack('<f', struct.pack('<f', value))[0]
+
+
+def fold(tree, bits=64):
+    """
+    Fold the constant expressions of <tree> (a Module) in place, integers wrap at <bits>
+    """
+    tree.body = fold_node(tree.body, bits)
+    return tree
+
+
+def fold_node(node, bits):
+    if isinstance(node, list):
+        return [fold_node(item, bits) for item in node]
+    if not isinstance(node, nodes.Node):
+        return node
+    for field in node.fields:
+        setattr(node, field, fold_node(getattr(node, field), bits))
+    if node.kind == 'Expression':
+        return fold_expression(node, bits)
+    return node
+
+
+def fold_expression(node, bits):
+    lhs, rhs, op = node.lhs, node.rhs, node.op
+    if lhs.kind != rhs.kind or lhs.kind not in ('Number', 'Float'):
+        return node
+    a, b = lhs.value, rhs.value
+    if op in COMPARISONS:
+        return nodes.Number(int(COMPARISONS[op](a, b)), node.pos)
+    if op in ARITHMETIC:
+        value = ARITHMETIC[op](a, b)
+    elif op == '/' and b != 0:
+        value = truncated_div(a, b) if lhs.kind == 'Number' else a / b
+    elif op == '%' and b != 0 and lhs.kind == 'Number':
+        value = truncated_mod(a, b)
+    else:
+        return node
+    if lhs.kind == 'Number':
+        return nodes.Number(wrap(value, bits), node.pos)
+    try:
+        return nodes.Float(single(value), node.pos)
+    except OverflowError:  # Out of single precision range
+        return node
@@ -0,0 +1,112 @@
+# Line and function profile of the run mode (--hotspots)
+#
+# The closure engine (see closures) wraps every statement and every function
+# body in a timer when it is given a Hotspots, nothing is wrapped otherwise.
+# A line gets its number of executions, its total time (including the
+# statements nested in it and the functions it calls) and its self time.
+# A function (<module> for the top level code) gets its calls, total and self
+# time, and the self time of every call stack is kept for collapsed() which
+# writes the 'main;f;g 123' lines flamegraph tools read (values in microseconds).
+import time
+
+MODULE = '<module>'
+
+
+class Stats:
+    __slots__ = ('count', 'total', 'own', 'active')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.own = 0.0
+        # Running activations, recursive ones are in the total of the outermost
+        self.active = 0
+
+
+class Hotspots:
+    def __init__(self):
+        # Line number -> Stats, function name -> Stats, call stack -> self time
+        self.lines = {}
+        self.functions = {}
+        self.stacks = {}
+        # Time spent in the nested timers of the running lines / functions, and the running functions
+        self.nested = []
+        self.calls = []
+        self.called = []
+
+    def line(self, step, lineno):
+        """
+        Time the statement closure <step> of line <lineno>
+        """
+        stats = self.lines.setdefault(lineno, Stats())
+        nested = self.nested
+        clock = time.perf_counter
+
+        def timed(frame):
+            nested.append(0.0)
+            stats.active += 1
+            start = clock()
+            signal = step(frame)
+            elapsed = clock() - start
+            stats.active -= 1
+            inner = nested.pop()
+            stats.count += 1
+            if not stats.active:
+                stats.total += elapsed
+            stats.own += elapsed - inner
+            if nested:
+                nested[-1] += elapsed
+            return signal
+        return timed
+
+    def function(self, body, name):
+        """
+        Time the body closure of the function <name>
+        """
+        stats = self.functions.setdefault(name, Stats())
+        calls, called, stacks = self.calls, self.called, self.stacks
+        clock = time.perf_counter
+
+        def timed(frame):
+            calls.append(name)
+            called.append(0.0)
+            stats.active += 1
+            start = clock()
+            signal = body(frame)
+            elapsed = clock() - start
+            stats.active -= 1
+            inner = called.pop()
+            stack = ';'.join(calls)
+            calls.pop()
+            stats.count += 1
+            if not stats.active:
+                stats.total += elapsed
+            stats.own += elapsed - inner
+            stacks[stack] = stacks.get(stack, 0.0) + elapsed - inner
+            if called:
+                called[-1] += elapsed
+            return signal
+        return timed
+
+    def report(self, source=None, limit=20):
+        """
+        Hot spots sorted by self time, <source> is the program text the lines are shown from
+        """
+        text = source.splitlines() if source else []
+        total = sum(stats.own for stats in self.functions.values()) or 1.0
+        lines = [f'{"line":>6}{"count":>10}{"total":>12}{"self":>12}{"%":>7}  source']
+        for lineno, stats in sorted(self.lines.items(), key=lambda item: -item[1].own)[:limit]:
+            code = text[lineno - 1].strip() if 0 < lineno <= len(text) else ''
+            lines.append(f'{lineno:>6}{stats.count:>10}{stats.total * 1000:>10.2f}ms{stats.own * 1000:>10.2f}ms'
+                         f'{stats.own / total * 100:>6.1f}%  {code}')
+        lines.append('')
+        lines.append(f'{"function":<16}{"calls":>10}{"total":>12}{"self":>12}{"%":>7}')
+        for name, stats in sorted(self.functions.items(), key=lambda item: -item[1].own):
+            lines.append(f'{name:<16}{stats.count:>10}{stats.total * 1000:>10.2f}ms{stats.own * 1000:>10.2f}ms'
+                         f'{stats.own / total * 100:>6.1f}%')
+        return '\n'.join(lines)
+
+    def collapsed(self, sink):
+        # One 'outer;inner <microseconds>' line per call stack
+        for stack, elapsed in sorted(self.stacks.items()):
+            sink.write(f'{stack} {round(elapsed * 1e6)}\n')
@@ -1,62 +1,367 @@
+import operator
+
 import errors as xsErrors
+import profiler
+from fold import truncated_div, truncated_mod
+from visitor import Visitor
+
+
+def divide(n1, n2):
+    # Integers truncate towards zero like the compiled code
+    if type(n1) is int and type(n2) is int:
+        return truncated_div(n1, n2)
+    return n1 / n2
+
+
+def modulo(n1, n2):
+    if type(n1) is int and type(n2) is int:
+        return truncated_mod(n1, n2)
+    return n1 % n2
+
+
+# Comparisons and and/or give 1 or 0, both operands are always evaluated
+OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': divide,
+    '%': modulo,
+    '>': lambda n1, n2: 1 if n1 > n2 else 0,
+    '>=': lambda n1, n2: 1 if n1 >= n2 else 0,
+    '<': lambda n1, n2: 1 if n1 < n2 else 0,
+    '<=': lambda n1, n2: 1 if n1 <= n2 else 0,
+    '!=': lambda n1, n2: 1 if n1 != n2 else 0,
+    '==': lambda n1, n2: 1 if n1 == n2 else 0,
+    'and': lambda n1, n2: 1 if n1 and n2 else 0,
+    'or': lambda n1, n2: 1 if n1 or n2 else 0,
+}
+# Initial value of the variables made by set
+ZEROS = {'int': 0, 'float': 0.0, 'str': '', 'bool': 0}
 
 
 def compute_expression(op, n1, n2):
-    match op:
-        case "+":
-            return n1 + n2
-        case "-":
-            return n1 + n2
-        case "*":
-            return n1 + n2
-        case "/":
-            return n1 + n2
-
-
-class Interpreter:
-    def __init__(self, opts):
-        self.variables = []
-        self.functions = []
+    return OPERATORS[op](n1, n2)
+
+
+def fail(pos, exception, op, n1, n2):
+    # Report an operation that raised <exception> at runtime
+    if isinstance(exception, ZeroDivisionError):
+        msg = 'Division by zero'
+    else:
+        msg = f"Operator '{op}' is not supported between {type(n1).__name__} and {type(n2).__name__}"
+    xsErrors.stderr(2, (pos[0], pos[0]), pos[1], msg, True)
+
+
+def string(value):
+    # String literals keep their quotes in the AST
+    return value[1:-1]
+
+
+class LoopBreak(Exception):
+    pass
+
+
+class LoopContinue(Exception):
+    pass
+
+
+class FunctionReturn(Exception):
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+
+class Frame:
+    # Variables of the running code by slot, <parent> is the frame of the globals (None for that one)
+    __slots__ = ('locals', 'parent')
+
+    def __init__(self, size, parent=None):
+        self.locals = [0] * size
+        self.parent = parent
+
+
+class Resolver(Visitor):
+    # Assigns every variable access a (depth, slot), depth is the number of frames up from the running code
+    statements = {
+        'VarAssign': 'visit_assign',
+        'VarSet': 'visit_set',
+        'Def': 'visit_def',
+        'Return': 'visit_return',
+        'Import': 'visit_import',
+        'FuncCall': 'visit_call',
+        'If': 'visit_if',
+        'While': 'visit_while',
+        'Until': 'visit_while',
+        'BREAK': 'visit_break',
+        'CONTINUE': 'visit_continue',
+    }
+    values = {
+        'FuncCall': 'visit_call',
+        'Number': 'visit_constant',
+        'Float': 'visit_constant',
+        'Name': 'visit_name',
+        'Expression': 'visit_expr',
+        'String': 'visit_constant',
+    }
+    name = 'interpreter'
+
+    def __init__(self, count=None):
+        super().__init__(count)
+        # Name, VarAssign and VarSet node -> (depth, slot), Def node -> size of its frame (None for the top level)
+        self.slots = {}
+        self.sizes = {}
+        # Name -> slot of the globals and of the variables of the function being resolved (None at the top level)
+        self.globals = {}
+        self.locals = None
+        # Name -> number of params of the functions defined so far
+        self.functions = {}
+        self.loops = 0
+
+    def resolve(self, tree):
+        self.compile(tree.body)
+        self.sizes[None] = len(self.globals)
+        return self
+
+    def store(self, branch):
+        # Inside a function, variables which are not global are local
+        name = branch.name
+        if self.locals is None:
+            self.slots[branch] = 0, self.globals.setdefault(name, len(self.globals))
+        elif name in self.locals or name not in self.globals:
+            self.slots[branch] = 0, self.locals.setdefault(name, len(self.locals))
+        else:
+            self.slots[branch] = 1, self.globals[name]
+
+    def visit_constant(self, branch):
+        pass
+
+    def visit_name(self, branch):
+        name = branch.value
+        if self.locals is not None and name in self.locals:
+            self.slots[branch] = 0, self.locals[name]
+        elif name in self.globals:
+            self.slots[branch] = 0 if self.locals is None else 1, self.globals[name]
+        else:
+            xsErrors.stderr(1, (branch.pos[0], branch.pos[0]), branch.pos[1], f"The name '{name}' was not found", 1)
+
+    def visit_expr(self, branch):
+        self.visit_value(branch.lhs)
+        self.visit_value(branch.rhs)
+
+    def visit_assign(self, branch):
+        self.visit_value(branch.value)
+        self.store(branch)
+
+    def visit_set(self, branch):
+        self.store(branch)
+
+    def visit_import(self, branch):
+        pass
+
+    def visit_def(self, branch):
+        params = [param.name for param in branch.def_params if param is not None]
+        # Defined before its body, for recursive calls
+        self.functions[branch.name] = len(params)
+        outer = self.locals, self.loops
+        self.locals, self.loops = {param: slot for slot, param in enumerate(params)}, 0
+        self.compile(branch.body)
+        self.sizes[branch] = len(self.locals)
+        self.locals, self.loops = outer
+
+    def visit_return(self, branch):
+        self.visit_value(branch.value)
+
+    def visit_call(self, branch):
+        pos = branch.pos
+        if branch.name not in self.functions:
+            xsErrors.stderr(1, (pos[0], pos[0]), pos[1], f"Function could not be found", True)
+        params = [param for param in branch.params if param is not None]
+        if len(params) != self.functions[branch.name]:
+            xsErrors.stderr(4, (pos[0], pos[0]), pos[1], f"'{branch.name}' takes {self.functions[branch.name]} arguments ({len(params)} given)", True)
+        for param in params:
+            self.visit_value(param)
+
+    def visit_if(self, branch):
+        self.visit_value(branch.test)
+        self.compile(branch.body)
+        self.compile(branch.orelse or ())
+
+    def visit_while(self, branch):
+        self.visit_value(branch.test)
+        self.loops += 1
+        self.compile(branch.body)
+        self.loops -= 1
+
+    def visit_break(self, branch):
+        self.leave(branch, 'break')
+
+    def visit_continue(self, branch):
+        self.leave(branch, 'continue')
+
+    def leave(self, branch, keyword):
+        if not self.loops:
+            pos = branch.pos
+            xsErrors.stderr(4, (pos[0], pos[0]), pos[1], f"'{keyword}' outside of a loop", True)
+
+
+class Interpreter(Visitor):
+    # Runs a program, make() uses the closure engine (see closures) or with the vm option
+    # the bytecode VM (see bytecode), walk() walks the AST
+    statements = {
+        'VarAssign': 'visit_assign',
+        'VarSet': 'visit_set',
+        'Def': 'visit_def',
+        'Return': 'visit_return',
+        'Import': 'visit_import',
+        'FuncCall': 'visit_func_call',
+        'If': 'visit_if',
+        'While': 'visit_while',
+        'Until': 'visit_while',
+        'BREAK': 'visit_break',
+        'CONTINUE': 'visit_continue',
+    }
+    values = {
+        'FuncCall': 'visit_call',
+        'Number': 'visit_number',
+        'Float': 'visit_float',
+        'Name': 'visit_name',
+        'Expression': 'visit_expr',
+        'String': 'visit_string',
+    }
+    name = 'interpreter'
+
+    def __init__(self, opts, count=None):
+        super().__init__(count)
+        self.opts = opts
+        # Frame of the globals and of the running code, slots and frame sizes from the Resolver
+        self.variables = None
+        self.frame = None
+        self.slots = {}
+        self.sizes = {}
+        self.functions = {}
+        # Line and function profile of make() with the hotspots option
+        self.hotspots = None
 
     def make(self, tree):
-        self.compile(tree[1]['body'])
-
-    def compile(self, ast):
-        for branch in ast:
-            if branch[0] == 'VarAssign':
-                self.visit_assign(branch)
-            elif branch[0] == 'Def':
-                self.visit_def(branch)
-            elif branch[0] == 'Return':
-                self.visit_return(branch)
-            elif branch[0] == 'Import':
-                self.visit_import(branch)
-            elif branch[0] == 'VarSet':
-                self.visit_set(branch)
-            elif branch[0] == 'FuncCall':
-                self.visit_func_call(branch)
-
-    def visit_value(self, branch):
-        if branch[0] == 'Number':
-            value = int(branch[1]['value'])
-            return value
-
-        elif branch[0] == 'Float':
-            value = float(branch[1]['value'])
-            return value
-
-        elif branch[0] == 'Name':
-            name = branch[1]['value']
-            if name not in self.variables:
-                xsErrors.stderr(1, (branch[2][0], branch[2][0]), branch[2][1], f"The name '{name}' was not found", 1)
-            return self.variables[name]
-
-        elif branch[0] == 'Expression':
-            op, n1, n2 = branch[1]["op"], branch[1]["lhs"], branch[1]["rhs"]
+        """
+        Run <tree>, returns the value of the top level return (None without one)
+        """
+        if "vm" in self.opts and "hotspots" not in self.opts:
+            import bytecode
+            with profiler.phase('compile'):
+                program = bytecode.Compiler().build(tree)
+            with profiler.phase('execute'):
+                return bytecode.execute(program)
+        from closures import Closures
+        if "hotspots" in self.opts:
+            from hotspots import Hotspots
+            self.hotspots = Hotspots()
+        with profiler.phase('compile'):
+            run = Closures(hotspots=self.hotspots).build(tree)
+        with profiler.phase('execute'):
+            return run()
+
+    def walk(self, tree):
+        """
+        Run <tree> by walking the AST on every execution
+        """
+        resolver = Resolver().resolve(tree)
+        self.slots, self.sizes = resolver.slots, resolver.sizes
+        self.variables = self.frame = Frame(self.sizes[None])
+        try:
+            self.compile(tree.body)
+        except FunctionReturn as ret:
+            return ret.value
+
+    def visit_number(self, branch):
+        value = int(branch.value)
+        return value
+
+    def visit_float(self, branch):
+        value = float(branch.value)
+        return value
+
+    def visit_name(self, branch):
+        depth, slot = self.slots[branch]
+        frame = self.frame
+        while depth:
+            frame = frame.parent
+            depth -= 1
+        return frame.locals[slot]
+
+    def visit_expr(self, branch):
+        op = branch.op
+        n1, n2 = self.visit_value(branch.lhs), self.visit_value(branch.rhs)
+        try:
             return compute_expression(op, n1, n2)
+        except (TypeError, ZeroDivisionError) as ex:
+            fail(branch.pos, ex, op, n1, n2)
+
+    def visit_string(self, branch):
+        value = string(str(branch.value))
+        return value
+
+    def visit_assign(self, branch):
+        self.assign(branch, self.visit_value(branch.value))
+
+    def visit_set(self, branch):
+        self.assign(branch, ZEROS.get(branch.type, 0))
+
+    def assign(self, branch, value):
+        depth, slot = self.slots[branch]
+        frame = self.frame
+        while depth:
+            frame = frame.parent
+            depth -= 1
+        frame.locals[slot] = value
+
+    def visit_def(self, branch):
+        self.functions[branch.name] = branch
+
+    def visit_import(self, branch):
+        # Includes are assembly libraries
+        pass
+
+    def visit_return(self, branch):
+        raise FunctionReturn(self.visit_value(branch.value))
+
+    def visit_func_call(self, branch):
+        pos = branch.pos
+        function = self.functions.get(branch.name)
+        if function is None:
+            xsErrors.stderr(1, (pos[0], pos[0]), pos[1], f"Function could not be found", True)
+        args = [self.visit_value(param) for param in branch.params if param is not None]
+        # Params are the first slots of the frame
+        frame = Frame(self.sizes[function], self.variables)
+        frame.locals[:len(args)] = args
+        outer, self.frame = self.frame, frame
+        try:
+            self.compile(function.body)
+        except FunctionReturn as ret:
+            return ret.value
+        finally:
+            self.frame = outer
+        return 0
+
+    def visit_call(self, branch):
+        return self.visit_func_call(branch)
+
+    def visit_if(self, branch):
+        self.compile(branch.body if self.visit_value(branch.test) else branch.orelse)
+
+    def visit_while(self, branch):
+        # Until loops as long as its test is false
+        until = branch.kind == 'Until'
+        while bool(self.visit_value(branch.test)) != until:
+            try:
+                self.compile(branch.body)
+            except LoopBreak:
+                break
+            except LoopContinue:
+                continue
 
-        elif branch[0] == 'String':
-            value = str(branch[1]['value'])
-            return value
+    def visit_break(self, branch):
+        raise LoopBreak()
 
-    
+    def visit_continue(self, branch):
+        raise LoopContinue()
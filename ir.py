@@ -0,0 +1,191 @@
+# Instruction IR
+#
+# Codegen builds every segment as a Segment of instructions, an instruction is
+# an (opcode, dst, src) tuple of an Op and up to two operand records (Reg, Imm,
+# Mem, Label). The passes (regalloc, peephole) work on these records, text is
+# only produced by render when the program is emitted.
+import enum
+from array import array
+
+
+class Op(enum.IntEnum):
+    MOV = enum.auto()
+    MOVZX = enum.auto()
+    LEA = enum.auto()
+    ADD = enum.auto()
+    SUB = enum.auto()
+    IMUL = enum.auto()
+    IDIV = enum.auto()
+    CQO = enum.auto()
+    CDQ = enum.auto()
+    AND = enum.auto()
+    OR = enum.auto()
+    XOR = enum.auto()
+    CMP = enum.auto()
+    TEST = enum.auto()
+    SETE = enum.auto()
+    SETNE = enum.auto()
+    SETG = enum.auto()
+    SETGE = enum.auto()
+    SETL = enum.auto()
+    SETLE = enum.auto()
+    PUSH = enum.auto()
+    POP = enum.auto()
+    JMP = enum.auto()
+    JE = enum.auto()
+    CALL = enum.auto()
+    RET = enum.auto()
+    LEAVE = enum.auto()
+    COMMENT = enum.auto()
+
+
+# Indexed by opcode
+MNEMONICS = [None] + [op.name.lower() for op in Op]
+TERMINATORS = frozenset((Op.JMP, Op.JE, Op.CALL, Op.RET))
+
+
+class Reg:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return type(other) is Reg and other.name == self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __str__(self):
+        return self.name
+
+    __repr__ = __str__
+
+
+class Imm:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is Imm and other.value == self.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __str__(self):
+        return f'{self.value}'
+
+    __repr__ = __str__
+
+
+class Label:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return type(other) is Label and other.name == self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __str__(self):
+        return self.name
+
+    __repr__ = __str__
+
+
+class Mem:
+    # [symbol] for globals, [reg +/- disp] for stack frame slots, size is 'qword', 'dword', ... or None
+    __slots__ = ('symbol', 'reg', 'disp', 'size')
+
+    def __init__(self, symbol=None, reg=None, disp=0, size=None):
+        self.symbol = symbol
+        self.reg = reg
+        self.disp = disp
+        self.size = size
+
+    @property
+    def slot(self):
+        # The memory location, regardless of the access size
+        return self.symbol, self.reg, self.disp
+
+    def sized(self, size):
+        return Mem(self.symbol, self.reg, self.disp, size)
+
+    def __eq__(self, other):
+        return type(other) is Mem and other.slot == self.slot and other.size == self.size
+
+    def __hash__(self):
+        return hash(self.slot)
+
+    def __str__(self):
+        if self.symbol is not None:
+            address = self.symbol
+        else:
+            address = f'{self.reg} {"-" if self.disp < 0 else "+"} {abs(self.disp)}'
+        return f'{self.size} [{address}]' if self.size else f'[{address}]'
+
+    __repr__ = __str__
+
+
+class Segment:
+    # Instructions of a segment, the opcodes are kept in a byte array next to the operand lists
+    __slots__ = ('ops', 'dst', 'src')
+
+    def __init__(self, instructions=()):
+        self.ops = array('B')
+        self.dst = []
+        self.src = []
+        self.extend(instructions)
+
+    def append(self, instruction):
+        op, dst, src = instruction
+        self.ops.append(op)
+        self.dst.append(dst)
+        self.src.append(src)
+
+    def extend(self, instructions):
+        for instruction in instructions:
+            self.append(instruction)
+
+    def __iadd__(self, instructions):
+        self.extend(instructions)
+        return self
+
+    def insert(self, index, instructions):
+        instructions = list(instructions)
+        self.ops[index:index] = array('B', (op for op, _, _ in instructions))
+        self.dst[index:index] = [dst for _, dst, _ in instructions]
+        self.src[index:index] = [src for _, _, src in instructions]
+
+    def replace(self, instructions):
+        self.ops = array('B')
+        self.dst = []
+        self.src = []
+        self.extend(instructions)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __getitem__(self, index):
+        return self.ops[index], self.dst[index], self.src[index]
+
+    def __iter__(self):
+        return zip(self.ops, self.dst, self.src)
+
+    def render(self):
+        return [render(op, dst, src) for op, dst, src in zip(self.ops, self.dst, self.src)]
+
+
+def render(op, dst=None, src=None):
+    if op == Op.COMMENT:
+        return f';{dst}'
+    if src is not None:
+        return f'{MNEMONICS[op]} {dst}, {src}'
+    if dst is not None:
+        return f'{MNEMONICS[op]} {dst}'
+    return MNEMONICS[op]
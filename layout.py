@@ -0,0 +1,53 @@
+# Data section layout
+#
+# Every variable is declared with the directive of its type at the target
+# width: ints, bools and floats fill a register (dq on 64 bit, dd on 32 bit,
+# floats keep their single precision bits, as in the immediates of the code),
+# strings are NUL terminated bytes. Reservations (set name: type = N) reserve
+# N elements of their type in .bss.
+# Both sections are grouped by alignment, largest first, so every group starts
+# aligned and no padding is needed between the entries of a group.
+from utils import IV_Types
+
+SUFFIXES = {1: 'b', 2: 'w', 4: 'd', 8: 'q'}
+NAMES = {1: 'byte', 2: 'word', 4: 'dword', 8: 'qword'}
+REGISTER_TYPES = (IV_Types.int_, IV_Types.float_, IV_Types.bool_)
+
+
+def size(type_, bits):
+    """
+    Size in bytes (which is also the alignment) of one element of <type_>
+    """
+    return bits // 8 if type_ in REGISTER_TYPES else 1
+
+
+def plan(variables, reservations, bits):
+    """
+    Lines of the data and bss sections for <variables> (cover name -> value),
+    <reservations> maps the cover names of set variables to their (type, element count)
+    """
+    data = []
+    bss = []
+    for cover, value in variables.items():
+        if cover in reservations or cover[0] == 'u':
+            type_, count = reservations.get(cover, (IV_Types.null, 1))
+            unit = size(IV_Types.find.get(type_), bits)
+            bss.append((unit, f'{cover} res{SUFFIXES[unit]} {count}'))
+        else:
+            unit = size(value.type, bits)
+            init = value.representation()
+            if value.type == IV_Types.string:
+                init += ', 0'
+            data.append((unit, f'{cover} d{SUFFIXES[unit]} {init}'))
+    return group(data, 'align'), group(bss, 'alignb')
+
+
+def group(entries, directive):
+    lines = []
+    current = None
+    for unit, line in sorted(entries, key=lambda entry: -entry[0]):
+        if unit != current and unit > 1:
+            lines.append(f'{directive} {unit}')
+        current = unit
+        lines.append(line)
+    return lines
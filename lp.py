@@ -1,56 +1,66 @@
 # Lexer / Parser 18.02.2023-16:15
 from sly import Lexer, Parser
+from sly.yacc import YaccProduction, YaccSymbol
 import errors as xsErrors
+import nodes
+import table_cache
 
 
 class utils:
+    data_types = {
+        'Number': nodes.Number,
+        'Float': nodes.Float,
+        'String': nodes.String,
+        'Name': nodes.Name,
+    }
+
     @staticmethod
     def data(Type, value, pos):
-        return Type, {'value': value}, pos
+        return utils.data_types[Type](value, pos)
 
     @staticmethod
     def list(value, Type, pos):
-        return 'List', {'value': value, 'type': Type}, pos
+        return nodes.List(value, Type, pos)
 
     @staticmethod
     def dot(e1, e2, e3, pos):
-        return 'Dot', {'obj': e1, 'function': e2, 'args': e3}, pos
+        return nodes.Dot(e1, e2, e3, pos)
 
     @staticmethod
     def import_s(module, pos):
-        return 'Import', {'module': module}, pos
+        return nodes.Import(module, pos)
 
     @staticmethod
     def expression(op, lhs, rhs, pos):
-        return 'Expression', {'op': op, 'lhs': lhs, 'rhs': rhs}, pos
+        return nodes.Expression(op, lhs, rhs, pos)
 
     @staticmethod
     def var_assign(name, value, pos):
-        return 'VarAssign', {'value': value, 'name': name}, pos
+        return nodes.VarAssign(name, value, pos)
 
     @staticmethod
     def set(name, value, pos, size=None):
-        return 'VarSet', {'type': value, 'name': name, 'size': size}, pos
+        return nodes.VarSet(name, value, size, pos)
 
     @staticmethod
     def if_stmt(body, orelse, test, pos):
-        return 'If', {'body': body, 'test': test, 'orelse': orelse}, pos
+        return nodes.If(test, body, orelse, pos)
 
     @staticmethod
     def while_block(body, test, pos):
-        return 'While', {'test': test, 'body': body}, pos
+        return nodes.While(test, body, pos)
 
     @staticmethod
     def until_block(body, test, pos):
-        return 'Until', {'test': test, 'body': body}, pos
+        return nodes.Until(test, body, pos)
 
     @staticmethod
     def func_call(name, params, pos):
-        return 'FuncCall', {'params': params, 'name': name}, pos
+        return nodes.FuncCall(name, params, pos)
 
     @staticmethod
     def function(name, def_params, body, pos):
-        return 'Def', {'name': name, 'body': body, 'def_params': def_params if def_params else []}, pos
+        return nodes.Def(name, def_params if def_params else [], body, pos)
 
 
 def group(*choices): return '(' + '|'.join(choices) + ')'
@@ -164,7 +174,11 @@ class PLexer(Lexer):
         pass
 
     def error(self, t):
-        xsErrors.stderr(3, (t.index, t.index), t.lineno, f'Illegal character "{t.org_val[0]}"')
+        xsErrors.stderr(3, (t.index, t.index), t.lineno, f'Illegal character "{t.value[0]}"')
+
+    @classmethod
+    def _build(cls):
+        table_cache.build_lexer(cls)
 
 
 class MutedLogger(object):
@@ -210,12 +224,90 @@ class PParser(Parser2):
         ('left', TIMES, DIVIDE)
     )
 
+    @classmethod
+    def _build(cls, definitions):
+        table_cache.build_parser(cls, definitions)
+
     def __init__(self):
-        self.ast = ('Module', {'body': []})
+        self.ast = nodes.Module([])
+
+    def parse(self, tokens):
+        from scanner import TokenBuffer
+        if isinstance(tokens, TokenBuffer):
+            return self.parse_buffer(tokens)
+        return super().parse(tokens)
+
+    def parse_buffer(self, buffer):
+        """
+        sly's LR loop reading the lookaheads from the columns of a scanner.TokenBuffer.
+        A token becomes a Terminal when it is shifted, syntax errors are reported (no recovery)
+        and the positions of the values are not recorded (Parser.line_position).
+        """
+        from scanner import KINDS, ERROR, Terminal
+        actions, goto = self._lrtable.lr_action, self._lrtable.lr_goto
+        defaulted_states = self._lrtable.defaulted_states
+        productions = self._grammar.Productions
+        kinds, count = buffer.kinds, len(buffer)
+        pslice = YaccProduction(None)
+        end = YaccSymbol()
+        end.type = '$end'
+        self.statestack = statestack = [0]
+        self.symstack = symstack = [end]
+        pslice._stack = symstack
+        state = 0
+        i = 0
+        while True:
+            if state not in defaulted_states:
+                kind = kinds[i] if i < count else -1
+                if kind == ERROR:
+                    buffer.error(i)
+                action = actions[state].get(KINDS[kind] if kind >= 0 else '$end')
+            else:
+                action = defaulted_states[state]
+
+            if action is None:
+                token = None
+                if i < count:
+                    token = Terminal()
+                    token.buffer, token.i = buffer, i
+                self.error(token)
+                return None
+            if action > 0:
+                # Shift
+                token = Terminal()
+                token.buffer, token.i = buffer, i
+                i += 1
+                symstack.append(token)
+                statestack.append(action)
+                state = action
+            elif action < 0:
+                # Reduce
+                self.production = production = productions[-action]
+                name, length = production.name, production.len
+                pslice._namemap = production.namemap
+                pslice._slice = symstack[-length:] if length else []
+                sym = YaccSymbol()
+                sym.type = name
+                value = production.func(self, pslice)
+                if value is pslice:
+                    value = (name, *(s.value for s in pslice._slice))
+                sym.value = value
+                if length:
+                    first = symstack[-length]
+                    sym.lineno, sym.index, sym.end = first.lineno, first.index, symstack[-1].end
+                    del symstack[-length:]
+                    del statestack[-length:]
+                else:
+                    sym.lineno = sym.index = sym.end = None
+                symstack.append(sym)
+                state = goto[statestack[-1]][name]
+                statestack.append(state)
+            else:
+                return symstack[-1].value
 
     @_("statements")
     def body(self, p):
-        self.ast[1]['body'] = p.statements
+        self.ast.body = p.statements
 
     @_('statement')
     def statements(self, p):
@@ -228,15 +320,15 @@ class PParser(Parser2):
 
     @_('RETURN expr')
     def statement(self, p):
-        return 'Return', {'value': p.expr}
+        return nodes.Return(p.expr, (getattr(p, 'index', -1), getattr(p, 'lineno', 0)))
 
     @_('BREAK')
     def statement(self, p):
-        return 'BREAK', {}
+        return nodes.Break((getattr(p, 'index', -1), getattr(p, 'lineno', 0)))
 
     @_('CONTINUE')
     def statement(self, p):
-        return 'CONTINUE', {}
+        return nodes.Continue((getattr(p, 'index', -1), getattr(p, 'lineno', 0)))
 
     @_('DEF NAME LPAREN def_params RPAREN  statements SEMI_COLON')
     def statement(self, p):
@@ -289,7 +381,7 @@ class PParser(Parser2):
 
     @_('NAME COLON NAME')
     def def_param(self, p):
-        return {'name': p.NAME0, 'type': p.NAME1}
+        return nodes.Param(p.NAME0, p.NAME1, (getattr(p, 'index', -1), getattr(p, 'lineno', 0)))
 
     @_('')
     def def_param(self, p):
@@ -3,10 +3,7 @@ import sys
 import colorama as colora
 from errors import crit_err as error
 import errors as xsErrors
-from compiler import Compiler
-from interpreter import Interpreter
-from lp import PLexer, PParser
-from syntax_higlighting import light
+import profiler
 
 __version__ = '0.6'
 colora.Style.UNDERLINE = "\033[4m"
@@ -17,7 +14,14 @@ long_opts = {
     "--alert": "alert",
     "--view": "view",
     "--compile": "compile",
-    "--run": "run"
+    "--run": "run",
+    "--no-cache": "nocache",
+    "--ir": "ir",
+    "--vm": "vm",
+    "--bytecode": "bytecode",
+    "--profile": "profile",
+    "--profile-json": "profile_json",
+    "--hotspots": "hotspots"
 }
 short_opts = {
     "-n": "--noalert",
@@ -25,15 +29,27 @@ short_opts = {
     "-a": "--alert",
     "-v": "--view",
     "-c": "--compile",
-    "-r": "--run"
+    "-r": "--run",
+    "-u": "--no-cache",
+    "-i": "--ir",
+    "-m": "--vm",
+    "-y": "--bytecode",
+    "-p": "--profile",
+    "-P": "--profile-json",
+    "-t": "--hotspots"
 }
+levels = ("-O0", "-O1", "-O2")
 inf_long_opts = {
     "--help": "help",
-    "--version": "version"
+    "--version": "version",
+    "--batch": "batch",
+    "--serve": "serve"
 }
 inf_short_opts = {
     "-h": "--help",
-    "-v": "--version"
+    "-v": "--version",
+    "-b": "--batch",
+    "-s": "--serve"
 }
 
 opt_doc = {
@@ -43,8 +59,18 @@ opt_doc = {
     "view": "View using syntax highlighting",
     "compile": "Compile",
     "run": "Run (interpretation mode)",
+    "nocache": "Disable the compilation cache (compilation only)",
+    "ir": "Print the SSA form the assembly is generated from (compilation only)",
+    "vm": "Run on the bytecode VM instead of the closure compiler (run mode only)",
+    "bytecode": "Compile to bytecode (<file>.ypc), which runs without parsing with <file>.ypc",
+    "profile": "Print the time, CPU time and peak memory of every phase and the counters (tokens, nodes, visits per node kind, ...)",
+    "profile_json": "Write the profile of --profile as JSON to <file>.profile.json",
+    "hotspots": "Time every line and function of the run, print the hot spots and write the call stacks to <file>.folded (run mode only)",
+    "optimize": "Optimization level, 0: none, 1: constant folding and propagation, dead store elimination and register allocation (default), 2: 1 and peephole (compilation only)",
     "version": f"Get {colora.Fore.BLUE}{colora.Style.BRIGHT}Yupiter{colora.Style.RESET_ALL} version",
-    "help": "Get this help page"
+    "help": "Get this help page",
+    "batch": "Compile many files, directories or globs at once (<targets> <options> [-j <jobs>])",
+    "serve": "Serve compile/run/highlight requests as JSON lines on stdin or a unix socket ([--socket <path>] [-j <jobs>])"
 }
 
 
@@ -55,11 +81,12 @@ def version_func():
 def help_func():
     version_func()
     print(f'Usage : {colora.Fore.BLUE}{colora.Style.BRIGHT}Yupiter{colora.Style.RESET_ALL} <(optional) file> <options>')
-    print(f"[The file must end with '.yp']")
+    print(f"[The file must end with '.yp', or '.ypc' for bytecode]")
     print(f'  {colora.Fore.CYAN}{colora.Style.UNDERLINE}Runtime-Options{colora.Style.RESET_ALL}:')
     for opt in short_opts:
         lopt = short_opts[opt]
         print(f'    {lopt} / {opt} : {opt_doc[long_opts[lopt]]}')
+    print(f'    -O<level> : {opt_doc["optimize"]}')
     print(f' {colora.Fore.CYAN}{colora.Style.UNDERLINE}Other options{colora.Style.RESET_ALL}:')
     for opt in inf_short_opts:
         lopt = inf_short_opts[opt]
@@ -73,13 +100,26 @@ def gather_options(args):
             options.append(long_opts[arg])
         elif arg in short_opts.keys():
             options.append(long_opts[short_opts[arg]])
+        elif arg in levels:
+            options.append(arg[1:])
         else:
             error(8, 'OptionError', f'Invalid option', cause=[f"You passed in an invalid option : ", arg], fix=["Input a valid option"])
     return options
 
 
+def prepare_options(args):
+    opts = gather_options(args)
+    if "32bit" not in opts:
+        opts.append('64bit')
+    if "alert" not in opts and "noalert" not in opts:
+        opts.append('noalert')
+    if "alert" in opts:
+        xsErrors.alerts = True
+    return opts
+
+
 def read(target):
-    with open(target, 'r') as file:
+    with profiler.phase('read'), open(target, 'r') as file:
         content = file.read()
     xsErrors.contentLoader = content
     xsErrors.contentFile = fmt_file(target)
@@ -89,8 +129,12 @@ def read(target):
 
 
 def write(target, content):
+    # <content> is either text or a Codegen which is streamed into the file
     with open(target, 'w') as file:
-        file.write(content)
+        if isinstance(content, str):
+            file.write(content)
+        else:
+            content.emit(file)
 
 
 def fmt_file(file):
@@ -101,14 +145,19 @@ def fmt_file(file):
 
 
 def lp(content):
-    lexer = PLexer()
-    tokens = lexer.tokenize(content)
-    parser = PParser()
-    parser.parse(tokens)
+    with profiler.phase('lp'):
+        from lp import PParser
+        from scanner import Scanner
+        tokens = Scanner().buffer(content)
+        profiler.count('tokens', len(tokens))
+        parser = PParser()
+        parser.parse(tokens)
+    if profiler.active is not None:
+        profiler.count('nodes', profiler.tree_size(parser.ast))
     return parser.ast
 
 
-def compile_(opts, ast):
+def compile_(opts, content):
     print(
         f'{colora.Fore.LIGHTYELLOW_EX}Compiling {colora.Fore.RESET}{colora.Fore.BLUE}{colora.Style.BRIGHT}{xsErrors.contentFile}'
         f'{colora.Style.RESET_ALL}{colora.Fore.LIGHTYELLOW_EX} to{colora.Fore.BLUE}{colora.Style.BRIGHT} '
@@ -117,9 +166,89 @@ def compile_(opts, ast):
         f'{colora.Fore.MAGENTA}{f"{colora.Fore.RESET}, {colora.Fore.MAGENTA}".join(opts)}')
     print()
     sys.stdout.write(colora.Style.RESET_ALL)
+    removed = build(opts, content)
+    if removed is not None:
+        print(f'{colora.Fore.LIGHTYELLOW_EX}Peephole removed {colora.Fore.CYAN}{removed}{colora.Fore.LIGHTYELLOW_EX} instructions{colora.Style.RESET_ALL}')
+
+
+def build(opts, content):
+    # Returns the number of instructions removed by the peephole pass, None below -O2. A cached output
+    # replays the warnings and the report of the build which stored it
+    key, out = cached(opts, content)
+    diagnostics = None
+    if out is not None:
+        import build_cache
+        diagnostics = build_cache.load_diagnostics(key)
+    if diagnostics is not None:
+        for msg in diagnostics['warnings']:
+            xsErrors.stdwarning(msg)
+        with profiler.phase('write'):
+            write(xsErrors.contentOut, out)
+        profiler.count('bytes', len(out))
+        return diagnostics['removed']
+    xsErrors.warnings = []
+    try:
+        cg = codegen(opts, content)
+    finally:
+        warnings, xsErrors.warnings = xsErrors.warnings, None
+    removed = cg.removed if cg.level >= 2 else None
+    with profiler.phase('write'):
+        write(xsErrors.contentOut, cg)
+    if profiler.active is not None:
+        profiler.count('instructions', sum(len(segment) for segment in cg.segments.values()))
+        profiler.count('bytes', os.path.getsize(xsErrors.contentOut))
+    if key:
+        import build_cache
+        build_cache.store_file(key, xsErrors.contentOut)
+        build_cache.store_diagnostics(key, {'warnings': warnings, 'removed': removed})
+    return removed
+
+
+def generate(opts, content):
+    key, out = cached(opts, content)
+    if out is not None:
+        return out
+    out = codegen(opts, content).dump()
+    if key:
+        import build_cache
+        build_cache.store(key, out)
+    return out
+
+
+def cached(opts, content):
+    # The SSA form is only printed when the program is compiled
+    if "nocache" in opts or "ir" in opts:
+        return None, None
+    with profiler.phase('cache'):
+        import build_cache
+        key = build_cache.key(content, opts, __version__)
+        return key, build_cache.load(key)
+
+
+def codegen(opts, content):
+    return translate(opts, lp(content))
+
+
+def translate(opts, ast):
+    # Optimize and lower <ast> into a Codegen, ready to emit
+    from compiler import Compiler
     compiler = Compiler(opts)
-    out = compiler.make(ast)
-    write(xsErrors.contentOut, out)
+    if compiler.cg.level >= 1:
+        with profiler.phase('optimize'):
+            from fold import fold
+            import propagate
+            bits = 32 if "32bit" in opts else 64
+            fold(ast, bits)
+            propagate.optimize(ast, bits)
+    with profiler.phase('lower'):
+        module = compiler.lower(ast)
+    if "ir" in opts:
+        print(module.dump())
+        print()
+    with profiler.phase('generate'):
+        cg = compiler.cg.generate(module)
+    profiler.count('segments', len(cg.segments))
+    return cg
 
 
 def run(opts, ast):
@@ -131,18 +260,84 @@ def run(opts, ast):
         f'{colora.Fore.MAGENTA}{f"{colora.Fore.RESET}, {colora.Fore.MAGENTA}".join(opts)}')
     if "32bit" in opts:
         xsErrors.stdwarning(f'32bit option has no effect in interpretation (run) mode')
+    if "vm" in opts and "hotspots" in opts:
+        xsErrors.stdwarning(f'hotspots profiles the closure compiler, the vm option is ignored')
     print()
     sys.stdout.write(colora.Style.RESET_ALL)
+    from interpreter import Interpreter
     interpreter = Interpreter(opts)
     out = interpreter.make(ast)
+    if interpreter.hotspots is not None:
+        print(interpreter.hotspots.report(xsErrors.contentLoader))
+        folded = xsErrors.TrueFile[:len(xsErrors.TrueFile) - 3] + '.folded'
+        with open(folded, 'w') as file:
+            interpreter.hotspots.collapsed(file)
+        print(f'{colora.Fore.LIGHTYELLOW_EX}Call stacks written to {colora.Fore.BLUE}{colora.Style.BRIGHT}{fmt_file(folded)}{colora.Style.RESET_ALL}')
+
 
+def bytecode_(opts, content):
+    out = xsErrors.TrueFile[:len(xsErrors.TrueFile) - 3] + '.ypc'
+    print(
+        f'{colora.Fore.LIGHTYELLOW_EX}Compiling {colora.Fore.RESET}{colora.Fore.BLUE}{colora.Style.BRIGHT}{xsErrors.contentFile}'
+        f'{colora.Style.RESET_ALL}{colora.Fore.LIGHTYELLOW_EX} to{colora.Fore.BLUE}{colora.Style.BRIGHT} '
+        f'{fmt_file(out)}{colora.Style.RESET_ALL}')
+    print()
+    sys.stdout.write(colora.Style.RESET_ALL)
+    import bytecode
+    tree = lp(content)
+    with profiler.phase('compile'):
+        program = bytecode.Compiler().build(tree, content)
+    with profiler.phase('write'), open(out, 'wb') as file:
+        file.write(bytecode.dumps(program))
+    profiler.count('instructions', sum(len(code.code) // 4 for code in program.functions))
+    profiler.count('bytes', os.path.getsize(out))
 
-def inf_opts_con(cmd):
+
+def run_bytecode(opts, target):
+    import bytecode
+    with profiler.phase('load'), open(target, 'rb') as file:
+        program = bytecode.loads(file.read())
+    if program is None:
+        error(4, 'FileType', 'Invalid bytecode file', cause=[f"Not a bytecode file of this version '{target}'"],
+              fix=["Compile it again with --bytecode"])
+    # The source is kept for the error messages
+    xsErrors.contentLoader = program.source
+    xsErrors.contentFile = fmt_file(target)
+    xsErrors.TrueFile = target
+    print(
+        f'{colora.Fore.LIGHTYELLOW_EX}Running {colora.Fore.RESET}{colora.Fore.BLUE}{colora.Style.BRIGHT}{xsErrors.contentFile}'
+        f'{colora.Style.RESET_ALL}{colora.Fore.LIGHTYELLOW_EX} with options{colora.Fore.RESET}: '
+        f'{colora.Fore.MAGENTA}{f"{colora.Fore.RESET}, {colora.Fore.MAGENTA}".join(opts)}')
+    print()
+    sys.stdout.write(colora.Style.RESET_ALL)
+    with profiler.phase('execute'):
+        out = bytecode.execute(program)
+
+
+def view(target, content):
+    print(
+        f'{colora.Fore.LIGHTYELLOW_EX}Viewing {colora.Fore.RESET}{colora.Fore.BLUE}{colora.Style.BRIGHT}{target}'
+        f'{colora.Style.RESET_ALL}:')
+    if not os.path.exists('syntax.json'):
+        xsErrors.crit_err(6,  f"The library 'syntax.json' could not be found",
+                          cause=['Trying to view code without the syntax library'], fix=['Try reinstalling Yupiter', "Download the 'syntax.json' library"])
+    from syntax_higlighting import light
+    print(light(content, 'syntax.json'))
+    print()
+
+
+def inf_opts_con(cmd, args):
     match cmd:
         case "help":
             help_func()
         case "version":
             version_func()
+        case "batch":
+            from batch import batch
+            batch(args)
+        case "serve":
+            from server import serve
+            serve(args)
 
 
 def main():
@@ -156,37 +351,45 @@ def main():
             target = inf_long_opts[target]
         else:
             target = inf_long_opts[inf_short_opts[target]]
-        inf_opts_con(target)
+        inf_opts_con(target, args)
         return
-    if not target.endswith('.yp'):
-        error(4, 'FileType', 'Invalid FileType (must be .yp)')
+    if not target.endswith(('.yp', '.ypc')):
+        error(4, 'FileType', 'Invalid FileType (must be .yp or .ypc)')
     if not os.path.exists(target):
         error(2, 'FileNotFound', f'The input file could not be found', cause=[f"File not found '{target}'"], fix=["Input an existing file"])
-    opts = gather_options(args)
-    if "32bit" not in opts:
-        opts.append('64bit')
-    if "alert" not in opts and "noalert" not in opts:
-        opts.append('noalert')
-    if "alert" in opts:
-        xsErrors.alerts = True
+    opts = prepare_options(args)
+    if "profile" in opts or "profile_json" in opts:
+        profiler.start()
+    if target.endswith('.ypc'):
+        run_bytecode(opts, target)
+    else:
+        process(opts, target)
+    profile = profiler.stop()
+    if profile is None:
+        return
+    if "profile" in opts:
+        print()
+        print(profile.table())
+    if "profile_json" in opts:
+        out = os.path.splitext(target)[0] + '.profile.json'
+        with open(out, 'w') as file:
+            file.write(profile.json())
+        print(f'{colora.Fore.LIGHTYELLOW_EX}Profile written to {colora.Fore.BLUE}{colora.Style.BRIGHT}{fmt_file(out)}{colora.Style.RESET_ALL}')
+
+
+def process(opts, target):
     v = read(target)
     target = xsErrors.contentFile
     if "view" in opts:
-        print(
-            f'{colora.Fore.LIGHTYELLOW_EX}Viewing {colora.Fore.RESET}{colora.Fore.BLUE}{colora.Style.BRIGHT}{target}'
-            f'{colora.Style.RESET_ALL}:')
-        if not os.path.exists('syntax.json'):
-            xsErrors.crit_err(6,  f"The library 'syntax.json' could not be found",
-                              cause=['Trying to view code without the syntax library'], fix=['Try reinstalling Yupiter', "Download the 'syntax.json' library"])
-        print(light(v, 'syntax.json'))
-        print()
-    ast = lp(v)
-    if "build" in opts:
-        compile_(opts, ast)
+        view(target, v)
+    if "compile" in opts:
+        compile_(opts, v)
+    elif "bytecode" in opts:
+        bytecode_(opts, v)
     elif "run" in opts:
-        run(opts, ast)
+        run(opts, lp(v))
     else:
-        pass
+        lp(v)
 
 
 if __name__ == '__main__':
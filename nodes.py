@@ -0,0 +1,209 @@
+# AST nodes
+#
+# Every node kind is a small class with __slots__, the parser emits them and
+# both back-ends (compiler, interpreter) read their attributes directly.
+# kind is the name the node had in the former (Type, {fields}, pos) tuples.
+
+
+class Node:
+    __slots__ = ('pos',)
+    kind = 'Node'
+    fields = ()
+
+    def __repr__(self):
+        return f"{self.kind}({', '.join(f'{field}={getattr(self, field)!r}' for field in self.fields)})"
+
+
+class Module(Node):
+    __slots__ = ('body',)
+    kind = 'Module'
+    fields = ('body',)
+
+    def __init__(self, body, pos=(-1, 0)):
+        self.body = body
+        self.pos = pos
+
+
+class Data(Node):
+    __slots__ = ('value',)
+    fields = ('value',)
+
+    def __init__(self, value, pos):
+        self.value = value
+        self.pos = pos
+
+
+class Number(Data):
+    __slots__ = ()
+    kind = 'Number'
+
+
+class Float(Data):
+    __slots__ = ()
+    kind = 'Float'
+
+
+class String(Data):
+    __slots__ = ()
+    kind = 'String'
+
+
+class Name(Data):
+    __slots__ = ()
+    kind = 'Name'
+
+
+class List(Node):
+    __slots__ = ('value', 'type')
+    kind = 'List'
+    fields = ('value', 'type')
+
+    def __init__(self, value, type_, pos):
+        self.value = value
+        self.type = type_
+        self.pos = pos
+
+
+class Dot(Node):
+    __slots__ = ('obj', 'function', 'args')
+    kind = 'Dot'
+    fields = ('obj', 'function', 'args')
+
+    def __init__(self, obj, function, args, pos):
+        self.obj = obj
+        self.function = function
+        self.args = args
+        self.pos = pos
+
+
+class Import(Node):
+    __slots__ = ('module',)
+    kind = 'Import'
+    fields = ('module',)
+
+    def __init__(self, module, pos):
+        self.module = module
+        self.pos = pos
+
+
+class Expression(Node):
+    __slots__ = ('op', 'lhs', 'rhs')
+    kind = 'Expression'
+    fields = ('op', 'lhs', 'rhs')
+
+    def __init__(self, op, lhs, rhs, pos):
+        self.op = op
+        self.lhs = lhs
+        self.rhs = rhs
+        self.pos = pos
+
+
+class VarAssign(Node):
+    __slots__ = ('name', 'value')
+    kind = 'VarAssign'
+    fields = ('name', 'value')
+
+    def __init__(self, name, value, pos):
+        self.name = name
+        self.value = value
+        self.pos = pos
+
+
+class VarSet(Node):
+    __slots__ = ('name', 'type', 'size')
+    kind = 'VarSet'
+    fields = ('name', 'type', 'size')
+
+    def __init__(self, name, type_, size, pos):
+        self.name = name
+        self.type = type_
+        self.size = size
+        self.pos = pos
+
+
+class If(Node):
+    __slots__ = ('test', 'body', 'orelse')
+    kind = 'If'
+    fields = ('test', 'body', 'orelse')
+
+    def __init__(self, test, body, orelse, pos):
+        self.test = test
+        self.body = body
+        self.orelse = orelse
+        self.pos = pos
+
+
+class While(Node):
+    __slots__ = ('test', 'body')
+    kind = 'While'
+    fields = ('test', 'body')
+
+    def __init__(self, test, body, pos):
+        self.test = test
+        self.body = body
+        self.pos = pos
+
+
+class Until(While):
+    __slots__ = ()
+    kind = 'Until'
+
+
+class FuncCall(Node):
+    __slots__ = ('name', 'params')
+    kind = 'FuncCall'
+    fields = ('name', 'params')
+
+    def __init__(self, name, params, pos):
+        self.name = name
+        self.params = params
+        self.pos = pos
+
+
+class Param(Node):
+    __slots__ = ('name', 'type')
+    kind = 'Param'
+    fields = ('name', 'type')
+
+    def __init__(self, name, type_, pos):
+        self.name = name
+        self.type = type_
+        self.pos = pos
+
+
+class Def(Node):
+    __slots__ = ('name', 'def_params', 'body')
+    kind = 'Def'
+    fields = ('name', 'def_params', 'body')
+
+    def __init__(self, name, def_params, body, pos):
+        self.name = name
+        self.def_params = def_params
+        self.body = body
+        self.pos = pos
+
+
+class Return(Node):
+    __slots__ = ('value',)
+    kind = 'Return'
+    fields = ('value',)
+
+    def __init__(self, value, pos):
+        self.value = value
+        self.pos = pos
+
+
+class Break(Node):
+    __slots__ = ()
+    kind = 'BREAK'
+
+    def __init__(self, pos):
+        self.pos = pos
+
+
+class Continue(Node):
+    __slots__ = ()
+    kind = 'CONTINUE'
+
+    def __init__(self, pos):
+        self.pos = pos
@@ -0,0 +1,121 @@
+# Peephole optimizer over the emitted segments
+#
+# Runs after register allocation, on the instructions of every segment:
+#  - self moves (mov rax, rax)
+#  - moves that undo the previous one (mov [v0], rax / mov rax, [v0])
+#  - writes to a register that is overwritten before it is read (dead loads)
+#  - jumps to the segment that is emitted right after
+# Opcodes outside KNOWN (division, set, leave, ...) stop every analysis.
+from ir import Op, Reg, Mem, Label, TERMINATORS
+from regalloc import FAMILIES
+
+KNOWN = {Op.MOV, Op.ADD, Op.SUB, Op.AND, Op.OR, Op.XOR, Op.CMP, Op.TEST, Op.IMUL, Op.LEA, Op.PUSH, Op.POP}
+# Opcodes which set every arithmetic flag, and the ones that only write their destination
+FLAGS = {Op.ADD, Op.SUB, Op.AND, Op.OR, Op.XOR, Op.CMP, Op.TEST}
+PURE = {Op.MOV, Op.LEA, Op.ADD, Op.SUB, Op.AND, Op.OR, Op.XOR, Op.IMUL}
+# Scan limit of the liveness checks
+WINDOW = 64
+
+
+def family_of(operand):
+    if type(operand) is Reg:
+        return FAMILIES.get(operand.name)
+    if type(operand) is Mem and operand.reg is not None:
+        return FAMILIES.get(operand.reg)
+    return None
+
+
+def mentions(operands, family):
+    return any(family_of(operand) == family for operand in operands)
+
+
+def optimize(segments, order, scratch):
+    """
+    Optimize <segments> (name -> Segment) in place, <order> is the order in which they are emitted
+    and <scratch> the registers which are never live across blocks (the register allocation pool).
+    Returns the number of removed instructions.
+    """
+    scratch = {FAMILIES[register] for register in scratch}
+    removed = 0
+    for i, name in enumerate(order):
+        segment = segments[name]
+        size = len(segment)
+        following = order[i + 1] if i + 1 < len(order) else None
+        code = list(segment)
+        while simplify(code, scratch, following):
+            pass
+        segment.replace(code)
+        removed += size - len(segment)
+    return removed
+
+
+def simplify(code, scratch, following):
+    changed = False
+    previous = None
+    index = 0
+    while index < len(code):
+        op, dst, src = code[index]
+        if op == Op.COMMENT:
+            index += 1
+            continue
+        if op == Op.MOV and (dst == src or repeats(previous, dst, src)):
+            del code[index]
+            changed = True
+            continue
+        if dead(code, index, scratch):
+            del code[index]
+            changed = True
+            previous = None
+            continue
+        previous = code[index]
+        index += 1
+    # Jump to the segment that follows anyway
+    if code and following is not None and code[-1][0] == Op.JMP and code[-1][1] == Label(following):
+        del code[-1]
+        changed = True
+    return changed
+
+
+def repeats(previous, dst, src):
+    # mov a, b after mov b, a, or after the same mov if it did not change its own source
+    if previous is None or previous[0] != Op.MOV:
+        return False
+    if previous[1] == src and previous[2] == dst:
+        return True
+    return previous[1] == dst and previous[2] == src and not (type(dst) is Reg and mentions((src,), family_of(dst)))
+
+
+def dead(code, index, scratch):
+    op, dst, src = code[index]
+    if op not in PURE or src is None or type(dst) is not Reg or dst.name not in FAMILIES:
+        return False
+    family = FAMILIES[dst.name]
+    # push, pop, call and leave use the stack registers without naming them
+    if family in ('rsp', 'rbp'):
+        return False
+    if op in FLAGS and not flags_dead(code, index):
+        return False
+    for position in range(index + 1, min(len(code), index + 1 + WINDOW)):
+        other, other_dst, other_src = code[position]
+        if other == Op.COMMENT:
+            continue
+        if other not in KNOWN:
+            # A call reads its argument registers
+            return (not mentions((other_dst, other_src), family) and other in TERMINATORS and
+                    other != Op.CALL and family in scratch)
+        if other == Op.MOV and other_dst == dst and not mentions((other_src,), family):
+            return True
+        if mentions((other_dst, other_src), family):
+            return False
+    # End of the segment, unless the scan was cut short
+    return len(code) - index - 1 <= WINDOW and family in scratch
+
+
+def flags_dead(code, index):
+    # The flags are overwritten before any instruction could read them
+    for position in range(index + 1, min(len(code), index + 1 + WINDOW)):
+        other = code[position][0]
+        if other in (Op.COMMENT, Op.MOV):
+            continue
+        return other in FLAGS
+    return False
@@ -0,0 +1,171 @@
+# Per-phase profile of a compilation or run (--profile / --profile-json)
+#
+# The phases (read, lp, optimize, lower, generate, write, ...) are wrapped in
+# phase(name), which records wall time, CPU time and the peak memory traced
+# by tracemalloc above the memory in use when the phase started. Phases nest,
+# the time of a phase includes the phases inside it. count() adds to counters
+# (tokens, nodes, segments, instructions, bytes) and the AST visitors count
+# their visits per node kind into visits(). Without start() there is no active
+# profile: phase() returns a shared empty context and count() returns at once.
+import collections
+import time
+
+active = None
+
+
+class _Null:
+    # The context of phase() when no profile is active
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _Null()
+
+
+class Phase:
+    __slots__ = ('profile', 'name', 'depth', 'wall', 'cpu', 'peak', 'base', 'highest')
+
+    def __init__(self, profile, name, depth):
+        self.profile = profile
+        self.name = name
+        self.depth = depth
+        self.wall = self.cpu = 0.0
+        self.peak = 0
+        # Traced memory when the phase started, and the highest seen in it (including its nested phases)
+        self.base = 0
+        self.highest = 0
+
+    def __enter__(self):
+        profile = self.profile
+        profile.highest()
+        self.base = profile.tracemalloc.get_traced_memory()[0]
+        profile.stack.append(self)
+        self.wall, self.cpu = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self.wall
+        self.cpu = time.process_time() - self.cpu
+        profile = self.profile
+        profile.highest()
+        profile.stack.pop()
+        self.peak = self.highest - self.base
+        if profile.stack:
+            profile.stack[-1].highest = max(profile.stack[-1].highest, self.highest)
+        return False
+
+
+class Profile:
+    def __init__(self):
+        import tracemalloc
+        self.tracemalloc = tracemalloc
+        tracemalloc.start()
+        self.phases = []
+        self.stack = []
+        self.counters = {}
+        # Visitor class name -> visits per node kind
+        self.visits = {}
+
+    def phase(self, name):
+        record = Phase(self, name, len(self.stack))
+        self.phases.append(record)
+        return record
+
+    def highest(self):
+        # Fold the peak since the last reset into the running phases, the peak is reset for the next phase
+        peak = self.tracemalloc.get_traced_memory()[1]
+        for record in self.stack:
+            record.highest = max(record.highest, peak)
+        self.tracemalloc.reset_peak()
+
+    def stop(self):
+        self.tracemalloc.stop()
+
+    def table(self):
+        lines = [f'{"phase":<16}{"wall":>12}{"cpu":>12}{"peak":>12}']
+        for record in self.phases:
+            name = '  ' * record.depth + record.name
+            lines.append(f'{name:<16}{record.wall * 1000:>10.2f}ms{record.cpu * 1000:>10.2f}ms{size(record.peak):>12}')
+        for name, value in self.counters.items():
+            lines.append(f'{name:<16}{value:>12}')
+        for visitor, counters in self.visits.items():
+            if not counters:
+                continue
+            lines.append(f'{visitor + " visits":<16}{sum(counters.values()):>12}')
+            for kind, value in counters.most_common():
+                lines.append(f'{"  " + kind:<16}{value:>12}')
+        return '\n'.join(lines)
+
+    def json(self):
+        import json
+        return json.dumps({
+            'phases': [{'name': record.name, 'depth': record.depth, 'wall': record.wall, 'cpu': record.cpu, 'peak': record.peak}
+                       for record in self.phases],
+            'counters': self.counters,
+            'visits': {visitor: counters for visitor, counters in self.visits.items() if counters},
+        })
+
+
+def start():
+    global active
+    active = Profile()
+    return active
+
+
+def stop():
+    """
+    Stop tracing, returns the Profile (None if none was started)
+    """
+    global active
+    profile, active = active, None
+    if profile is not None:
+        profile.stop()
+    return profile
+
+
+def phase(name):
+    if active is None:
+        return _NULL
+    return active.phase(name)
+
+
+def count(name, value):
+    if active is not None:
+        active.counters[name] = active.counters.get(name, 0) + value
+
+
+def visits(visitor):
+    """
+    Counter of the visits per node kind of the class of <visitor> in the active profile, None without one
+    """
+    if active is None:
+        return None
+    return active.visits.setdefault(type(visitor).__name__, collections.Counter())
+
+
+def tree_size(tree):
+    """
+    Number of AST nodes in <tree>
+    """
+    from nodes import Node
+
+    def walk(node):
+        if isinstance(node, list):
+            return sum(walk(item) for item in node)
+        if isinstance(node, Node):
+            return 1 + sum(walk(getattr(node, field)) for field in node.fields)
+        return 0
+    return walk(tree)
+
+
+def size(value):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(value) < 1024:
+            return f'{value:.1f}{unit}' if unit != 'B' else f'{value}{unit}'
+        value /= 1024
+    return f'{value:.1f}GB'
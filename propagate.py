@@ -0,0 +1,144 @@
+# Constant propagation and dead store elimination on the AST
+#
+# Runs after fold. Within straight-line code (the module body, every function
+# body), a variable assigned a Number or Float literal is replaced by that
+# literal where it is read, and the expressions around it are folded again.
+# Calls, branches and loops forget everything known, as a function may assign
+# any variable.
+# Stores that are overwritten before being read, and all stores and
+# reservations of variables which are never read, are then removed. These
+# variables get no data section entry. A value containing a call, or reading a
+# variable which is never defined (reported by the compiler), is always kept.
+import nodes
+from fold import fold_expression
+
+LITERALS = ('Number', 'Float')
+# Fields holding statement lists
+BODIES = ('body', 'orelse')
+
+
+def optimize(tree, bits=64):
+    """
+    Propagate the constants of <tree> (a Module) and remove its dead stores, in place.
+    Returns the number of removed statements.
+    """
+    propagate(tree.body, {}, bits)
+    # Removing a store can leave other variables unread
+    start = size = count(tree.body)
+    defined = set(definitions(tree.body))
+    while True:
+        tree.body = prune(tree.body, set(reads(tree.body)), defined)
+        size, previous = count(tree.body), size
+        if size == previous:
+            return start - size
+
+
+def children(node):
+    for field in node.fields:
+        value = getattr(node, field)
+        if isinstance(value, list):
+            yield from (item for item in value if isinstance(item, nodes.Node))
+        elif isinstance(value, nodes.Node):
+            yield value
+
+
+def reads(node):
+    if isinstance(node, list):
+        for item in node:
+            yield from reads(item)
+    elif isinstance(node, nodes.Node):
+        if node.kind == 'Name':
+            yield node.value
+        for child in children(node):
+            yield from reads(child)
+
+
+def definitions(body):
+    for statement in body:
+        if statement.kind in ('VarAssign', 'VarSet'):
+            yield statement.name
+        elif statement.kind == 'Def':
+            yield from (param.name for param in statement.def_params if param is not None)
+        for _, block in bodies(statement):
+            yield from definitions(block)
+
+
+def calls(node):
+    if not isinstance(node, nodes.Node):
+        return False
+    return node.kind == 'FuncCall' or any(calls(child) for child in children(node))
+
+
+def bodies(statement):
+    for field in BODIES:
+        if field in statement.fields and getattr(statement, field):
+            yield field, getattr(statement, field)
+
+
+def count(body):
+    return sum(1 + sum(count(block) for _, block in bodies(statement)) for statement in body)
+
+
+def substitute(node, env, bits):
+    if not isinstance(node, nodes.Node):
+        return node
+    if node.kind == 'Name' and node.value in env:
+        known = env[node.value]
+        return type(known)(known.value, node.pos)
+    if node.kind == 'Expression':
+        node.lhs = substitute(node.lhs, env, bits)
+        node.rhs = substitute(node.rhs, env, bits)
+        return fold_expression(node, bits)
+    return node
+
+
+def propagate(body, env, bits):
+    for statement in body:
+        kind = statement.kind
+        if kind == 'VarAssign' and not calls(statement.value):
+            statement.value = substitute(statement.value, env, bits)
+            if statement.value.kind in LITERALS:
+                env[statement.name] = statement.value
+            else:
+                env.pop(statement.name, None)
+        elif kind == 'Return' and not calls(statement.value):
+            statement.value = substitute(statement.value, env, bits)
+        elif kind == 'VarSet':
+            env.pop(statement.name, None)
+        elif kind == 'Import':
+            continue
+        else:
+            # Calls, branches, loops and function definitions
+            if kind == 'FuncCall':
+                statement.params = [substitute(param, env, bits) for param in statement.params]
+            env.clear()
+            for _, block in bodies(statement):
+                propagate(block, {}, bits)
+
+
+def prune(body, read, defined):
+    # Walks backwards, <overwritten> are the variables assigned later on before any read
+    kept = []
+    overwritten = set()
+    for statement in reversed(body):
+        kind = statement.kind
+        if kind == 'VarAssign':
+            if (not calls(statement.value) and defined.issuperset(reads(statement.value)) and
+                    (statement.name not in read or statement.name in overwritten)):
+                continue
+            # Earlier stores of the name are dead, unless the value (or a call in it) reads them
+            overwritten.add(statement.name)
+            if calls(statement.value):
+                overwritten.clear()
+            overwritten.difference_update(reads(statement.value))
+        elif kind == 'VarSet':
+            if statement.name not in read:
+                continue
+            overwritten.discard(statement.name)
+        elif kind != 'Import':
+            overwritten.clear()
+            for field, block in bodies(statement):
+                setattr(statement, field, prune(block, read, defined))
+        kept.append(statement)
+    kept.reverse()
+    return kept
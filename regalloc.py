@@ -0,0 +1,193 @@
+# Linear scan register allocation over the emitted segments
+#
+# Codegen keeps every variable in memory and moves it through op1/op2 on each
+# access. This pass splits the segments into blocks (a block ends after a jump,
+# call or ret) and allocates the variables used in a block to the free general
+# purpose registers: a variable is loaded once before its first read, lives in
+# its register for the rest of its live range and is stored back after its last
+# access only if it was written and may be read somewhere else.
+# op1/op2, the stack registers and rdx (implicit operand of mul/div) are never allocated,
+# neither are registers a block names itself (call arguments, parameters saved by a prologue).
+from ir import Op, Reg, Mem, TERMINATORS
+
+POOLS = {
+    '64bit': ('r12', 'r13', 'r14', 'r15', 'r10', 'r11', 'r9', 'r8', 'rdi', 'rsi', 'rcx'),
+    '32bit': ('esi', 'edi', 'ecx'),
+}
+# Register widths, variables accessed together with a register of another width keep their memory
+SIZES = {}
+for _names, _bits in ((('rax', 'rbx', 'rcx', 'rdx', 'rsi', 'rdi', 'rbp', 'rsp'), 64),
+                      (('eax', 'ebx', 'ecx', 'edx', 'esi', 'edi', 'ebp', 'esp'), 32),
+                      (('ax', 'bx', 'cx', 'dx', 'si', 'di', 'bp', 'sp'), 16),
+                      (('al', 'ah', 'bl', 'bh', 'cl', 'ch', 'dl', 'dh'), 8)):
+    SIZES.update(dict.fromkeys(_names, _bits))
+for _i in range(8, 16):
+    SIZES.update({f'r{_i}': 64, f'r{_i}d': 32, f'r{_i}w': 16, f'r{_i}b': 8})
+# Register name -> the full register it is part of
+FAMILIES = {}
+for _names in (('rax', 'eax', 'ax', 'al', 'ah'), ('rbx', 'ebx', 'bx', 'bl', 'bh'), ('rcx', 'ecx', 'cx', 'cl', 'ch'),
+               ('rdx', 'edx', 'dx', 'dl', 'dh'), ('rsi', 'esi', 'si', 'sil'), ('rdi', 'edi', 'di', 'dil'),
+               ('rbp', 'ebp', 'bp', 'bpl'), ('rsp', 'esp', 'sp', 'spl')):
+    FAMILIES.update(dict.fromkeys(_names, _names[0]))
+for _i in range(8, 16):
+    FAMILIES.update(dict.fromkeys((f'r{_i}', f'r{_i}d', f'r{_i}w', f'r{_i}b'), f'r{_i}'))
+# Opcodes whose destination is written without being read, or only read
+SETS = {Op.SETE, Op.SETNE, Op.SETG, Op.SETGE, Op.SETL, Op.SETLE}
+WRITE_ONLY = {Op.MOV, Op.MOVZX, Op.LEA, Op.POP} | SETS
+READ_ONLY = {Op.CMP, Op.TEST, Op.PUSH, Op.IDIV}
+# Registers an opcode uses without naming them
+IMPLICIT = {Op.IDIV: ('rax', 'rdx'), Op.CQO: ('rax', 'rdx'), Op.CDQ: ('rax', 'rdx')}
+
+
+class Interval:
+    __slots__ = ('memory', 'start', 'end', 'uses', 'load', 'dirty', 'mixed', 'register')
+
+    def __init__(self, memory, start, load):
+        self.memory = memory
+        self.start = start
+        self.end = start
+        self.uses = 0
+        self.load = load
+        self.dirty = False
+        self.mixed = False
+        self.register = None
+
+
+def accesses(op, dst, src):
+    # (slot, read, write) for every variable operand
+    if type(dst) is Mem:
+        if op in READ_ONLY:
+            yield dst.slot, True, False
+        elif op in WRITE_ONLY:
+            yield dst.slot, False, True
+        else:
+            yield dst.slot, True, True
+    if type(src) is Mem:
+        yield src.slot, True, False
+
+
+def blocks(segment):
+    block = []
+    for instruction in segment:
+        block.append(instruction)
+        if instruction[0] in TERMINATORS:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def registers_of(operand):
+    if type(operand) is Reg:
+        return FAMILIES.get(operand.name),
+    if type(operand) is Mem and operand.reg is not None:
+        return FAMILIES.get(operand.reg),
+    return ()
+
+
+def intervals(block, bits):
+    # Live ranges of the variables of <block>, and the registers it uses directly
+    found = {}
+    used = set()
+    for index, (op, dst, src) in enumerate(block):
+        used.update(registers_of(dst))
+        used.update(registers_of(src))
+        used.update(IMPLICIT.get(op, ()))
+        mixed = any(type(operand) is Reg and SIZES.get(operand.name, bits) != bits for operand in (dst, src))
+        for slot, read, write in accesses(op, dst, src):
+            interval = found.get(slot)
+            if interval is None:
+                interval = found[slot] = Interval(Mem(*slot), index, read)
+            interval.end = index
+            interval.uses += 1
+            interval.dirty |= write
+            interval.mixed |= mixed
+    return found, used
+
+
+def allocate(segments, registers):
+    """
+    Allocate the variables of every block of <segments> (name -> Segment) to <registers>, in place.
+    Returns the number of memory accesses removed.
+    """
+    split = {name: list(blocks(segment)) for name, segment in segments.items()}
+    bits = SIZES[registers[0]]
+    found = {(name, i): intervals(block, bits) for name, parts in split.items() for i, block in enumerate(parts)}
+    # Blocks each variable appears in, a variable private to one block needs no store if it is written first
+    shared = {}
+    for ranges, _ in found.values():
+        for slot in ranges:
+            shared[slot] = shared.get(slot, 0) + 1
+
+    saved = 0
+    for name, parts in split.items():
+        out = []
+        for i, block in enumerate(parts):
+            ranges, used = found[name, i]
+            saved += scan(ranges, shared, [register for register in registers if FAMILIES[register] not in used])
+            out.extend(rewrite(block, ranges))
+        segments[name].replace(out)
+    return saved
+
+
+def scan(ranges, shared, registers):
+    candidates = []
+    for slot, interval in ranges.items():
+        interval.dirty = interval.dirty and (interval.load or shared[slot] > 1)
+        benefit = interval.uses - interval.load - interval.dirty
+        if benefit > 0 and not interval.mixed:
+            candidates.append((interval, benefit))
+    candidates.sort(key=lambda item: item[0].start)
+
+    free = list(reversed(registers))
+    active = []
+    saved = 0
+    for interval, benefit in candidates:
+        # Intervals ending at this instruction still hold their register
+        for other in [other for other in active if other[0].end < interval.start]:
+            active.remove(other)
+            free.append(other[0].register)
+        if free:
+            interval.register = free.pop()
+        else:
+            # Spill the live interval that ends last
+            victim = max(active, key=lambda item: item[0].end)
+            if victim[0].end <= interval.end:
+                continue
+            active.remove(victim)
+            interval.register, victim[0].register = victim[0].register, None
+            saved -= victim[1]
+        active.append((interval, benefit))
+        saved += benefit
+    return saved
+
+
+def rewrite(block, ranges):
+    allocated = {slot: Reg(interval.register) for slot, interval in ranges.items() if interval.register}
+    if not allocated:
+        return block
+    last = len(block) - 1
+    before = {}
+    after = {}
+    for slot, register in allocated.items():
+        interval = ranges[slot]
+        if interval.load:
+            before.setdefault(interval.start, []).append((Op.MOV, register, interval.memory))
+        if interval.dirty:
+            # Stored before the jump that ends the block, the jump does not touch the register
+            store = (Op.MOV, interval.memory, register)
+            if interval.end == last and block[last][0] in TERMINATORS:
+                before.setdefault(last, []).append(store)
+            else:
+                after.setdefault(interval.end, []).append(store)
+
+    out = []
+    for index, (op, dst, src) in enumerate(block):
+        out.extend(before.get(index, ()))
+        if type(dst) is Mem and dst.slot in allocated:
+            dst = allocated[dst.slot]
+        if type(src) is Mem and src.slot in allocated:
+            src = allocated[src.slot]
+        out.append((op, dst, src))
+        out.extend(after.get(index, ()))
+    return out
@@ -0,0 +1,224 @@
+# Hand-written lexer of the compiler, gives the same tokens as lp.PLexer
+#
+# PLexer goes through sly's generic tokenize: it skips the blanks one
+# character at a time, calls a Python function for every newline and comment
+# and remaps NAME to the keywords through nested dicts. Here one master regex
+# splits the whole text into the tokens and the runs of blanks and comments in
+# front of them, the regex engine skips both itself. Nothing is then done per
+# token in Python: the offsets are the running sums of the lengths, the lines
+# the running sums of the newlines in the runs, and the kinds come from the
+# spelling (keywords and operators) or else from the first character. The
+# numerals are looked at one by one only if one of them has a dot or an
+# exponent, to tell the floats apart. Every character no rule matches is a
+# token of its own and is reported when the parser reaches it.
+#
+# The tokens of a text are kept in a TokenBuffer: parallel arrays of kinds,
+# start and end offsets and line numbers, the values are sliced from the
+# source only when asked for. lp.PParser parses it directly, sly Tokens are
+# only made by tokenize() (the interface of PLexer).
+import re
+from array import array
+from itertools import accumulate, compress, repeat
+from operator import eq, itemgetter
+from types import MappingProxyType
+
+from sly.lex import Token
+
+import errors as xsErrors
+from lp import Hexnumber, Binnumber, Octnumber, Decnumber
+
+KEYWORDS = MappingProxyType({
+    'if': 'IF',
+    'else': 'ELSE',
+    'def': 'DEF',
+    'return': 'RETURN',
+    'while': 'WHILE',
+    'until': 'UNTIL',
+    'break': 'BREAK',
+    'continue': 'CONTINUE',
+    'and': 'AND',
+    'or': 'OR',
+    'set': 'SET',
+    'import': 'IMPORT',
+})
+OPERATORS = MappingProxyType({
+    '>=': 'GE',
+    '>': 'GT',
+    '<=': 'LE',
+    '<': 'LT',
+    '!=': 'NE',
+    '==': 'EQEQ',
+    '=': 'EQ',
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    '+': 'PLUS',
+    '-': 'MINUS',
+    '*': 'TIMES',
+    '/': 'DIVIDE',
+    '%': 'MOD',
+    ':': 'COLON',
+    ';': 'SEMI_COLON',
+    ',': 'COMMA',
+})
+# Spelling -> type of the pieces whose type is fixed by their text
+SPELLINGS = MappingProxyType({**KEYWORDS, **OPERATORS})
+
+# Kind code of a TokenBuffer -> token type
+KINDS = ('NAME', 'NUMBER', 'FLOAT', 'STRING', *KEYWORDS.values(), *OPERATORS.values(), 'ERROR')
+CODES = MappingProxyType({kind: code for code, kind in enumerate(KINDS)})
+ERROR, NUMBER, FLOAT = CODES['ERROR'], CODES['NUMBER'], CODES['FLOAT']
+
+# Spelling -> code, a lone quote or dot is illegal. A plain dict, its get is called for every piece
+SPELLED = {**{spelling: CODES[kind] for spelling, kind in SPELLINGS.items()}, '"': ERROR, "'": ERROR, '.': ERROR}
+
+
+class Firsts(dict):
+    # Ordinal of a first character -> code of the pieces not spelled out, any other character is illegal
+    def __missing__(self, char):
+        return ERROR
+
+
+FIRSTS = Firsts({ord(char): CODES['NAME'] for char in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_'})
+FIRSTS.update({ord(char): NUMBER for char in '0123456789'})
+FIRSTS.update({ord('.'): FLOAT, ord('"'): CODES['STRING'], ord("'"): CODES['STRING']})
+FIRSTS = MappingProxyType(FIRSTS)
+
+
+class Newlines(dict):
+    # Run of blanks and comments -> its number of newlines, the same runs come back again and again
+    def __missing__(self, blanks):
+        count = self[blanks] = blanks.count('\n')
+        return count
+
+
+def bare(pattern):
+    # <pattern> with non-capturing groups, the only groups of PIECE are then the run in front and the token
+    return re.sub(r'\((?!\?)', '(?:', pattern)
+
+
+# lp.Pointfloat and lp.Expfloat share their leading digits, they are tried once for both
+DIGITS = r'[0-9](?:_?[0-9])*'
+EXPONENT = r'[eE][-+]?[0-9](?:_?[0-9])*'
+NUMERAL = rf'{DIGITS}(?:\.(?:{DIGITS})?(?:{EXPONENT})?|{EXPONENT})|\.{DIGITS}(?:{EXPONENT})?|' + '|'.join(
+    bare(pattern) for pattern in (Hexnumber, Binnumber, Octnumber, Decnumber))
+# The blanks and comments in front of a token, then the alternatives of the token, the first one matching wins
+# as in PLexer (FLOAT before NUMBER, '>=' before '>'). The end of the text closes the run after the last token.
+PIECE = re.compile(r'([ \t\r\n]*(?:#[^\n]*[ \t\r\n]*)*)(' + '|'.join((
+    r'[a-zA-Z_][a-zA-Z0-9_]*',
+    r'[<>!=]=|[-+*/%()<>=;:,]',
+    NUMERAL,
+    r'"[^"\n]*"',
+    r"'[^'\n]*'",
+    r'[^ \t\r\n]',
+    r'\Z',
+)) + ')')
+
+
+def numeral(piece):
+    # Type of a piece starting with a digit
+    if piece[:2] not in ('0x', '0X') and ('.' in piece or 'e' in piece or 'E' in piece):
+        return 'FLOAT'
+    return 'NUMBER'
+
+
+class Scanner:
+    def tokenize(self, text, lineno=1, index=0):
+        """
+        Tokens of <text>, sly Tokens with the type, value, lineno, index and end PLexer gives them
+        """
+        return iter(self.buffer(text, lineno, index))
+
+    def buffer(self, text, lineno=1, index=0):
+        """
+        The tokens of <text> in a TokenBuffer, the illegal characters are kept as ERROR tokens
+        """
+        # ['', run, token, '', run, token, ...], every match starts where the previous one ended so the text
+        # between them is always empty. The end of the text matches as one or two empty tokens
+        pieces = PIECE.split(text[index:] if index else text)
+        del pieces[::3]
+        found = pieces[1::2]
+        while found and not found[-1]:
+            found.pop()
+        count = len(found)
+        offsets = array('I', accumulate(map(len, pieces), initial=index))
+        lines = array('I', accumulate(map(Newlines().__getitem__, pieces[0:2 * count:2]), initial=lineno))
+        firsts = ''.join(map(itemgetter(0), found)).translate(FIRSTS).encode('latin-1')
+        buffer = TokenBuffer(text)
+        buffer.kinds = array('B', map(SPELLED.get, found, firsts))
+        buffer.starts = offsets[1:2 * count:2]
+        buffer.ends = offsets[2:2 * count + 1:2]
+        buffer.lines = lines[1:]
+        # The numerals starting with a digit are NUMBERs, but the floats (with a dot or an exponent)
+        numerals = list(compress(range(len(found)), map(eq, firsts, repeat(NUMBER))))
+        spelled = ' '.join(map(found.__getitem__, numerals))
+        if '.' in spelled or 'e' in spelled or 'E' in spelled:
+            kinds = buffer.kinds
+            for i in numerals:
+                if numeral(found[i]) == 'FLOAT':
+                    kinds[i] = FLOAT
+        return buffer
+
+
+class TokenBuffer:
+    # The tokens of a source in columns, token <i> is kinds[i] (a code of KINDS), starts[i]:ends[i] and lines[i]
+    __slots__ = ('source', 'kinds', 'starts', 'ends', 'lines')
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.lines = array('I')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def type(self, i):
+        return KINDS[self.kinds[i]]
+
+    def value(self, i):
+        return self.source[self.starts[i]:self.ends[i]]
+
+    def error(self, i):
+        start = self.starts[i]
+        xsErrors.stderr(3, (start, start), self.lines[i], f'Illegal character "{self.value(i)[0]}"')
+
+    def __iter__(self):
+        # As sly Tokens, an illegal character is reported when reached
+        source = self.source
+        for i, (kind, start, end, line) in enumerate(zip(self.kinds, self.starts, self.ends, self.lines)):
+            if kind == ERROR:
+                self.error(i)
+                continue
+            token = Token()
+            token.type = KINDS[kind]
+            token.value = source[start:end]
+            token.lineno = line
+            token.index = start
+            token.end = end
+            yield token
+
+
+class Terminal:
+    # Token <i> of a TokenBuffer on the stack of the parser, the value is sliced when a rule reads it
+    __slots__ = ('buffer', 'i')
+
+    @property
+    def type(self):
+        return KINDS[self.buffer.kinds[self.i]]
+
+    @property
+    def value(self):
+        return self.buffer.value(self.i)
+
+    @property
+    def lineno(self):
+        return self.buffer.lines[self.i]
+
+    @property
+    def index(self):
+        return self.buffer.starts[self.i]
+
+    @property
+    def end(self):
+        return self.buffer.ends[self.i]
@@ -0,0 +1,167 @@
+# Compile server keeping the lexer, parser and codegen warm
+#
+# Requests and responses are JSON objects, one per line:
+#   {"id": 1, "op": "compile", "source": "age = 11", "file": "main.yp", "options": ["--x32"]}
+#   {"id": 1, "ok": true, "asm": "...", "diagnostics": ""}
+# op is one of compile (-> asm), run (-> output) or highlight (-> text).
+# Requests run concurrently on a pool of worker processes which import the
+# front-end once. Every request gets its own Compiler / Codegen / Variables.
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import errors as xsErrors
+from batch import captured, init_worker
+from errors import crit_err as error
+
+OPS = ('compile', 'run', 'highlight')
+
+
+def execute(op, opts, source):
+    import main as cli
+    match op:
+        case "compile":
+            return cli.generate(opts, source)
+        case "run":
+            from interpreter import Interpreter
+            Interpreter(opts).make(cli.lp(source))
+        case "highlight":
+            if not os.path.exists('syntax.json'):
+                xsErrors.crit_err(6, f"The library 'syntax.json' could not be found",
+                                  cause=['Trying to view code without the syntax library'], fix=['Try reinstalling Yupiter', "Download the 'syntax.json' library"])
+            from syntax_higlighting import light
+            return light(source, 'syntax.json')
+
+
+def handle(request):
+    """
+    Handle a single request inside a worker
+    """
+    import main as cli
+    op = request.get('op')
+    source = request.get('source', '')
+    target = request.get('file', 'request.yp')
+    xsErrors.alerts = False
+    xsErrors.contentLoader = source
+    xsErrors.contentFile = cli.fmt_file(target)
+    xsErrors.TrueFile = target
+    xsErrors.contentOut = target[:len(target) - 3] + '.asm'
+    success, opts, diagnostics = captured(cli.prepare_options, list(request.get('options', [])))
+    if not success:
+        return {'id': request.get('id'), 'ok': False, 'diagnostics': diagnostics}
+
+    success, result, output = captured(execute, op, opts, source)
+    response = {'id': request.get('id'), 'ok': success}
+    match op:
+        case "compile":
+            response['asm'] = result
+            response['diagnostics'] = output
+        case "run":
+            response['output'] = output if success else ''
+            response['diagnostics'] = '' if success else output
+        case "highlight":
+            response['text'] = result
+            response['diagnostics'] = output
+    return response
+
+
+class Session:
+    """
+    A stream of requests, responses are written in completion order
+    """
+    def __init__(self, pool, out):
+        self.pool = pool
+        self.out = out
+        self.done = threading.Condition()
+        self.outstanding = 0
+
+    def respond(self, response):
+        with self.done:
+            self.out.write(json.dumps(response) + '\n')
+            self.out.flush()
+
+    def finish(self, request, future):
+        if future.exception():
+            response = {'id': request.get('id'), 'ok': False, 'diagnostics': f'Internal error : {future.exception()}'}
+        else:
+            response = future.result()
+        with self.done:
+            self.respond(response)
+            self.outstanding -= 1
+            self.done.notify_all()
+
+    def submit(self, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request must be an object')
+        except ValueError as ex:
+            self.respond({'id': None, 'ok': False, 'diagnostics': f'Invalid request : {ex}'})
+            return
+        if request.get('op') not in OPS:
+            self.respond({'id': request.get('id'), 'ok': False, 'diagnostics': f"Invalid op {request.get('op')!r} (must be one of {', '.join(OPS)})"})
+            return
+        with self.done:
+            self.outstanding += 1
+        self.pool.submit(handle, request).add_done_callback(lambda future: self.finish(request, future))
+
+    def serve(self, lines):
+        for line in lines:
+            if line.strip():
+                self.submit(line)
+        with self.done:
+            self.done.wait_for(lambda: not self.outstanding)
+
+
+class _Writer:
+    # Text interface for a binary socket file
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        self.wfile.write(text.encode())
+
+    def flush(self):
+        self.wfile.flush()
+
+
+def serve(args):
+    socket_path = None
+    jobs = None
+    while args:
+        arg = args.pop(0)
+        if arg == '--socket' and args:
+            socket_path = args.pop(0)
+        elif arg in ('-j', '--jobs') and args and args[0].isnumeric() and int(args[0]) > 0:
+            jobs = int(args.pop(0))
+        else:
+            error(8, 'OptionError', f'Invalid option', cause=[f"You passed in an invalid option : ", arg], fix=["Use --socket <path> and -j <jobs>"])
+
+    # Warm up the front-end before forking the workers
+    init_worker()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as pool:
+        if socket_path is None:
+            Session(pool, sys.stdout).serve(sys.stdin)
+            sys.exit(0)
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                Session(pool, _Writer(self.wfile)).serve(line.decode() for line in self.rfile)
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        # Clean shutdown (and socket removal) on SIGTERM too
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as server:
+            print(f'Serving on {socket_path}', flush=True)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(socket_path)
+
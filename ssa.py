@@ -0,0 +1,405 @@
+# SSA form of a program
+#
+# The compiler lowers the AST into a Module of Functions, the top level code
+# is the function main. A function is a list of basic blocks, a block starts
+# with its phi nodes and ends with a terminator (jump, branch or ret).
+# Every instruction is a Value, its args are the Values it reads and every
+# Value keeps the instructions reading it (def-use chains): replace() redirects
+# all of them at once and a value nobody reads has empty uses.
+# Variables are SSA values, except the memory variables (reservations, and the
+# globals a function uses), which are accessed by load and store.
+#
+#   %2: int = %0 + %1          binop, attr is the operator
+#   %3: int = call f(%2, 4)    attr is the called Function
+#   %4: int = load x           attr is the Slot, store x, %4 writes it
+#   %5: int = phi [b1: %3], [b2: 0]
+#   jump b3 / branch %5, b1, b2 / ret %5
+#
+# Builder constructs the form while the AST is walked (Braun et al., Simple
+# and Efficient Construction of Static Single Assignment Form).
+
+TERMINATORS = ('jump', 'branch', 'ret')
+# Instructions without side effects, removed when their value is unused
+PURE = ('binop', 'load', 'phi')
+
+
+class Value:
+    __slots__ = ('id', 'type', 'uses')
+
+    def __init__(self, type_=None):
+        self.id = None
+        self.type = type_
+        self.uses = []
+
+    def replace(self, other):
+        # Every instruction reading this value reads <other> instead
+        for user in self.uses:
+            user.args = [other if arg is self else arg for arg in user.args]
+            other.uses.append(user)
+        self.uses = []
+
+
+class Const(Value):
+    __slots__ = ('value',)
+
+    def __init__(self, value, type_):
+        super().__init__(type_)
+        self.value = value
+
+    def __str__(self):
+        return f'{self.value}'
+
+
+class Undef(Value):
+    # A variable read on a path where it was never assigned
+    __slots__ = ()
+
+    def __str__(self):
+        return 'undef'
+
+
+class Instr(Value):
+    __slots__ = ('op', 'args', 'attr', 'block')
+
+    def __init__(self, op, args=(), type_=None, attr=None):
+        super().__init__(type_)
+        self.op = op
+        self.args = []
+        self.attr = attr
+        self.block = None
+        for arg in args:
+            self.add(arg)
+
+    def add(self, arg):
+        self.args.append(arg)
+        arg.uses.append(self)
+
+    def drop(self):
+        # Stop reading the args, removing the instruction from their def-use chains
+        for arg in self.args:
+            arg.uses.remove(self)
+        self.args = []
+
+    def __str__(self):
+        return f'%{self.id}'
+
+    def describe(self):
+        args = ', '.join(map(str, self.args))
+        match self.op:
+            case 'binop':
+                text = f' {self.attr} '.join(map(str, self.args))
+            case 'call':
+                text = f'call {self.attr.name}({args})'
+            case 'phi':
+                text = 'phi ' + ', '.join(f'[{pred}: {arg}]' for pred, arg in zip(self.block.preds, self.args))
+            case 'param' | 'load':
+                text = f'{self.op} {self.attr}'
+            case 'store':
+                text = f'store {self.attr}, {args}'
+            case 'jump':
+                text = f'jump {self.attr}'
+            case 'branch':
+                text = f'branch {args}, {self.attr[0]}, {self.attr[1]}'
+            case _:
+                text = f'{self.op} {args}'.rstrip()
+        if self.op in ('store',) + TERMINATORS:
+            return text
+        return f'%{self.id}: {self.type} = {text}'
+
+
+class Slot:
+    # A memory variable, <reserved> for the ones made by set (<size> elements of <type>)
+    __slots__ = ('name', 'type', 'size', 'reserved')
+
+    def __init__(self, name, type_=None, size=None, reserved=False):
+        self.name = name
+        self.type = type_
+        self.size = size
+        self.reserved = reserved
+
+    def __str__(self):
+        return self.name
+
+
+class Block:
+    __slots__ = ('name', 'phis', 'instrs', 'preds', 'sealed', 'defs', 'incomplete')
+
+    def __init__(self, name):
+        self.name = name
+        self.phis = []
+        self.instrs = []
+        self.preds = []
+        # All predecessors are known, see Builder.seal
+        self.sealed = False
+        # Variable name -> its current value at the end of the block, and the phis waiting for the seal
+        self.defs = {}
+        self.incomplete = {}
+
+    def append(self, instr):
+        instr.block = self
+        self.instrs.append(instr)
+        return instr
+
+    @property
+    def terminator(self):
+        return self.instrs[-1] if self.instrs and self.instrs[-1].op in TERMINATORS else None
+
+    @property
+    def succs(self):
+        terminator = self.terminator
+        if terminator is None or terminator.op == 'ret':
+            return []
+        return [terminator.attr] if terminator.op == 'jump' else list(terminator.attr)
+
+    def __str__(self):
+        return self.name
+
+
+class Function:
+    __slots__ = ('name', 'params', 'blocks', 'count')
+
+    def __init__(self, name):
+        # name is None for the top level code
+        self.name = name
+        self.params = []
+        self.blocks = []
+        self.count = 0
+
+    @property
+    def entry(self):
+        return self.blocks[0]
+
+    def new_block(self):
+        block = Block(f'b{self.count}')
+        self.count += 1
+        self.blocks.append(block)
+        return block
+
+    def number(self):
+        # Ids of the instruction values, in block order
+        count = 0
+        for block in self.blocks:
+            for instr in block.phis + block.instrs:
+                instr.id = count
+                count += 1
+
+
+class Module:
+    __slots__ = ('main', 'functions', 'globals')
+
+    def __init__(self):
+        self.main = Function(None)
+        # In order of definition
+        self.functions = []
+        # Name -> Slot of the top level memory variables
+        self.globals = {}
+
+    def dump(self):
+        lines = [f'global {slot}: {slot.type}' + (f'[{slot.size}]' if slot.size else '') for slot in self.globals.values()]
+        for function in self.functions + [self.main]:
+            function.number()
+            if function.name is None:
+                lines.append('function main:')
+            else:
+                params = ', '.join(f'{param}: {param.type}' for param in function.params)
+                lines.append(f'function {function.name}({params}):')
+            for block in function.blocks:
+                preds = f'  ; preds {", ".join(map(str, block.preds))}' if block.preds else ''
+                lines.append(f'  {block}:{preds}')
+                lines.extend(f'    {instr.describe()}' for instr in block.phis + block.instrs)
+        return '\n'.join(lines)
+
+
+class Builder:
+    # Builds a Function, <block> is the block code is appended to, None after a terminator
+    def __init__(self, function):
+        self.function = function
+        self.block = function.new_block()
+        self.block.sealed = True
+
+    def emit(self, op, args=(), type_=None, attr=None):
+        if self.block is None:
+            # Code after a jump or return, removed by finish
+            self.block = self.function.new_block()
+            self.block.sealed = True
+        return self.block.append(Instr(op, args, type_, attr))
+
+    def param(self, name, type_):
+        param = self.emit('param', (), type_, name)
+        self.function.params.append(param)
+        self.write(name, param)
+        return param
+
+    def terminate(self, op, args=(), attr=None, targets=()):
+        self.emit(op, args, attr=attr)
+        for target in targets:
+            target.preds.append(self.block)
+        self.block = None
+
+    def jump(self, target):
+        if self.block is not None:
+            self.terminate('jump', attr=target, targets=(target,))
+
+    def branch(self, test, then, other):
+        self.terminate('branch', (test,), (then, other), (then, other))
+
+    def ret(self, value=None):
+        self.terminate('ret', () if value is None else (value,))
+
+    def write(self, name, value):
+        if self.block is not None:
+            self.block.defs[name] = value
+
+    def read(self, name, block=None):
+        block = block or self.block
+        if block is None:
+            return Undef()
+        value = block.defs.get(name)
+        if value is None:
+            value = self.read_recursive(name, block)
+        return value
+
+    def read_recursive(self, name, block):
+        if not block.sealed:
+            # The operands are added once all predecessors are known
+            value = self.phi(block)
+            block.incomplete[name] = value
+        elif len(block.preds) == 1:
+            value = self.read(name, block.preds[0])
+        elif not block.preds:
+            value = Undef()
+        else:
+            # Breaks cycles of the lookup through loops
+            value = self.phi(block)
+            block.defs[name] = value
+            value = self.operands(name, value)
+        block.defs[name] = value
+        return value
+
+    @staticmethod
+    def phi(block):
+        phi = Instr('phi')
+        phi.block = block
+        block.phis.append(phi)
+        return phi
+
+    def operands(self, name, phi):
+        for pred in phi.block.preds:
+            phi.add(self.read(name, pred))
+        phi.type = next((arg.type for arg in phi.args if arg.type is not None), None)
+        return self.trivial(phi)
+
+    def trivial(self, phi):
+        # Replace a phi whose operands are all the same value (or itself) by that value
+        same = None
+        for arg in phi.args:
+            if arg is same or arg is phi:
+                continue
+            if same is not None:
+                return phi
+            same = arg
+        if same is None:
+            same = Undef()
+        users = [user for user in phi.uses if user is not phi]
+        phi.drop()
+        phi.replace(same)
+        phi.block.phis.remove(phi)
+        phi.block = None
+        for block in self.function.blocks:
+            for name, value in block.defs.items():
+                if value is phi:
+                    block.defs[name] = same
+        for user in users:
+            if user.op == 'phi' and user.block is not None:
+                self.trivial(user)
+        return same
+
+    def seal(self, block):
+        for name, phi in block.incomplete.items():
+            self.operands(name, phi)
+        block.incomplete = {}
+        block.sealed = True
+
+    def finish(self):
+        if self.block is not None:
+            self.ret()
+        remove_unreachable(self.function)
+        # Phis left with a single distinct operand by the removed predecessors
+        for block in self.function.blocks:
+            for phi in list(block.phis):
+                if phi.block is not None:
+                    self.trivial(phi)
+        infer_types(self.function)
+
+
+def remove_unreachable(function):
+    reachable = set()
+    stack = [function.entry]
+    while stack:
+        block = stack.pop()
+        if block not in reachable:
+            reachable.add(block)
+            stack.extend(block.succs)
+    for block in function.blocks:
+        if block in reachable:
+            continue
+        for succ in block.succs:
+            while block in succ.preds:
+                index = succ.preds.index(block)
+                del succ.preds[index]
+                for phi in succ.phis:
+                    phi.args.pop(index).uses.remove(phi)
+        for instr in block.phis + block.instrs:
+            instr.drop()
+    function.blocks = [block for block in function.blocks if block in reachable]
+
+
+def infer_types(function):
+    # Types of the values made from phis that were still incomplete, taken from their args
+    changed = True
+    while changed:
+        changed = False
+        for block in function.blocks:
+            for instr in block.phis + block.instrs:
+                if instr.type is None and instr.op in ('phi', 'binop'):
+                    instr.type = next((arg.type for arg in instr.args if arg.type is not None), None)
+                    changed |= instr.type is not None
+
+
+def remove_dead(function):
+    """
+    Remove the pure instructions of <function> whose value is never used.
+    Returns the number of removed instructions.
+    """
+    work = [instr for block in function.blocks for instr in block.phis + block.instrs if instr.op in PURE]
+    removed = 0
+    while work:
+        instr = work.pop()
+        if instr.uses or instr.block is None:
+            continue
+        (instr.block.phis if instr.op == 'phi' else instr.block.instrs).remove(instr)
+        instr.block = None
+        work.extend(arg for arg in instr.args if isinstance(arg, Instr) and arg.op in PURE)
+        instr.drop()
+        removed += 1
+    return removed
+
+
+def split_critical_edges(function):
+    # An edge from a block with several successors to a block with phis gets a block of its own,
+    # which holds the copies of the phi operands
+    for block in list(function.blocks):
+        terminator = block.terminator
+        if terminator is None or terminator.op != 'branch':
+            continue
+        targets = list(terminator.attr)
+        for i, target in enumerate(targets):
+            if not target.phis or len(target.preds) < 2:
+                continue
+            edge = function.new_block()
+            edge.sealed = True
+            edge.preds.append(block)
+            edge.append(Instr('jump', attr=target))
+            target.preds[target.preds.index(block)] = edge
+            targets[i] = edge
+        terminator.attr = tuple(targets)
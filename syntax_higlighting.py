@@ -2,6 +2,7 @@ import json
 import colorama as colora
 from sly import Lexer
 from sly.lex import Token
+import table_cache
 
 
 def group(*choices): return '(' + '|'.join(choices) + ')'
@@ -128,6 +129,10 @@ class PLexer(Lexer):
         self.toks.append(t)
         pass
 
+    @classmethod
+    def _build(cls):
+        table_cache.build_lexer(cls)
+
     def tokenize(self, text, lineno=1, index=0):
         _ignored_tokens = _master_re = _ignore = _token_funcs = _literals = _remapping = None
 
@@ -0,0 +1,127 @@
+# Lexer / Parser table cache
+#
+# sly builds the LALR automaton of a Parser (and the master regex of a Lexer)
+# every time the class is created, i.e. on every start of Yupiter.
+# The generated tables are stored in 'lp.tables' next to lp.py and are keyed by
+# a hash of the grammar, so they are only rebuilt when the grammar changes.
+import hashlib
+import os
+import pickle
+
+import sly
+from sly import Lexer
+from sly.yacc import YaccError
+
+CACHE_VERSION = 1
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lp.tables')
+
+_entries = None
+
+
+class CachedLRTable:
+    """
+    Stand-in for sly's LRTable holding only what Parser.parse needs
+    """
+    def __init__(self, lr_action, lr_goto, defaulted_states):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+        self.sr_conflicts = []
+        self.rr_conflicts = []
+
+
+def _digest(*parts):
+    h = hashlib.sha256(f'{CACHE_VERSION}:{sly.__version__}'.encode())
+    for part in parts:
+        h.update(repr(part).encode())
+    return h.hexdigest()
+
+
+def _name(cls):
+    return f'{cls.__module__}.{cls.__qualname__}'
+
+
+def entries():
+    global _entries
+    if _entries is None:
+        try:
+            with open(CACHE_FILE, 'rb') as file:
+                cache = pickle.load(file)
+            _entries = cache['entries'] if cache.get('version') == CACHE_VERSION else {}
+        except Exception:  # Missing, unreadable or corrupted cache: rebuild
+            _entries = {}
+    return _entries
+
+
+def lookup(cls, key):
+    entry = entries().get(_name(cls))
+    if entry and entry[0] == key:
+        return entry[1]
+    return None
+
+
+def store(cls, key, payload):
+    entries()[_name(cls)] = (key, payload)
+    tmp = f'{CACHE_FILE}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'wb') as file:
+            pickle.dump({'version': CACHE_VERSION, 'entries': _entries}, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, CACHE_FILE)
+    except OSError:  # Read-only installation, the tables just get rebuilt next time
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def build_parser(cls, definitions):
+    """
+    Replacement for sly's Parser._build.
+    The grammar itself is cheap and always rebuilt (the productions carry the rule functions),
+    only the LALR tables are loaded from the cache.
+    """
+    rules = cls._Parser__collect_rules(definitions)
+    if not cls._Parser__validate_specification():
+        raise YaccError('Invalid parser specification')
+    cls._Parser__build_grammar(rules)
+
+    grammar = cls._grammar
+    key = _digest(sorted(grammar.Terminals), sorted(grammar.Precedence.items()), grammar.Start,
+                  [(p.name, p.prod, p.prec) for p in grammar.Productions])
+    tables = lookup(cls, key)
+    if tables:
+        cls._lrtable = CachedLRTable(*tables)
+        return
+
+    if not cls._Parser__build_lrtables():
+        raise YaccError('Can\'t build parsing tables')
+    store(cls, key, (cls._lrtable.lr_action, cls._lrtable.lr_goto, cls._lrtable.defaulted_states))
+
+
+def build_lexer(cls):
+    """
+    Replacement for sly's Lexer._build.
+    On a hit the per-rule validation compiles are skipped and only the cached master regex is compiled.
+    """
+    cls._token_names = cls._token_names | set(cls.tokens)
+    cls._collect_rules()
+    key = _digest(sorted(cls._token_names), sorted(cls._remap.items()), cls.ignore, sorted(cls.literals), cls.reflags,
+                  [(name, callable(value), getattr(value, 'pattern', value)) for name, value in cls._rules])
+    pattern = lookup(cls, key)
+    if pattern is None:
+        Lexer._build.__func__(cls)
+        store(cls, key, cls._master_re.pattern)
+        return
+
+    cls._ignored_tokens = set(cls._ignored_tokens)
+    cls._token_funcs = dict(cls._token_funcs)
+    cls._remapping = dict(cls._remapping)
+    for (tok, value), newtok in cls._remap.items():
+        cls._remapping.setdefault(tok, {})[value] = newtok
+    for tokname, value in cls._rules:
+        if tokname.startswith('ignore_'):
+            tokname = tokname[7:]
+            cls._ignored_tokens.add(tokname)
+        if callable(value):
+            cls._token_funcs[tokname] = value
+    cls._master_re = cls.regex_module.compile(pattern, cls.reflags)
@@ -0,0 +1,5 @@
+# The modules of Yupiter are top-level files of the repository
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
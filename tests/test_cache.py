@@ -0,0 +1,53 @@
+# A build served from the .asm cache shows the same diagnostics as the build which stored it
+import pytest
+
+import build_cache
+import errors as xsErrors
+import main as cli
+from compiler import Compiler
+
+SOURCE = 'a = 2\nb = a * 3\nwhile b > 0\n   b = b - 1\n;\nreturn a + b\n'
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(xsErrors, 'contentOut', str(tmp_path / 'out.asm'))
+    monkeypatch.setattr(xsErrors, 'alerts', True)
+    # The grammar only gives numeric reservation sizes, the warning is raised while lowering instead
+    lower = Compiler.lower
+
+    def warned(self, ast):
+        xsErrors.stdwarning('Reservation size is not numeric')
+        return lower(self, ast)
+
+    monkeypatch.setattr(Compiler, 'lower', warned)
+
+
+def build(opts, capsys):
+    xsErrors.contentLoader = SOURCE
+    removed = cli.build(opts, SOURCE)
+    with open(xsErrors.contentOut) as file:
+        return removed, capsys.readouterr().out, file.read()
+
+
+@pytest.mark.parametrize('level', ['O0', 'O1', 'O2'])
+def test_hit_replays_diagnostics(level, capsys):
+    opts = ['64bit', level]
+    compiled = build(opts, capsys)
+    assert compiled[1].count('Reservation size is not numeric') == 1
+    assert (compiled[0] is not None) == (level == 'O2')
+    assert build_cache.load(build_cache.key(SOURCE, opts, cli.__version__)) is not None
+    assert build(opts, capsys) == compiled
+
+
+def test_entry_without_diagnostics_is_rebuilt(capsys):
+    # generate stores the output only, a build compiles again and stores the diagnostics
+    opts = ['64bit', 'O2']
+    xsErrors.contentLoader = SOURCE
+    cli.generate(opts, SOURCE)
+    capsys.readouterr()
+    compiled = build(opts, capsys)
+    assert 'Reservation size is not numeric' in compiled[1]
+    assert build_cache.load_diagnostics(build_cache.key(SOURCE, opts, cli.__version__)) is not None
+    assert build(opts, capsys) == compiled
@@ -0,0 +1,68 @@
+# The emitted functions and top level code keep the callee-saved registers and size their frames from the slots used
+import pytest
+
+import errors as xsErrors
+import main as cli
+from codegen import START_FUNC
+from ir import Op
+from regalloc import FAMILIES
+
+SOURCE = ('n = 3\ndef mix(a: int, b: int, c: int)\n   x = a * b\n   y = x - c\n   z = y * a + b\n   return z + x\n;\n'
+          'def twice(k: int)\n   return mix(k, k, 1) + mix(k, 2, k)\n;\n'
+          'i = 0\ntotal = 0\nwhile i < 10\n   total = total + twice(i) * n\n   i = i + 1\n;\nreturn total\n')
+
+
+def generate(opts):
+    xsErrors.contentLoader = SOURCE
+    cg = cli.translate(opts, cli.lp(SOURCE))
+    cg.dump()
+    return cg
+
+
+def routines(cg):
+    # (entry, segments, callee-saved registers named, stack bytes addressed below the base pointer) of every routine
+    saved = {FAMILIES[register.name]: register for register in cg.registers.saved}
+    owned = {name for names in cg.functions.values() for name in names}
+    for entry, names in [*cg.functions.items(), (START_FUNC, [name for name in cg.segments if name not in owned])]:
+        segments = [cg.segments[name] for name in names]
+        named, depth = cg.footprint(segments)
+        yield entry, segments, [saved[name] for name in saved if name in named], depth
+
+
+def prologue(cg, entry):
+    # The instructions of <entry> before its first one that is not part of the prologue
+    code = list(cg.segments[entry])
+    if entry in cg.functions:
+        assert code[:2] == [(Op.PUSH, cg.registers.bp, None), (Op.MOV, cg.registers.bp, cg.registers.sp)]
+    for index, (op, dst, _) in enumerate(code):
+        if op not in (Op.PUSH, Op.MOV, Op.SUB) or (op == Op.MOV and dst != cg.registers.bp):
+            return code[:index]
+    return code
+
+
+@pytest.mark.parametrize('bits', ['64bit', '32bit'])
+@pytest.mark.parametrize('level', ['O0', 'O1', 'O2'])
+def test_callee_saved_registers(bits, level):
+    cg = generate([bits, level])
+    for entry, segments, used, _ in routines(cg):
+        pushes = [dst for op, dst, _ in prologue(cg, entry) if op == Op.PUSH and dst != cg.registers.bp]
+        assert pushes == used, entry
+        leave = Op.LEAVE if entry in cg.functions else Op.RET
+        pops = [(Op.POP, register, None) for register in reversed(used)]
+        for code in segments:
+            instructions = list(code)
+            for index, (op, _, _) in enumerate(instructions):
+                if op == leave:
+                    assert instructions[index - len(pops):index] == pops, entry
+
+
+@pytest.mark.parametrize('level', ['O0', 'O1', 'O2'])
+def test_frame_size(level):
+    cg = generate(['64bit', level])
+    for entry, _, used, depth in routines(cg):
+        grow = [src.value for op, dst, src in prologue(cg, entry) if op == Op.SUB and dst == cg.registers.sp]
+        size = grow[0] if grow else 0
+        # The call pushed the return address, a function pushes rbp
+        pushed = 8 + 8 * len(used) + (8 if entry in cg.functions else 0)
+        # As deep as the slots addressed, then padded to keep rsp 16 byte aligned
+        assert depth <= size < depth + 16 and (size + pushed) % 16 == 0, entry
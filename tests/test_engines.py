@@ -0,0 +1,84 @@
+# The run mode engines give the same results: the AST walker, the closures and the bytecode VM
+import pytest
+
+import bytecode
+import errors as xsErrors
+import main as cli
+from closures import Closures
+from interpreter import Interpreter
+
+PROGRAMS = {
+    'arithmetic': 'a = 7\nb = a * 3 - 4 / 2\nc = (b % 5) + a\nreturn c * 2 - b\n',
+    'floats and strings': 'x = 1.5\ny = x * 4\ns = "abc"\nif s == "abc"\n   y = y + 1\n;\nreturn y\n',
+    'loop': ('total = 0\ni = 0\nwhile i < 200\n   if (i % 3) == 0\n      total = total + i * 2\n   ;\n'
+             '   else\n      total = total - 1\n   ;\n   i = i + 1\n;\nreturn total\n'),
+    'until break continue': ('count = 0\nouter = 0\nuntil outer == 12\n   outer = outer + 1\n   inner = 0\n'
+                             '   while 1\n      inner = inner + 1\n      if inner > outer\n         break\n      ;\n'
+                             '      if (inner % 2) == 1\n         continue\n      ;\n      count = count + inner\n   ;\n;\n'
+                             'return count\n'),
+    'recursion': ('def fib(k: int)\n   if k < 2\n      return k\n   ;\n   a = fib(k - 1)\n   b = fib(k - 2)\n'
+                  '   return a + b\n;\nreturn fib(12)\n'),
+    'globals from a function': ('n = 5\ndef bump(k: int)\n   n = n + k\n   m = n * 2\n   return m\n;\n'
+                                'r = bump(3)\nreturn r + n\n'),
+    'set': 'set a: int\nset s: str\nb = a + 1\nreturn b\n',
+    # A variable only assigned on a path not taken reads 0, never a temporary of an earlier statement
+    'unassigned at the top level': 'c = 0\nif (c + 9) < 0\n   y = 5\n;\nz = y\nreturn z\n',
+    'unassigned in a function': ('def f(a: int)\n   c = 0\n   if (c + a) < 0\n      y = 5\n   ;\n   z = y\n'
+                                 '   return z\n;\nreturn f(10)\n'),
+    'temporaries across calls': ('def g(a: int, b: int)\n   return a * 10 + b\n;\n'
+                                 'x = g(1 + 1, 3) + g(2 * 2, 5 - 1)\ny = g(x, x - 1)\nreturn y\n'),
+}
+# Programs the Resolver rejects, the same way for every engine
+INVALID = [
+    'a = b + 1\n',
+    'def f(a: int)\n   return a\n;\nr = f(1, 2)\n',
+    'r = g(1)\n',
+    'break\n',
+    'def f(a: int)\n   continue\n;\n',
+]
+
+
+class Reported(Exception):
+    pass
+
+
+def report(num, pos, line, msg, entire=False):
+    raise Reported(num, pos, line, msg)
+
+
+def tree(source):
+    xsErrors.contentLoader = source
+    return cli.lp(source)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_engines_agree(name):
+    source = PROGRAMS[name]
+    expected = Interpreter([]).walk(tree(source))
+    assert Closures().build(tree(source))() == expected
+    assert bytecode.execute(bytecode.Compiler().build(tree(source))) == expected
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_serialized_bytecode(name):
+    source = PROGRAMS[name]
+    program = bytecode.loads(bytecode.dumps(bytecode.Compiler().build(tree(source), source)))
+    assert program.source == source
+    assert bytecode.execute(program) == Closures().build(tree(source))()
+
+
+def test_unassigned_reads_zero():
+    assert bytecode.execute(bytecode.Compiler().build(tree(PROGRAMS['unassigned at the top level']))) == 0
+    assert bytecode.execute(bytecode.Compiler().build(tree(PROGRAMS['unassigned in a function']))) == 0
+
+
+@pytest.mark.parametrize('source', INVALID)
+def test_same_errors(source, monkeypatch):
+    monkeypatch.setattr(xsErrors, 'stderr', report)
+    errors = []
+    for run in (Interpreter([]).walk, lambda ast: Closures().build(ast)(),
+                lambda ast: bytecode.execute(bytecode.Compiler().build(ast))):
+        with pytest.raises(Reported) as error:
+            run(tree(source))
+        errors.append(error.value.args)
+    assert errors[0][0] in (1, 4) and errors.count(errors[0]) == 3
@@ -0,0 +1,62 @@
+# Constant folding and propagation (-O1 and -O2) keep the results of the programs they rewrite
+import pytest
+
+import errors as xsErrors
+import main as cli
+from closures import Closures
+from nodes import Node
+
+PROGRAMS = {
+    'folded': 'a = 2 * 3 + 4\nb = (10 - 4) / 4\nc = (17 % 5) * (0 - 3)\nd = 7 / (0 - 2)\nreturn a * 100 + b * 10 + c + d\n',
+    'floats': 'f = 1.5 * 4\ng = 0.25 + 1.75\nreturn g * 2 + f\n',
+    'comparisons': 'a = (3 > 2) + (2 >= 2) * 2 + (1 < 0) * 4 + (5 != 5) * 8 + (4 == 4) * 16\nb = 1 and 0 or 1\nreturn a + b\n',
+    'propagated': 'x = 5\ny = x * 2\nx = y + 1\nz = x * x - y\nreturn z\n',
+    'dead stores': 'a = 1\na = 2\nb = 3\nunused = b * 7\nset s: int\nreturn a + b\n',
+    'branch': 'k = 3\nif k > 2\n   k = 10\n;\nelse\n   k = 20\n;\nm = k + 1\nreturn m\n',
+    'loop': 'i = 0\nt = 1\nwhile i < 5\n   t = t * 2\n   i = i + 1\n;\nreturn t + i\n',
+    # A call may assign any global, nothing known before it is used after it
+    'call assigns a global': ('n = 1\ndef bump(k: int)\n   n = n + k\n   return 0\n;\nn = 4\nr = bump(3)\nq = n * 10\n'
+                              'return q + r\n'),
+    'function body': ('def f(a: int)\n   b = 6\n   c = b * 7\n   d = c - a\n   return d\n;\nx = f(2)\n'
+                      'y = 3\ny = y + x\nreturn y\n'),
+    # The second store reads the first one, which must stay
+    'store reading itself': ('def f(x: int)\n   y = x\n   y = y + 1\n   return y\n;\nx = f(4)\ny = x\ny = y * 3\n'
+                             'return y + f(x)\n'),
+    # The call reads the first store before the second one replaces it
+    'store read by a later call': ('b = 1\ndef f0()\n   return b * 2\n;\nb = 17\nb = f0()\nreturn b\n'),
+}
+
+
+def tree(source):
+    xsErrors.contentLoader = source
+    return cli.lp(source)
+
+
+def shape(value):
+    if isinstance(value, Node):
+        return value.kind, tuple(shape(getattr(value, field)) for field in value.fields)
+    if isinstance(value, (list, tuple)):
+        return tuple(shape(item) for item in value)
+    return value
+
+
+@pytest.mark.parametrize('bits', ['64bit', '32bit'])
+@pytest.mark.parametrize('level', ['O0', 'O1', 'O2'])
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_same_results(name, level, bits):
+    source = PROGRAMS[name]
+    expected = Closures().build(tree(source))()
+    # translate folds and propagates the tree in place from -O1 on
+    ast = tree(source)
+    cli.translate([bits, level], ast)
+    assert Closures().build(ast)() == expected
+
+
+@pytest.mark.parametrize('name', ['folded', 'comparisons', 'floats', 'propagated', 'dead stores', 'function body'])
+def test_rewritten(name):
+    # The programs above are actually rewritten at -O1, and left alone at -O0
+    source = PROGRAMS[name]
+    unoptimized, optimized = tree(source), tree(source)
+    cli.translate(['64bit', 'O0'], unoptimized)
+    cli.translate(['64bit', 'O1'], optimized)
+    assert shape(unoptimized) == shape(tree(source)) != shape(optimized)
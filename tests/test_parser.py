@@ -0,0 +1,72 @@
+# PParser gives the same tree (positions included) and the same first error on a TokenBuffer as on sly's tokens
+import pytest
+
+import errors as xsErrors
+from lp import PLexer, PParser
+from nodes import Node
+from scanner import Scanner
+
+SOURCES = [
+    'a = 1\n',
+    'a = 7\nb = a * 3 - 4 / 2\nc = (b % 5) + a\nreturn c * 2 - b\n',
+    'x = 1.5\ny = x * 4\ns = "abc"\nif s == "abc"\n   y = y + 1\n;\nelse\n   y = 0\n;\nreturn y\n',
+    ('def fib(k: int)\n   if k < 2\n      return k\n   ;\n   a = fib(k - 1)\n   b = fib(k - 2)\n'
+     '   return a + b\n;\nreturn fib(12)\n'),
+    ('total = 0 # running sum\ni = 0\nwhile i < 200 and total >= 0 or i == 3\n   if (i % 3) == 0\n'
+     '      total = total + i * 2\n   ;\n   i = i + 1\n   continue\n;\nuntil i <= 0\n   i = i - 1\n   break\n;\n'),
+    'set buf: int = 100\nset other: str\nset f: float\nimport lib\nprint(1, 2.5, "x")\n',
+    'y = (1 + 2) * 3 and 4 or 5\nz = 0 - 1 + (0 - 2)\n',
+]
+INVALID = [
+    'a = = 1\n',
+    'def f(\n',
+    'if a\n   b = 1\n',
+    ')',
+    'a = @\n',
+    'z = 1 + (-(2))\n',
+]
+
+
+class Reported(Exception):
+    pass
+
+
+def report(num, pos, line, msg, entire=False):
+    raise Reported(num, pos, line, msg)
+
+
+def shape(value):
+    # A node as nested tuples of its kind, position and fields
+    if isinstance(value, Node):
+        return value.kind, value.pos, tuple(shape(getattr(value, field)) for field in value.fields)
+    if isinstance(value, (list, tuple)):
+        return tuple(shape(item) for item in value)
+    return value
+
+
+def parse(tokens):
+    parser = PParser()
+    try:
+        parser.parse(tokens)
+    except Reported as error:
+        return error.args
+    return shape(parser.ast)
+
+
+@pytest.fixture(autouse=True)
+def reports(monkeypatch):
+    monkeypatch.setattr(xsErrors, 'stderr', report)
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_same_tree(source):
+    xsErrors.contentLoader = source
+    tree = parse(Scanner().buffer(source))
+    assert tree[0] == 'Module' and tree == parse(PLexer().tokenize(source))
+
+
+@pytest.mark.parametrize('source', INVALID)
+def test_same_first_error(source):
+    xsErrors.contentLoader = source
+    error = parse(Scanner().buffer(source))
+    assert error[0] in (3, 5) and error == parse(PLexer().tokenize(source))
@@ -0,0 +1,33 @@
+# The AST visitors count their visits per node kind into the active profile, and only then
+import json
+
+import errors as xsErrors
+import main as cli
+import profiler
+from closures import Closures
+from interpreter import Resolver
+
+SOURCE = 'def f(k: int)\n   return k * 2\n;\ni = 0\nt = 0\nwhile i < 10\n   t = t + f(i)\n   i = i + 1\n;\nreturn t\n'
+
+
+def tree():
+    xsErrors.contentLoader = SOURCE
+    return cli.lp(SOURCE)
+
+
+def test_visits_in_profile():
+    expected = Resolver(count=True).resolve(tree()).counters
+    profile = profiler.start()
+    try:
+        assert Closures().build(tree())() == 90
+    finally:
+        profiler.stop()
+    assert profile.visits['Resolver'] == expected == profile.visits['Closures']
+    assert expected['Name'] == 6 and expected['Def'] == 1
+    assert f'{"Closures visits":<16}{sum(expected.values()):>12}' in profile.table().splitlines()
+    assert json.loads(profile.json())['visits']['Resolver'] == dict(expected)
+
+
+def test_no_visits_without_profile():
+    assert Resolver().resolve(tree()).counters is None
+    assert Resolver(count=False).counters is None
@@ -0,0 +1,165 @@
+# The register allocator keeps the results of the segments it rewrites: spilling under register pressure,
+# reusing the registers of ended variables, values which live across blocks and calls, registers a block
+# names itself and variables accessed at another register width
+import pytest
+
+import regalloc
+from ir import Imm, Label, Mem, Op, Reg, Segment
+from regalloc import FAMILIES, POOLS
+
+ARITHMETIC = {Op.ADD: int.__add__, Op.SUB: int.__sub__, Op.IMUL: int.__mul__}
+
+
+def mov(dst, src):
+    return Op.MOV, dst, src
+
+
+def execute(segments, entry='main'):
+    # rax once <segments> return from <entry>, registers are widened to their family
+    registers, memory, stack = {}, {}, []
+    flag = False
+
+    def read(operand):
+        if type(operand) is Imm:
+            return operand.value
+        if type(operand) is Reg:
+            return registers.get(FAMILIES[operand.name], 0)
+        return memory.get(operand.slot, 0)
+
+    def write(operand, value):
+        if type(operand) is Reg:
+            registers[FAMILIES[operand.name]] = value
+        else:
+            memory[operand.slot] = value
+
+    name, index = entry, 0
+    while index < len(segments[name]):
+        op, dst, src = segments[name][index]
+        index += 1
+        if op == Op.MOV:
+            write(dst, read(src))
+        elif op in ARITHMETIC:
+            write(dst, ARITHMETIC[op](read(dst), read(src)))
+        elif op == Op.CMP:
+            flag = read(dst) == read(src)
+        elif op == Op.JMP or (op == Op.JE and flag):
+            name, index = dst.name, 0
+        elif op == Op.CALL:
+            stack.append((name, index))
+            name, index = dst.name, 0
+        elif op == Op.RET:
+            if not stack:
+                break
+            name, index = stack.pop()
+    return registers.get('rax')
+
+
+def allocated(segments, pool):
+    # Run <segments> before and after allocation, the result must be the same (memory only read in the
+    # block writing it is not kept)
+    expected = execute(segments)
+    copies = {name: Segment(segment) for name, segment in segments.items()}
+    saved = regalloc.allocate(copies, pool)
+    assert execute(copies) == expected
+    return copies, saved
+
+
+def named(segment, pool):
+    # Families of the pool registers <segment> uses
+    return {FAMILIES[operand.name] for _, dst, src in segment for operand in (dst, src)
+            if type(operand) is Reg and FAMILIES[operand.name] in {FAMILIES[register] for register in pool}}
+
+
+def memory_accesses(segment, slot):
+    return sum(type(operand) is Mem and operand.slot == slot for _, dst, src in segment for operand in (dst, src))
+
+
+@pytest.mark.parametrize('bits', ['32bit', '64bit'])
+def test_spill_under_pressure(bits):
+    # Twice as many variables as registers, all live at once and read three times
+    pool = POOLS[bits]
+    acc = Reg('eax' if bits == '32bit' else 'rax')
+    variables = [Mem(f'v{i}') for i in range(2 * len(pool))]
+    code = [mov(variable, Imm(i + 1)) for i, variable in enumerate(variables)]
+    for _ in range(3):
+        for variable in variables:
+            code += [mov(acc, variable), (Op.ADD, acc, Imm(1)), mov(variable, acc)]
+    code += [mov(acc, Imm(0))]
+    for variable in variables:
+        code += [(Op.IMUL, acc, Imm(3)), (Op.ADD, acc, variable)]
+    code.append((Op.RET, None, None))
+    segments, saved = allocated({'main': Segment(code)}, pool)
+    assert saved > 0
+    # Every register of the pool is used, the variables which end last stay in memory
+    assert named(segments['main'], pool) == {FAMILIES[register] for register in pool}
+    spilled = [variable for variable in variables if memory_accesses(segments['main'], variable.slot) > 2]
+    assert spilled == variables[len(pool):]
+
+
+@pytest.mark.parametrize('bits', ['32bit', '64bit'])
+def test_registers_reused(bits):
+    # Twice as many variables as registers, one after the other: a register is free again once its variable ends
+    pool = POOLS[bits]
+    acc = Reg('eax' if bits == '32bit' else 'rax')
+    variables = [Mem(f'v{i}') for i in range(2 * len(pool))]
+    code = [mov(acc, Imm(0))]
+    for i, variable in enumerate(variables):
+        code += [mov(variable, Imm(i)), (Op.ADD, variable, acc), (Op.IMUL, variable, Imm(2)), (Op.ADD, acc, variable)]
+    code.append((Op.RET, None, None))
+    segments, _ = allocated({'main': Segment(code)}, pool)
+    assert not any(memory_accesses(segments['main'], variable.slot) for variable in variables)
+
+
+@pytest.mark.parametrize('bits', ['32bit', '64bit'])
+def test_values_live_across_blocks_and_calls(bits):
+    # The callee allocates the same registers as its caller, and writes a variable the caller holds in one
+    pool = POOLS[bits]
+    acc = Reg('eax' if bits == '32bit' else 'rax')
+    a, b, t = Mem('a'), Mem('b'), Mem('t')
+    main = [mov(a, Imm(5)), mov(acc, a), (Op.ADD, acc, a), mov(b, acc), (Op.IMUL, a, Imm(3)),
+            (Op.CALL, Label('f'), None),
+            mov(acc, a), (Op.ADD, acc, b), (Op.ADD, a, acc), (Op.CMP, a, Imm(0)), (Op.JE, Label('skip'), None),
+            (Op.ADD, b, a), (Op.ADD, b, a), (Op.JMP, Label('end'), None)]
+    function = [mov(t, a), (Op.ADD, t, Imm(7)), (Op.IMUL, t, t), mov(a, t), (Op.ADD, a, t), (Op.RET, None, None)]
+    skip = [mov(b, Imm(-1)), (Op.JMP, Label('end'), None)]
+    end = [mov(acc, b), (Op.ADD, acc, a), (Op.ADD, acc, b), (Op.RET, None, None)]
+    segments, _ = allocated({'main': Segment(main), 'f': Segment(function), 'skip': Segment(skip),
+                             'end': Segment(end)}, pool)
+    assert named(segments['main'], pool) and named(segments['f'], pool)
+    families = {FAMILIES[register] for register in pool}
+    for name, segment in segments.items():
+        # A register of the pool never carries a value into a block: it is written before it is read
+        for block in regalloc.blocks(segment):
+            written = set()
+            for op, dst, src in block:
+                for operand in (src, dst):
+                    if type(operand) is Reg and FAMILIES[operand.name] in families:
+                        assert FAMILIES[operand.name] in written or (operand is dst and op == Op.MOV), name
+                if type(dst) is Reg:
+                    written.add(FAMILIES[dst.name])
+
+
+@pytest.mark.parametrize('bits', ['32bit', '64bit'])
+def test_named_registers_left_alone(bits):
+    # The block passes a value in the first register of the pool (like a call argument), <a> gets another one
+    pool = POOLS[bits]
+    acc, argument, a = Reg('eax' if bits == '32bit' else 'rax'), Reg(pool[0]), Mem('a')
+    code = [mov(argument, Imm(4)), mov(a, Imm(3)), (Op.ADD, a, a), (Op.IMUL, a, a), mov(acc, a),
+            (Op.ADD, acc, argument), (Op.RET, None, None)]
+    segments, _ = allocated({'main': Segment(code)}, pool)
+    assert not memory_accesses(segments['main'], a.slot)
+    assert named(segments['main'], pool) == {FAMILIES[pool[0]], FAMILIES[pool[1]]}
+
+
+def test_mixed_widths_keep_memory():
+    # <flag> is written through al and read as a qword, it keeps its memory; <count> only sees 64 bit registers
+    flag, count = Mem('flag'), Mem('count')
+    code = [mov(count, Imm(3)), (Op.CMP, count, Imm(3)), (Op.SETE, Reg('al'), None),
+            mov(flag.sized('byte'), Reg('al')), mov(Reg('rax'), flag), (Op.ADD, Reg('rax'), count),
+            (Op.ADD, count, Reg('rax')), (Op.ADD, flag, count), mov(Reg('eax'), flag.sized('dword')),
+            (Op.ADD, count, Imm(1)), mov(Mem('out'), count), (Op.RET, None, None)]
+    segments = {'main': Segment(code)}
+    regalloc.allocate(segments, POOLS['64bit'])
+    rewritten = list(segments['main'])
+    assert memory_accesses(rewritten, flag.slot) == memory_accesses(code, flag.slot)
+    assert memory_accesses(rewritten, count.slot) < memory_accesses(code, count.slot)
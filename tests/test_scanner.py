@@ -0,0 +1,96 @@
+# The Scanner gives the same tokens and reports the same illegal characters as sly's PLexer
+import random
+
+import pytest
+
+import errors as xsErrors
+from lp import PLexer
+from scanner import KINDS, Scanner
+
+SOURCES = [
+    '',
+    '   \n\t\r\n',
+    '# only a comment',
+    'a = 1 # trailing comment',
+    '#a\n#b\n\n   c = 2\n',
+    'def f(a: int, b: int)\n   c = a * b + 0\n   if c >= 10\n      c = c - a\n   ;\n   return c\n;\nr = f(3, 4)\n',
+    'set buf: int = 100\nset s: str\nwhile i <= 10 and j != 2 or k == 3\n   break\n;\nuntil x < 1\n   continue\n;\n',
+    'x = 1.5e3 + .5 + 0x1e + 1e5 + 0b101 + 0o17 + 5. + 1_000 + 0123 + 1e + 0x + 1.e-2 + 00.5\n',
+    's = "double" + \'single\' + "" + \'\'\n',
+    'a\tb\r\nc',
+    'import lib\nprint("x")\n',
+    'ifx = elsewhere + define + returned + _ + __a1\n',
+]
+ILLEGAL = [
+    '. @ ~',
+    'a = "unclosed\n',
+    "b = 'q",
+    'é = 1',
+    '€',
+    'x = 1 $ 2',
+    'y = .\n',
+    'a\tb\r\nc\x0bd',
+]
+
+
+class Reported(Exception):
+    pass
+
+
+def report(num, pos, line, msg, entire=False):
+    raise Reported(num, pos, line, msg)
+
+
+def tokens(lexer, source):
+    # (type, value, lineno, index, end) of the tokens up to the first illegal character, and its report
+    found = []
+    try:
+        for token in lexer.tokenize(source):
+            found.append((token.type, token.value, token.lineno, token.index, token.end))
+    except Reported as error:
+        return found, error.args
+    return found, None
+
+
+def fuzz(count, seed=1):
+    pieces = ['a', 'if', 'else', 'x1', '_', '0', '7', '0x', 'e', 'E', '.', '_1', '+', '-', '=', '==', '<', '>', '!',
+              '(', ')', ':', ';', ',', '%', '*', '/', '"', "'", '#', ' ', '  ', '\t', '\n', '\r\n', 'b', 'o', 'x']
+    generator = random.Random(seed)
+    return [''.join(generator.choice(pieces) for _ in range(generator.randint(1, 30))) for _ in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def reports(monkeypatch):
+    monkeypatch.setattr(xsErrors, 'stderr', report)
+
+
+@pytest.mark.parametrize('source', SOURCES + ILLEGAL)
+def test_same_tokens(source):
+    assert tokens(Scanner(), source) == tokens(PLexer(), source)
+
+
+def test_same_tokens_fuzzed():
+    for source in fuzz(3000):
+        assert tokens(Scanner(), source) == tokens(PLexer(), source), source
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_buffer_columns(source):
+    buffer = Scanner().buffer(source)
+    expected, _ = tokens(PLexer(), source)
+    assert [(KINDS[buffer.kinds[i]], buffer.value(i), buffer.lines[i], buffer.starts[i], buffer.ends[i])
+            for i in range(len(buffer))] == expected
+
+
+def test_illegal_characters_kept():
+    buffer = Scanner().buffer('a = @ 1\n')
+    assert [buffer.type(i) for i in range(len(buffer))] == ['NAME', 'EQ', 'ERROR', 'NUMBER']
+    with pytest.raises(Reported) as error:
+        buffer.error(2)
+    assert error.value.args == (3, (4, 4), 1, 'Illegal character "@"')
+
+
+def test_offset_start():
+    source = 'skipped\nb = 2\n'
+    assert [(token.value, token.lineno, token.index) for token in Scanner().tokenize(source, 2, 8)] == [
+        ('b', 2, 8), ('=', 2, 10), ('2', 2, 12)]
@@ -1,48 +1,67 @@
 import struct
 
+from ir import Op, Reg, Imm, Mem, Label
 
-class Variables:
-    variables_name = {}
-    variables = {}
-    emg = None
-    c = 0
-    c2 = -1
-    c3 = -1
-
-    @staticmethod
-    def exists_reg(item):
-        return item in Variables.variables_name
 
-    @staticmethod
-    def get_as_obj(item):
-        return Variable(item, Variables.variables[item], False)
+class Variables:
+    # Variables of a single compilation (every Codegen owns one)
+    def __init__(self):
+        self.variables_name = {}
+        self.variables = {}
+        self.c = 0
+        # Frame of the function being compiled, None at the top level
+        self.frame = None
 
-    @staticmethod
-    def new():
-        Variables.c3 += 1
-        return f'__sys{Variables.c3}__'
+    def local(self, cover):
+        return self.frame is not None and cover in self.frame.values
 
-    @staticmethod
-    def define_var(name, value):
-        Variables.variables[name] = value
+    def value(self, cover):
+        return self.frame.values[cover] if self.local(cover) else self.variables[cover]
 
-    @staticmethod
-    def assign(name, uninit=False, func=False):
-        if name in Variables.variables_name.keys():
-            Variables.emg = Variables.variables_name[name]
+    def define_var(self, name, value):
+        if self.local(name):
+            self.frame.values[name] = value
         else:
-            Variables.emg = None
+            self.variables[name] = value
+
+    def assign(self, name, uninit=False, func=False, size=None, local=True):
+        # New variables of a function live in its frame, unless a global of that name exists
+        if local and self.frame is not None and name not in self.variables_name:
+            cover = self.frame.slot(name, size)
+            self.frame.values[cover] = None
+            return cover
         if not uninit:
-            Variables.variables_name[name] = f'{"F" if func else "v"}{Variables.c}'
+            self.variables_name[name] = f'{"F" if func else "v"}{self.c}'
         else:
-            Variables.variables_name[name] = f'u{Variables.c}'
-        Variables.c += 1
-        return Variables.variables_name[name]
-
-    @staticmethod
-    def location():
-        Variables.c2 += 1
-        return f'l_{Variables.c2}'
+            self.variables_name[name] = f'u{self.c}'
+        self.c += 1
+        return self.variables_name[name]
+
+
+class Frame:
+    # Stack frame of a function, its variables are addressed relative to the base pointer
+    def __init__(self, registers, word):
+        self.registers = registers
+        self.word = word
+        self.values = {}
+        self.size = 0
+        # (cover, register) of the parameters passed in registers, saved by the prologue
+        self.saves = []
+
+    def slot(self, name, size=None):
+        self.size += -(-(size or self.word) // self.word) * self.word
+        return Mem(reg=self.registers.bp.name, disp=-self.size)
+
+    def param(self, name, index):
+        args = self.registers.args
+        if index < len(args):
+            cover = self.slot(name)
+            self.saves.append((cover, args[index]))
+        else:
+            # Pushed by the caller, above the saved base pointer and the return address
+            cover = Mem(reg=self.registers.bp.name, disp=(index - len(args) + 2) * self.word)
+        self.values[cover] = Int(0)
+        return cover
 
 
 class IV_Types:
@@ -60,21 +79,6 @@ class IV_Types:
     }
 
 
-class Def_Types:
-    string = 'db'
-    int_ = 'db'
-    float_ = 'db'
-    bool_ = 'db'
-    null = 'db'
-    find = {
-        'str': string,
-        'int': int_,
-        'float': float_,
-        'bool': bool_,
-        'null': null,
-    }
-
-
 class Value:
     def __init__(self, type_, value):
         self.type = type_
@@ -87,6 +91,10 @@ class Value:
     def representation(self, dst=False):
         return f'{self.value}'
 
+    def operand(self, dst=False):
+        # Instruction operand of the value
+        return Imm(self.representation(dst))
+
 
 class Null(Value):
     def __init__(self):
@@ -100,28 +108,45 @@ class Register(Value):
     def __str__(self):
         return self.representation(None)
 
+    def operand(self, dst=False):
+        return Reg(self.value)
+
 
 def float_to_hex(f):
     return hex(struct.unpack('<I', struct.pack('<f', f))[0])
 
 
 class Registers:
-    op1 = Register('eax')
-    op2 = Register('ebx')
+    op1 = Reg('eax')
+    op2 = Reg('ebx')
     all_ = [op1, op2]
+    bp = Reg('ebp')
+    sp = Reg('esp')
+    # Low byte of op1 and op2, remainder of idiv and the sign extension of op1 into it
+    low1 = Reg('al')
+    low2 = Reg('bl')
+    rem = Reg('edx')
+    extend = Op.CDQ
+    # Arguments passed in registers, cdecl passes all of them on the stack
+    args = ()
+    # Registers cdecl leaves to the callee to preserve, ebp aside (see Codegen.make_frames)
+    saved = (Reg('ebx'), Reg('esi'), Reg('edi'))
 
 
 class Variable(Value):
-    def __init__(self, name, value, eng=True):
+    # Registers a new variable in <variables> if given, else refers to an existing one by its cover name
+    # <size> is the size in bytes of a variable in a stack frame
+    def __init__(self, name, value, variables=None, size=None):
         self.iv_value = value
         self.name = name
         self.dst_ava = True
         self.uninit = value is None
         if self.uninit:
             self.iv_value = Null()
-        if eng:
-            self.cover = Variables.assign(self.name, self.uninit)
-            Variables.define_var(self.cover, self.iv_value if not self.uninit else Null())
+        if variables is not None:
+            # Strings need their data entry, they are never local
+            self.cover = variables.assign(self.name, self.uninit, size=size, local=self.iv_value.type != IV_Types.string)
+            variables.define_var(self.cover, self.iv_value if not self.uninit else Null())
         else:
             self.cover = self.name
 
@@ -131,7 +156,14 @@ class Variable(Value):
         return f'{self.name} = {self.type} : {self.value}'
 
     def representation(self, dst=False):
-        return f'[{self.cover}]' if dst else f'{self.cover}'
+        return f'{self.operand(dst)}'
+
+    def operand(self, dst=False):
+        # Strings are used by their address, every other value by its contents
+        # Globals are covered by their data label, locals by their stack frame slot (a Mem)
+        if isinstance(self.cover, Mem):
+            return self.cover
+        return Label(self.cover) if not dst and self.type == IV_Types.string else Mem(self.cover)
 
 
 class String(Value):
@@ -152,59 +184,59 @@ class Float(Value):
         return f'{float_to_hex(self.value)}'
 
 
-class Expression(Value):
-    def __init__(self, op, node1, node2, base):
-        self.op = op
-        self.node1: Value = node1
-        self.node2: Value = node2
-
-        self.type = self.node1.type
-        self.value = self.node1.value
-
-        self.dst_ava = self.node1.dst_ava
-
-        base.bin_op(self.op, self.node1, self.node2)
-
-    def representation(self, dst=False):
-        return self.node1.representation(dst)
-
-
 class RegOps:
+    # Instructions as (opcode, dst, src), see ir
+    ARITHMETIC = {'+': Op.ADD, '-': Op.SUB, '*': Op.IMUL, 'xor': Op.XOR}
+    CONDITIONS = {'==': Op.SETE, '!=': Op.SETNE, '>': Op.SETG, '>=': Op.SETGE, '<': Op.SETL, '<=': Op.SETLE}
+    LOGICAL = {'and': Op.AND, 'or': Op.OR}
+
     @staticmethod
     def compare(op1, op2):
-        return f'cmp {op1}, {op2}'
+        return Op.CMP, op1, op2
 
     @staticmethod
     def mov(op1, op2):
-        return f'mov {op1}, {op2}'
+        return Op.MOV, op1, op2
 
     @staticmethod
     def jump(label, cond=None):
         match cond:
             case None:
-                return f'jmp {label}'
+                return Op.JMP, Label(label), None
             case "==":
-                return f'je {label}'
+                return Op.JE, Label(label), None
+
+    @staticmethod
+    def call(label):
+        return Op.CALL, Label(label), None
 
     @staticmethod
-    def binaryOp(op, node1, node2):
-        match op:
-            case "+":
-                op = 'add'
-            case "-":
-                op = 'sub'
-            case _:  # Use default OP
-                pass
-        return f'{op} {node1}, {node2}'
+    def binaryOp(op, registers):
+        # <op> of op1 and op2 into op1, None if <op> is not supported
+        op1, op2 = registers.op1, registers.op2
+        if op in RegOps.ARITHMETIC:
+            return [(RegOps.ARITHMETIC[op], op1, op2)]
+        if op in ('/', '%'):
+            code = [(registers.extend, None, None), (Op.IDIV, op2, None)]
+            return code + [RegOps.mov(op1, registers.rem)] if op == '%' else code
+        if op in RegOps.CONDITIONS:
+            return [RegOps.compare(op1, op2), (RegOps.CONDITIONS[op], registers.low1, None),
+                    (Op.MOVZX, op1, registers.low1)]
+        if op in RegOps.LOGICAL:
+            # On the truth values (0 or 1) of both operands
+            return [(Op.TEST, op1, op1), (Op.SETNE, registers.low1, None),
+                    (Op.TEST, op2, op2), (Op.SETNE, registers.low2, None),
+                    (RegOps.LOGICAL[op], registers.low1, registers.low2), (Op.MOVZX, op1, registers.low1)]
+        return None
 
     @staticmethod
     def pop(x):
-        return f'pop {x}'
+        return Op.POP, x, None
 
     @staticmethod
     def push(x):
-        return f'push {x}'
+        return Op.PUSH, x, None
 
     @staticmethod
     def popall(big=True):
-        return f';popad' if big else ';popa'
+        return Op.COMMENT, 'popad' if big else 'popa', None
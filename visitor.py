@@ -0,0 +1,51 @@
+# Table-driven AST visitor shared by the compiler and the interpreter
+import collections
+
+import errors as xsErrors
+import profiler
+
+
+class Visitor:
+    # Node kind -> method name, for nodes in statement and in value position
+    statements = {}
+    values = {}
+    name = 'visitor'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Resolved once per class, bound once per instance
+        cls._statement_table = {kind: getattr(cls, method) for kind, method in cls.statements.items()}
+        cls._value_table = {kind: getattr(cls, method) for kind, method in cls.values.items()}
+
+    def __init__(self, count=None):
+        self.statement_handlers = {kind: func.__get__(self) for kind, func in self._statement_table.items()}
+        self.value_handlers = {kind: func.__get__(self) for kind, func in self._value_table.items()}
+        # Visits per node kind, None when disabled. By default they go to the active profile (see profiler.visits)
+        if count is None:
+            self.counters = profiler.visits(self)
+        else:
+            self.counters = collections.Counter() if count else None
+
+    def compile(self, ast):
+        for branch in ast:
+            self.visit(branch)
+
+    def visit(self, branch):
+        handler = self.statement_handlers.get(branch.kind)
+        if handler is None:
+            self.unknown(branch, 'statement')
+        if self.counters is not None:
+            self.counters[branch.kind] += 1
+        return handler(branch)
+
+    def visit_value(self, branch):
+        handler = self.value_handlers.get(branch.kind)
+        if handler is None:
+            self.unknown(branch, 'value')
+        if self.counters is not None:
+            self.counters[branch.kind] += 1
+        return handler(branch)
+
+    def unknown(self, branch, context):
+        pos = branch.pos
+        xsErrors.stderr(4, (pos[0], pos[0]), pos[1], f"{branch.kind} is not supported as a {context} by the {self.name}", True)